@@ -1,12 +1,19 @@
 from . import helpers
 from .viewsetgen import ViewsetGenFactory
-import json, os, errno
+from .registry import registry
+from . import codegen, profiling
+from .preloader import preload, get_openapi_schema
+import os, errno
+from collections import OrderedDict
 from django.conf import settings
+from django.core.signals import setting_changed
+from django.db.models.signals import class_prepared
+from django.dispatch import receiver
 
 
 
 def find_model_definition(name, path=None):
-    if os.path.isfile(path):
+    if path and os.path.isfile(path):
         module_name = None
         d = os.path.dirname(path)
         basename = os.path.basename(d)
@@ -18,49 +25,72 @@ def find_model_definition(name, path=None):
             basename = os.path.basename(d)
         return (module_name, path)
 
-    path = None
-    module_name = None
-    if isinstance(settings.BASE_DIR, str):
-        BASE_DIR = settings.BASE_DIR
-    else:
-        BASE_DIR = str(settings.BASE_DIR)
-    for d in os.listdir(BASE_DIR):
-        if d[0] == '.':
-            continue
-        p = os.path.join(BASE_DIR, d, 'models.json')
-        if os.path.isdir(p):
-            ld = os.listdir(p)
-            if name in ld:
-                path = os.path.join(p, name)
-                module_name = d
-                break
-        if path:
-            break
-    if not path and not module_name:
-        p = os.path.join(BASE_DIR, 'models.json', name)
-        if os.path.exists(p) and os.path.isfile(p):
-            return (os.path.basename(BASE_DIR), p)
-    return (module_name, path)
+    entry = registry.find_model(name)
+    if not entry:
+        return (None, None)
+    return (entry.module_name, entry.path)
+
+
+def get_model_key(name):
+    return os.path.basename(str(name)).replace('.json', '').lower()
+
+
+
+__model_index = {}
+def get_model_index():
+    """
+    model name (lowercase, without .json) -> model class.
+    Built once from apps.all_models and updated when new models are registered.
+    If several apps have model with same name, model from app registered first wins
+    """
+    from django.apps import apps
+    if not __model_index:
+        for m_name, m_models in apps.all_models.items():
+            for name, model in m_models.items():
+                if name not in __model_index:
+                    __model_index[name] = model
+    return __model_index
+
+
+
+def reset_model_index():
+    __model_index.clear()
+
+
+
+@receiver(class_prepared)
+def index_model(sender, **kwargs):
+    from django.apps import apps
+    if not __model_index or sender._meta.apps is not apps:
+        return
+    name = sender._meta.model_name
+    label = sender._meta.app_label
+    current = __model_index.get(name, None)
+    if current is not None and current._meta.app_label != label:
+        labels = list(apps.all_models.keys())
+        if label not in labels or labels.index(label) > labels.index(current._meta.app_label):
+            return
+    __model_index[name] = sender
+
+
+
+@receiver(setting_changed)
+def reset_model_index_on_setting_changed(setting, **kwargs):
+    if setting == 'INSTALLED_APPS':
+        reset_model_index()
+
 
 
 __model_cache = {}
 def get_model(name, app=None, latest=False):
-    if latest:
-        _name = name.replace('.json', '')
-        if _name in __model_cache:
-            return __model_cache[_name]
+    key = get_model_key(name)
+    if latest and key in __model_cache:
+        return __model_cache[key]
 
-    from django.apps import apps
-    model = None
-    name = name.replace('.json','').lower()
     if app:
-        model = apps.get_model(app, name)
-    else:
-        for m_name, m_models in apps.all_models.items():
-            if name in m_models:
-                model = m_models[name]
-                break
-    return model
+        from django.apps import apps
+        return apps.get_model(app, key)
+    return get_model_index().get(key, None)
 
 
 
@@ -79,37 +109,121 @@ def generate_model(path):
             name
         )
 
-    with open(path) as f:
-        definition = json.load(f)
-
-    if getattr(settings, 'DRF_GENERATOR', {}).get('model', {}).get('default_generator', None):
-        MODEL_GENERATOR_CLASS = helpers.import_class(settings.DRF_GENERATOR['model']['default_generator'])
-    else:
-        from .generators.model import DjangoOrmModelGenerator
-        MODEL_GENERATOR_CLASS = DjangoOrmModelGenerator
-    converter = MODEL_GENERATOR_CLASS(definition, module_name, model_path=path)
-    model = converter.to_django_model()
-    __model_cache[model.__name__] = model
+    model = codegen.get_generated_model(name, module_name)
+    if model:
+        __model_cache[get_model_key(model.__name__)] = model
+        return model
+    return build_model(registry.load(path), module_name, path)
+
+
+
+def get_model_generator_class():
+    path = helpers.get_drf_generator_setting('model', 'default_generator')
+    if path:
+        return helpers.import_class(path)
+    from .generators.model import DjangoOrmModelGenerator
+    return DjangoOrmModelGenerator
+
+
+
+def get_serializer_generator_class():
+    path = helpers.get_drf_generator_setting('serializer', 'default_generator')
+    if path:
+        return helpers.import_class(path)
+    from .generators.serializer import DjangoRestSerializerGenerator
+    return DjangoRestSerializerGenerator
+
+
+
+def build_model(definition, module_name, path, **kwargs):
+    MODEL_GENERATOR_CLASS = get_model_generator_class()
+    with profiling.phase('model', definition.get('name', path)):
+        converter = MODEL_GENERATOR_CLASS(definition, module_name, model_path=path, **kwargs)
+        model = converter.to_django_model()
+    __model_cache[get_model_key(model.__name__)] = model
     return model
 
 
 
-def generate_serializer(model_class, **kwargs):
+def generate_models(app=None, errors=None, names=None):
+    """
+    Generates all models from models.json/*.json definitions of 'app'
+    (or of every app) in one pass. If 'names' is passed, only these
+    definitions and definitions they inherit from ('base') are generated.
+    Models are built after their 'base' models and relations between
+    definitions are passed to django as lazy 'app_label.ModelName'
+    references, so definitions may refer to each other in any order.
+    If 'errors' list is passed, definitions that fail to generate are skipped
+    and (name, exception) is appended to it instead of raising.
+    Returns OrderedDict: definition name -> model class
+    """
+    definitions = {}
+    def load(name):
+        if name not in definitions:
+            definitions[name] = registry.load(registry.find_model(name).path)
+        return definitions[name]
+
+    wanted = None
+    if names is not None:
+        wanted = set()
+        stack = list(names)
+        while stack:
+            name = stack.pop()
+            if name not in wanted:
+                wanted.add(name)
+                stack.extend(registry.get_dependencies(load(name))[0])
+    names = [
+        entry.name
+        for entry in registry.model_definitions(app=app)
+        if wanted is None or entry.name in wanted
+    ]
+    models = OrderedDict()
+    for name in registry.sort_definitions(names, load):
+        if wanted is not None and name not in wanted:
+            # relation of wanted model. django resolves it lazily
+            continue
+        model = get_model(name, latest=True)
+        if not model:
+            entry = registry.find_model(name)
+            try:
+                model = build_model(load(name), entry.module_name, entry.path, known_models=models)
+            except Exception as e:
+                if errors is None:
+                    raise
+                errors.append((name, e))
+                continue
+        models[name] = model
+    return models
+
+
+
+def generate_serializer(model_class, lazy=False, **kwargs):
     if isinstance(model_class, str):
         model_class = generate_model(model_class)
 
-    if getattr(settings, 'DRF_GENERATOR', {}).get('serializer', {}).get('default_generator', None):
-        SERIALIZER_GENERATOR_CLASS = helpers.import_class(settings.DRF_GENERATOR['serializer']['default_generator'])
-    else:
-        from .generators.serializer import DjangoRestSerializerGenerator
-        SERIALIZER_GENERATOR_CLASS = DjangoRestSerializerGenerator
-    generator = SERIALIZER_GENERATOR_CLASS(model_class, **kwargs)
-    return generator.to_serializer()
+    if lazy and not codegen.get_generated_serializer(model_class):
+        from .lazy import lazy_serializer
+        return lazy_serializer(model_class, **kwargs)
+    if not kwargs:
+        serializer_class = codegen.get_generated_serializer(model_class)
+        if serializer_class:
+            return serializer_class
+    SERIALIZER_GENERATOR_CLASS = get_serializer_generator_class()
+    with profiling.phase('serializer', model_class.__name__):
+        generator = SERIALIZER_GENERATOR_CLASS(model_class, **kwargs)
+        return generator.to_serializer()
 
 
 
 
-def generate_viewset(model_class, **kwargs):
+def generate_viewset(model_class, lazy=False, **kwargs):
     if isinstance(model_class, str):
         model_class = generate_model(model_class)
+    if lazy and not codegen.get_generated_viewset(model_class):
+        from .lazy import lazy_viewset
+        return lazy_viewset(model_class, **kwargs)
+    if not kwargs:
+        viewset_class = codegen.get_generated_viewset(model_class)
+        if viewset_class:
+            return viewset_class
     return ViewsetGenFactory(model_class, **kwargs)
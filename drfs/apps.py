@@ -0,0 +1,10 @@
+from django.apps import AppConfig
+
+
+
+class DrfsConfig(AppConfig):
+    name = 'drfs'
+    verbose_name = 'DRF generator'
+
+    def ready(self):
+        from . import checks
@@ -0,0 +1,147 @@
+import os, sys, json, marshal, hashlib, atexit, threading
+
+from .profiling import add_json_bytes
+
+
+CACHE_VERSION = 2
+
+
+
+def intern_strings(value):
+    """
+    Copy of json value with interned strings. marshal keeps strings interned,
+    so all loaded definitions share keys, types, model names etc.
+    """
+    if isinstance(value, str):
+        return sys.intern(value)
+    if isinstance(value, dict):
+        return dict([
+            (intern_strings(k), intern_strings(v))
+            for k, v in value.items()
+        ])
+    if isinstance(value, list):
+        return [intern_strings(v) for v in value]
+    return value
+
+
+
+class DefinitionCache(object):
+    """
+    Parsed json definitions keyed by file path.
+
+    Every entry is (mtime_ns, size, sha1, payload) where payload is the
+    marshalled definition (None if only digest of file was asked). A file
+    is re-read only when its mtime or size changes and re-parsed only when
+    its content hash changes and it is loaded.
+
+    With DRF_GENERATOR['cache']['path'] set, entries are also kept on disk
+    between processes (see 'drfs_warm_cache' management command).
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.entries = None
+        self.dirty = False
+        self.lock = threading.RLock()
+        self._atexit_registered = False
+
+
+    def get_path(self):
+        if self.path:
+            return self.path
+        from .helpers import get_drf_generator_setting
+        return get_drf_generator_setting('cache', 'path')
+
+
+    def get_entries(self):
+        if self.entries is None:
+            self.entries = self.read()
+        return self.entries
+
+
+    def read(self):
+        path = self.get_path()
+        if not path or not os.path.isfile(path):
+            return {}
+        try:
+            with open(path, 'rb') as f:
+                data = marshal.load(f)
+        except (OSError, EOFError, ValueError, TypeError):
+            return {}
+        if not isinstance(data, dict) or data.get('version') != CACHE_VERSION or \
+            data.get('python') != tuple(sys.version_info[:2]):
+            return {}
+        return data.get('entries', None) or {}
+
+
+    def save(self):
+        path = self.get_path()
+        if not path:
+            return False
+        with self.lock:
+            data = marshal.dumps({
+                'version': CACHE_VERSION,
+                'python': tuple(sys.version_info[:2]),
+                'entries': self.get_entries()
+            })
+            tmp_path = '%s.%s.tmp' % (path, os.getpid())
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+            self.dirty = False
+        return True
+
+
+    def save_if_dirty(self):
+        if self.dirty:
+            try:
+                self.save()
+            except OSError:
+                pass
+
+
+    def clear(self):
+        with self.lock:
+            self.entries = {}
+            self.dirty = True
+
+
+    def get_entry(self, path, parse=True):
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        entries = self.get_entries()
+        entry = entries.get(path, None)
+        if entry and entry[0] == stat.st_mtime_ns and entry[1] == stat.st_size and \
+            (entry[3] is not None or not parse):
+            return entry
+
+        with open(path, 'rb') as f:
+            raw = f.read()
+        digest = hashlib.sha1(raw).hexdigest()
+        if entry and entry[2] == digest and entry[3] is not None:
+            payload = entry[3]
+        elif parse:
+            add_json_bytes(len(raw))
+            payload = marshal.dumps(intern_strings(json.loads(raw.decode('utf-8'))))
+        else:
+            payload = None
+
+        entry = (stat.st_mtime_ns, stat.st_size, digest, payload)
+        with self.lock:
+            entries[path] = entry
+            self.dirty = True
+            if not self._atexit_registered and self.get_path():
+                atexit.register(self.save_if_dirty)
+                self._atexit_registered = True
+        return entry
+
+
+    def load(self, path):
+        return marshal.loads(self.get_entry(path)[3])
+
+
+    def digest(self, path):
+        """
+        sha1 of file content. File is not parsed
+        """
+        return self.get_entry(path, parse=False)[2]
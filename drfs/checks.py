@@ -0,0 +1,101 @@
+"""
+System checks of generated models (tag 'drfs'):
+
+    drfs.W001 - filter fields of generated viewset without database index.
+                Add "index": true to property, declare "options" -> "indexes"
+                of definition or change "viewset" -> "filter_fields".
+                Only "filter_fields" declared in definition are checked.
+                Default filter fields (all fields of model) are checked with
+
+                    DRF_GENERATOR = {'checks': {'default_filter_fields': True}}
+"""
+from django.apps import apps
+from django.core import checks
+from django.core.exceptions import FieldDoesNotExist
+from django.db import models
+
+from . import helpers
+from .db.fields import JSONField
+
+
+TAG = 'drfs'
+JSON_FIELD_CLASSES = tuple([JSONField] + ([models.JSONField] if hasattr(models, 'JSONField') else []))
+
+
+
+def get_indexed_field_names(model_class):
+    """
+    Names of fields that are leading columns of database index of model
+    """
+    opts = model_class._meta
+    names = set()
+    for field in opts.concrete_fields:
+        if field.primary_key or field.unique or field.db_index:
+            names.add(field.name)
+    for index in opts.indexes:
+        if index.fields:
+            names.add(index.fields[0].lstrip('-'))
+    for constraint in opts.constraints:
+        if isinstance(constraint, models.UniqueConstraint) and constraint.fields:
+            names.add(constraint.fields[0])
+    for together in list(opts.unique_together) + list(getattr(opts, 'index_together', None) or []):
+        if together:
+            names.add(together[0])
+    return names
+
+
+
+def get_checked_filter_fields(model_class):
+    """
+    Declared "viewset" -> "filter_fields" of definition (default filter
+    fields too if enabled by 'checks' -> 'default_filter_fields' setting)
+    """
+    from .viewsetgen import get_filter_fields
+
+    viewset_pref = getattr(model_class, 'DRFS_MODEL_DEFINITION', {}).get('viewset', {})
+    if 'filter_fields' in viewset_pref or helpers.get_drf_generator_setting('checks', 'default_filter_fields', default=False):
+        return get_filter_fields(model_class)
+    return []
+
+
+
+def get_unindexed_filter_fields(model_class):
+    indexed = get_indexed_field_names(model_class)
+    names = []
+    for name in get_checked_filter_fields(model_class):
+        try:
+            field = model_class._meta.get_field(name)
+        except FieldDoesNotExist:
+            continue
+        if not field.concrete or field.many_to_many or isinstance(field, JSON_FIELD_CLASSES):
+            # joins by indexed columns, JSON values have no index
+            continue
+        if name not in indexed:
+            names.append(name)
+    return names
+
+
+
+@checks.register(TAG)
+def check_filter_fields_indexes(app_configs=None, **kwargs):
+    if app_configs is None:
+        model_classes = apps.get_models()
+    else:
+        model_classes = [m for app_config in app_configs for m in app_config.get_models()]
+    errors = []
+    for model_class in model_classes:
+        if 'DRFS_MODEL_DEFINITION' not in model_class.__dict__:
+            continue
+        names = get_unindexed_filter_fields(model_class)
+        if not names:
+            continue
+        errors.append(checks.Warning(
+            "Filter fields of viewset of '%s' have no database index: %s" % (
+                model_class._meta.label, ', '.join(names)
+            ),
+            hint="Add \"index\": true to properties, declare \"options\" -> \"indexes\" "
+                "or change \"viewset\" -> \"filter_fields\" of model definition",
+            obj=model_class,
+            id='drfs.W001',
+        ))
+    return errors
@@ -0,0 +1,539 @@
+"""
+Ahead-of-time code generation.
+
+drfs_codegen management command renders models, serializers and viewsets
+generated from <app>/models.json/*.json into plain python modules:
+
+    <app>/models_generated.py       MODELS = {definition name: model class}
+    <app>/serializers_generated.py  SERIALIZERS = {definition name: serializer class}
+    <app>/viewsets_generated.py     VIEWSETS = {definition name: viewset class}
+
+With DRF_GENERATOR['codegen']['enabled'] = True generate_model, generate_serializer
+and generate_viewset (called without kwargs) return classes from these modules
+if they are up to date with definitions. Otherwise classes are built at runtime as usual.
+"""
+import os, hashlib, importlib, json, pprint
+from collections import OrderedDict
+
+from django.db.migrations.serializer import serializer_factory
+
+from .registry import registry
+from . import helpers
+from .spec import FieldSpec
+
+
+CODEGEN_VERSION = 3
+DIGEST_HEADER = '# drfs-codegen-digest: '
+IGNORED_SETTINGS = ['codegen', 'cache', 'checks']
+MODULE_SUFFIXES = {
+    'models': 'models_generated',
+    'serializers': 'serializers_generated',
+    'viewsets': 'viewsets_generated'
+}
+
+
+
+class CodegenError(Exception):
+    pass
+
+
+
+def is_enabled():
+    return bool(helpers.get_drf_generator_setting('codegen', 'enabled', default=False))
+
+
+
+def get_app_dir(module_name):
+    for entry in registry.model_definitions(app=module_name):
+        return os.path.dirname(os.path.dirname(entry.path))
+    return None
+
+
+
+def get_module_path(module_name, kind):
+    app_dir = get_app_dir(module_name)
+    if not app_dir:
+        return None
+    return os.path.join(app_dir, MODULE_SUFFIXES[kind] + '.py')
+
+
+
+def get_app_digest(module_name):
+    """
+    Digest of everything generated code for app depends on: definitions
+    of app and settings that are baked into generated modules.
+    """
+    from django.conf import settings
+    rest_framework = getattr(settings, 'REST_FRAMEWORK', {})
+    # generators, codec and validator settings (not where generated code and cache are kept)
+    drf_generator = dict([
+        (k, v)
+        for k, v in (getattr(settings, 'DRF_GENERATOR', None) or {}).items()
+        if k not in IGNORED_SETTINGS
+    ])
+    h = hashlib.sha1()
+    h.update(('drfs-codegen:%s\n' % CODEGEN_VERSION).encode('utf-8'))
+    h.update(('AUTH_USER_MODEL:%s\n' % getattr(settings, 'AUTH_USER_MODEL', '')).encode('utf-8'))
+    h.update(('DEFAULT_FILTER_BACKENDS:%r\n' % (list(rest_framework.get('DEFAULT_FILTER_BACKENDS', [])),)).encode('utf-8'))
+    h.update(('DRF_GENERATOR:%s\n' % json.dumps(drf_generator, sort_keys=True, default=repr)).encode('utf-8'))
+    h.update(('DRF_GENERATOR_USE_NATIVE_JSON_FIELD:%r\n' % bool(
+        getattr(settings, 'DRF_GENERATOR_USE_NATIVE_JSON_FIELD', False)
+    )).encode('utf-8'))
+    for entry in sorted(registry.model_definitions(app=module_name), key=lambda e: e.name):
+        h.update(('%s:%s\n' % (entry.name, registry.digest(entry.path))).encode('utf-8'))
+    # embedded models of any app may be used by definitions of app
+    for entry in sorted(registry.embedded_definitions(), key=lambda e: (e.name, e.path)):
+        h.update(('embedded:%s:%s\n' % (entry.name, registry.digest(entry.path))).encode('utf-8'))
+    return h.hexdigest()
+
+
+
+def read_digest(path):
+    try:
+        with open(path, 'r') as f:
+            for line in f:
+                if line.startswith(DIGEST_HEADER):
+                    return line[len(DIGEST_HEADER):].strip()
+                if not line.startswith('#'):
+                    break
+    except (IOError, OSError):
+        pass
+    return None
+
+
+
+def is_up_to_date(module_name, kind):
+    path = get_module_path(module_name, kind)
+    if not path or not os.path.isfile(path):
+        return False
+    return read_digest(path) == get_app_digest(module_name)
+
+
+
+__generated_modules = {}
+def get_generated_module(module_name, kind):
+    """
+    Returns generated module of 'kind' for app or None if codegen is disabled,
+    module does not exist or is outdated.
+    """
+    if not is_enabled() or not module_name:
+        return None
+    key = (module_name, kind)
+    if key not in __generated_modules:
+        module = None
+        if is_up_to_date(module_name, kind):
+            try:
+                module = importlib.import_module('%s.%s' % (module_name, MODULE_SUFFIXES[kind]))
+            except ImportError:
+                module = None
+        __generated_modules[key] = module
+    return __generated_modules[key]
+
+
+
+def reset():
+    __generated_modules.clear()
+
+
+
+def get_model_app(model_class):
+    module_name = model_class.__module__
+    suffix = '.' + MODULE_SUFFIXES['models']
+    if module_name.endswith(suffix):
+        return module_name[:-len(suffix)]
+    return module_name
+
+
+
+def get_generated_model(name, module_name):
+    module = get_generated_module(module_name, 'models')
+    if not module:
+        return None
+    return getattr(module, 'MODELS', {}).get(name.replace('.json', ''), None)
+
+
+
+def get_generated_serializer(model_class):
+    module = get_generated_module(get_model_app(model_class), 'serializers')
+    if not module:
+        return None
+    serializer_class = getattr(module, 'SERIALIZERS', {}).get(model_class.__name__, None)
+    if serializer_class is None or serializer_class.Meta.model is not model_class:
+        return None
+    return serializer_class
+
+
+
+def get_generated_viewset(model_class):
+    module = get_generated_module(get_model_app(model_class), 'viewsets')
+    if not module:
+        return None
+    viewset_class = getattr(module, 'VIEWSETS', {}).get(model_class.__name__, None)
+    if viewset_class is None or viewset_class.queryset.model is not model_class:
+        return None
+    return viewset_class
+
+
+
+
+class ModuleWriter(object):
+    """
+    Collects imports and lines of generated module.
+    'local' maps classes defined in this module to their names.
+    """
+    def __init__(self, module_name, kind):
+        self.module_name = module_name
+        self.kind = kind
+        self.imports = set()
+        self.lines = []
+        self.local = {}
+
+
+    def class_path(self, cls):
+        module_name = cls.__module__
+        qualname = getattr(cls, '__qualname__', cls.__name__)
+        if '<locals>' not in qualname:
+            try:
+                obj = importlib.import_module(module_name)
+                for part in qualname.split('.'):
+                    obj = getattr(obj, part)
+            except (ImportError, AttributeError):
+                obj = None
+            if obj is cls:
+                return module_name, qualname
+        # model generated by drfs at runtime
+        entry = registry.find_model(cls.__name__)
+        if entry and entry.module_name == get_model_app(cls) and hasattr(cls, '_meta'):
+            return '%s.%s' % (entry.module_name, MODULE_SUFFIXES['models']), cls.__name__
+        raise CodegenError("DRFS: Unable to reference class %r from generated code" % cls)
+
+
+    def ref(self, cls):
+        if cls in self.local:
+            return self.local[cls]
+        from django.db import models
+        if cls.__module__.startswith('django.db.models') and getattr(models, cls.__name__, None) is cls:
+            return self.path_ref('django.db.models.' + cls.__name__)
+        module_name, qualname = self.class_path(cls)
+        self.imports.add('import %s' % module_name)
+        return '%s.%s' % (module_name, qualname)
+
+
+    def path_ref(self, path):
+        module_name, name = path.rsplit('.', 1)
+        if module_name == 'django.db.models':
+            self.imports.add('from django.db import models')
+            return 'models.' + name
+        self.imports.add('import %s' % module_name)
+        return path
+
+
+    def value(self, value):
+        if isinstance(value, type):
+            return self.ref(value)
+        if isinstance(value, FieldSpec):
+            value = dict(value.params)
+        try:
+            string, imports = serializer_factory(value).serialize()
+        except ValueError as e:
+            raise CodegenError("DRFS: Unable to render value %r in generated code. %s" % (value, e))
+        self.imports.update(imports)
+        return string
+
+
+    def call(self, func_ref, args, kwargs):
+        params = [self.value(a) for a in args]
+        params += [
+            '%s=%s' % (k, self.value(kwargs[k]))
+            for k in sorted(kwargs)
+        ]
+        return '%s(%s)' % (func_ref, ', '.join(params))
+
+
+    def assign(self, name, value, indent=4):
+        prefix = '%s%s = ' % (' ' * indent, name)
+        try:
+            text = pprint.pformat(value, width=100 - len(prefix), sort_dicts=False)
+        except TypeError:
+            # python < 3.8. pformat sorts dict keys and key order of definitions matters
+            text = repr(value)
+        self.add(prefix + text.replace('\n', '\n' + ' ' * len(prefix)))
+
+
+    def add(self, *lines):
+        self.lines.extend(lines)
+
+
+    def render(self, digest):
+        header = [
+            '# -*- coding: utf-8 -*-',
+            '# Generated by drfs_codegen. Do not edit.',
+            DIGEST_HEADER + digest,
+        ]
+        imports = sorted(self.imports, key=lambda i: (i.split()[0] == 'from', i))
+        return '\n'.join(header + imports + ['', ''] + self.lines) + '\n'
+
+
+
+
+def deconstruct_field(field):
+    from .db import fields as drfs_fields
+    from .db.validators import EmbeddedValidator
+
+    name, path, args, kwargs = field.deconstruct()
+    if isinstance(field, drfs_fields.BaseEmbedded):
+        # field adds EmbeddedValidator by itself from embedded_model_name
+        validators = [
+            v
+            for v in kwargs.pop('validators', None) or []
+            if not isinstance(v, EmbeddedValidator)
+        ]
+        if validators:
+            kwargs['validators'] = validators
+        if getattr(field, 'embedded_model_name', None):
+            kwargs['embedded_model_name'] = field.embedded_model_name
+    if isinstance(field, drfs_fields.EmbeddedManyAsObjectModel) and field.embedded_keys.get('autoclean', False):
+        kwargs['keys'] = field.embedded_keys
+    return name, path, args, kwargs
+
+
+
+def render_model(writer, name, model_class):
+    from .generators.model._DjangoOrmModelGenerator import REGISTERED_RECEIVERS
+
+    opts = model_class._meta
+    bases = ', '.join([writer.ref(b) for b in model_class.__bases__])
+    writer.add('class %s(%s):' % (model_class.__name__, bases))
+    definition = model_class.__dict__.get('DRFS_MODEL_DEFINITION', None)
+    declared = list((definition or {}).get('properties', {}).keys()) + \
+        list((definition or {}).get('relations', {}).keys())
+    inherited = set([
+        field.name
+        for base in model_class.__bases__
+        if getattr(getattr(base, '_meta', None), 'abstract', False)
+        for field in base._meta.fields + base._meta.many_to_many
+    ])
+    for field in opts.local_fields + opts.local_many_to_many:
+        if field.auto_created or (field.name in inherited and field.name not in declared):
+            continue
+        field_name, path, args, kwargs = deconstruct_field(field)
+        writer.add('    %s = %s' % (field_name, writer.call(writer.path_ref(path), args, kwargs)))
+
+    if definition is not None:
+        writer.assign('DRFS_MODEL_DEFINITION', definition)
+
+    writer.add('', '    class Meta:')
+    writer.add('        abstract = %r' % bool(opts.abstract))
+    for option in ['ordering', 'unique_together', 'indexes', 'constraints']:
+        if opts.original_attrs.get(option, None):
+            # indexes of opts are named by django
+            writer.add('        %s = %s' % (option, writer.value(getattr(opts, option))))
+    representation = (definition or {}).get('representation', {})
+    if representation.get('name', None) and str(opts.verbose_name) == str(representation['name']):
+        writer.imports.add('from django.utils.translation import gettext_lazy as _')
+        writer.add('        verbose_name = _(%r)' % str(opts.verbose_name))
+        writer.add('        verbose_name_plural = _(%r)' % str(opts.verbose_name_plural))
+    writer.add('', '')
+
+    for field_name in REGISTERED_RECEIVERS.get(model_class.__name__, {}).get('delete_hasMany', []):
+        writer.imports.add('from drfs.generators.model._DjangoOrmModelGenerator import register_has_many_cascade')
+        writer.add('register_has_many_cascade(%r, %r, %s)' % (
+            model_class.__name__, field_name, model_class.__name__
+        ), '', '')
+    writer.local[model_class] = model_class.__name__
+
+
+
+def render_models_module(module_name, models):
+    """
+    models - OrderedDict: definition name -> model class (see drfs.generate_models).
+    Returns source of <app>/models_generated.py
+    """
+    writer = ModuleWriter(module_name, 'models')
+    for name, model_class in models.items():
+        render_model(writer, name, model_class)
+    writer.add('MODELS = {')
+    for name, model_class in models.items():
+        writer.add('    %r: %s,' % (name, writer.local[model_class]))
+    writer.add('}')
+    return writer.render(get_app_digest(module_name))
+
+
+
+
+def render_serializer(writer, serializer_class, var_name):
+    from rest_framework.serializers import BaseSerializer, ListSerializer
+
+    declared = OrderedDict()
+    for field_name, field in serializer_class._declared_fields.items():
+        inherited = False
+        for base in serializer_class.__mro__[1:]:
+            if getattr(base, '_declared_fields', {}).get(field_name, None) is field:
+                inherited = True
+        if not inherited:
+            declared[field_name] = field
+
+    fields = []
+    for field_name, field in declared.items():
+        if isinstance(field, ListSerializer) and isinstance(field.child, BaseSerializer):
+            child_var = render_serializer(writer, field.child.__class__, '%s__%s' % (var_name, field_name))
+            kwargs = dict(field.child._kwargs)
+            kwargs['many'] = True
+            fields.append((field_name, writer.call(child_var, field.child._args, kwargs)))
+        elif isinstance(field, BaseSerializer):
+            child_var = render_serializer(writer, field.__class__, '%s__%s' % (var_name, field_name))
+            fields.append((field_name, writer.call(child_var, field._args, field._kwargs)))
+        else:
+            fields.append((field_name, writer.call(writer.ref(field.__class__), field._args, field._kwargs)))
+
+    meta = serializer_class.Meta
+    model_ref = writer.ref(meta.model)
+    bases = []
+    for base in serializer_class.__bases__:
+        if '<locals>' in getattr(base, '__qualname__', '') and 'Meta' in base.__dict__:
+            # DRFS_Serializer holder of Meta class
+            holder = '%s__Meta' % var_name
+            writer.add('class %s(object):' % holder)
+            writer.add('    class Meta:')
+            writer.add('        model = ' + model_ref)
+            writer.assign('fields', list(meta.fields), indent=8)
+            writer.assign('read_only_fields', list(getattr(meta, 'read_only_fields', [])), indent=8)
+            writer.assign('expandable_fields', getattr(meta, 'expandable_fields', {}), indent=8)
+            writer.add('', '')
+            bases.append(holder)
+        else:
+            bases.append(writer.ref(base))
+
+    writer.add('class %s(%s):' % (var_name, ', '.join(bases)))
+    writer.add("    DRFS_MODEL_DEFINITION = getattr(%s, 'DRFS_MODEL_DEFINITION', {})" % model_ref)
+    for field_name, code in fields:
+        writer.add('    %s = %s' % (field_name, code))
+    writer.add('', '')
+    if var_name != serializer_class.__name__:
+        writer.add('%s.__name__ = %s.__qualname__ = %r' % (var_name, var_name, serializer_class.__name__))
+    if 'build_relational_field' in serializer_class.__dict__:
+        writer.imports.add('from drfs.generators.serializer._DjangoRestSerializerGenerator import bind_build_relational_field')
+        writer.add("bind_build_relational_field(%s, %s.DRFS_MODEL_DEFINITION.get('relations', {}))" % (var_name, var_name))
+    writer.add('', '')
+    writer.local[serializer_class] = var_name
+    return var_name
+
+
+
+def render_serializers_module(module_name, serializers):
+    """
+    serializers - OrderedDict: definition name -> serializer class.
+    Returns source of <app>/serializers_generated.py
+    """
+    writer = ModuleWriter(module_name, 'serializers')
+    for name, serializer_class in serializers.items():
+        render_serializer(writer, serializer_class, name)
+    writer.add('SERIALIZERS = {')
+    for name, serializer_class in serializers.items():
+        writer.add('    %r: %s,' % (name, writer.local[serializer_class]))
+    writer.add('}')
+    return writer.render(get_app_digest(module_name))
+
+
+
+
+def render_viewset(writer, viewset_class, serializer_var):
+    params = viewset_class.__dict__
+    bases = viewset_class.__bases__[0].__bases__
+    model_ref = writer.ref(params['queryset'].model) if 'queryset' in params else writer.ref(viewset_class.queryset.model)
+    writer.add('class %s(%s):' % (viewset_class.__name__, ', '.join([writer.ref(b) for b in bases])))
+    if 'queryset' in params:
+        writer.add('    queryset = %s.objects.all()' % model_ref)
+    if 'serializer_class' in params:
+        writer.add('    serializer_class = ' + serializer_var)
+    if 'filter_backends' in params:
+        writer.add('    filter_backends = (%s)' % ''.join([writer.ref(b) + ', ' for b in params['filter_backends']]).strip())
+    if 'filter_fields' in params:
+        writer.assign('filter_fields', tuple(params['filter_fields']))
+    if 'permission_classes' in params:
+        writer.add('    permission_classes = [%s]' % ', '.join([writer.ref(p) for p in params['permission_classes']]))
+    writer.add('', '')
+    writer.imports.add('from drfs.viewsetgen import decorate_viewset_actions')
+    writer.add("decorate_viewset_actions(%s, %s.DRFS_MODEL_DEFINITION.get('viewset', {}).get('acl', []))" % (
+        viewset_class.__name__, model_ref
+    ))
+    writer.add('', '')
+    writer.local[viewset_class] = viewset_class.__name__
+
+
+
+def render_viewsets_module(module_name, viewsets):
+    """
+    viewsets - OrderedDict: definition name -> viewset class.
+    Returns source of <app>/viewsets_generated.py
+    """
+    writer = ModuleWriter(module_name, 'viewsets')
+    serializers_module = '%s.%s' % (module_name, MODULE_SUFFIXES['serializers'])
+    writer.imports.add('import %s' % serializers_module)
+    for name, viewset_class in viewsets.items():
+        render_viewset(writer, viewset_class, '%s.SERIALIZERS[%r]' % (serializers_module, name))
+    writer.add('VIEWSETS = {')
+    for name, viewset_class in viewsets.items():
+        writer.add('    %r: %s,' % (name, writer.local[viewset_class]))
+    writer.add('}')
+    return writer.render(get_app_digest(module_name))
+
+
+
+
+def get_generated_model_names(module_name):
+    """
+    Definition names of models that app generates (already built by
+    drfs.generate_model calls of app). Generated module registers every
+    model it renders, so definitions that app never uses are not rendered
+    """
+    from . import get_model
+    names = []
+    for entry in registry.model_definitions(app=module_name):
+        model_class = get_model(entry.name, latest=True)
+        if model_class is None or get_model_app(model_class) != module_name:
+            continue
+        if model_class._meta.abstract or 'DRFS_MODEL_DEFINITION' in model_class.__dict__:
+            names.append(entry.name)
+    return names
+
+
+
+def generate_app(module_name, errors=None):
+    """
+    Builds models, serializers and viewsets of app at runtime and renders them.
+    Returns dict: kind -> source
+    """
+    from . import generate_models, get_serializer_generator_class
+    from .viewsetgen import ViewsetGenFactory
+
+    models = generate_models(app=module_name, errors=errors, names=get_generated_model_names(module_name))
+    serializers = OrderedDict()
+    viewsets = OrderedDict()
+    for name, model_class in models.items():
+        if model_class._meta.abstract:
+            continue
+        serializers[name] = get_serializer_generator_class()(model_class).to_serializer()
+        viewsets[name] = ViewsetGenFactory(model_class, serializer_class=serializers[name])
+
+    return {
+        'models': render_models_module(module_name, models),
+        'serializers': render_serializers_module(module_name, serializers),
+        'viewsets': render_viewsets_module(module_name, viewsets)
+    }
+
+
+
+def write_app(module_name, errors=None):
+    """
+    Writes generated modules for app. Returns list of written paths
+    """
+    paths = []
+    for kind, source in generate_app(module_name, errors=errors).items():
+        path = get_module_path(module_name, kind)
+        with open(path + '.tmp', 'w') as f:
+            f.write(source)
+        os.replace(path + '.tmp', path)
+        paths.append(path)
+    reset()
+    return paths
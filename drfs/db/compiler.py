@@ -0,0 +1,179 @@
+"""
+Compiles embedded model definition into one python function.
+
+Compiled function is equivalent of EmbeddedValidator.schema.validate(data)
+for valid data: it returns the same new dict (validated values, nested
+embedsOne dicts, defaults). Type checks, choices (set membership), min/max
+bounds and defaults are inlined, so there is no generic dispatch of
+'schema' library per value.
+
+On any invalid value compiled function just raises Fallback (or error of
+nested validator) and validator re-runs 'schema' engine, so error messages
+stay exactly the same. Any other exception is a bug and is not hidden.
+"""
+
+
+class Fallback(Exception):
+    pass
+
+
+
+class FunctionWriter(object):
+    def __init__(self):
+        self.lines = []
+        self.namespace = {
+            'Fallback': Fallback
+        }
+
+    def add(self, indent, line):
+        self.lines.append('    ' * indent + line)
+
+    def bind(self, name, value):
+        self.namespace[name] = value
+        return name
+
+    def fail_if(self, indent, condition):
+        self.add(indent, 'if %s:' % condition)
+        self.add(indent + 1, 'raise Fallback')
+
+    def compile(self, filename):
+        source = '\n'.join(self.lines) + '\n'
+        exec(compile(source, filename, 'exec'), self.namespace)
+        func = self.namespace['validate']
+        func.source = source
+        return func
+
+
+
+def is_compilable(spec):
+    names = [field.name for field in spec.fields]
+    if len(set(names)) != len(names):
+        return False
+    for field in spec.fields:
+        # 'schema' engine validates embedded properties and not embedded relations
+        # in a different (list based) way. Leave them to it
+        if field.is_embedded != (field.name in spec.relations):
+            return False
+    return True
+
+
+
+def write_field_checks(writer, validator, field, i, indent):
+    """
+    Checks of value 'v' of not embedded field (see EmbeddedValidator.build_schema)
+    """
+    required = field.is_required
+    def check(condition):
+        if required:
+            writer.fail_if(indent, 'not (%s)' % condition)
+        else:
+            writer.fail_if(indent, 'v is not None and not (%s)' % condition)
+
+    expected_types = validator.types.get(field.type, None)
+    if field.type != 'any' and expected_types is not None:
+        check('isinstance(v, %s)' % writer.bind('TYPES_%s' % i, expected_types))
+
+    if field.type in ['int', 'float', 'number']:
+        if 'min' in field:
+            check('v >= %s' % writer.bind('MIN_%s' % i, field.min))
+        if 'max' in field:
+            check('v <= %s' % writer.bind('MAX_%s' % i, field.max))
+
+    if field.type in ['string']:
+        if 'min' in field:
+            writer.fail_if(indent, "not (len(v or '') >= %s)" % writer.bind('MIN_%s' % i, field.min))
+        if 'max' in field:
+            writer.fail_if(indent, "not (len(v or '') <= %s)" % writer.bind('MAX_%s' % i, field.max))
+
+    if field.type == 'object':
+        check('isinstance(v, dict)')
+    if field.type == 'array':
+        check('isinstance(v, list)')
+
+    if field.choices:
+        has_choice = writer.bind('HAS_CHOICE_%s' % i, field.has_choice)
+        if field.type == 'array':
+            writer.add(indent, 'for x in v or []:')
+            writer.fail_if(indent + 1, 'not %s(x)' % has_choice)
+        else:
+            check('%s(v)' % has_choice)
+
+
+
+def write_embedded_checks(writer, nested, field, i, indent):
+    """
+    Checks of value 'v' of embedded relation. Values are validated by nested validators
+    """
+    key = repr(field.name)
+    if field.type == 'embedsOne':
+        validate = writer.bind('NESTED_%s' % i, nested.validate_schema)
+        writer.add(indent, 'new[%s] = %s(v)' % (key, validate))
+
+    if field.type == 'embedsMany':
+        validate = writer.bind('NESTED_%s' % i, nested._validate_data)
+        writer.fail_if(indent, 'type(v) is not list')
+        writer.add(indent, 'for e in v:')
+        writer.add(indent + 1, 'if type(e) is dict:')
+        writer.add(indent + 2, '%s(e)' % validate)
+        writer.add(indent + 1, 'elif type(e) is list:')
+        writer.add(indent + 2, 'for x in e:')
+        writer.add(indent + 3, '%s(x)' % validate)
+        writer.add(indent + 1, 'else:')
+        writer.add(indent + 2, 'raise Fallback')
+        writer.add(indent, 'new[%s] = list(v)' % key)
+
+    if field.type == 'embedsManyAsObject':
+        validate = writer.bind('NESTED_%s' % i, nested._validate_data)
+        writer.fail_if(indent, 'type(v) is not dict')
+        writer.add(indent, 'for x in v.values():')
+        writer.add(indent + 1, '%s(x)' % validate)
+
+
+
+def compile_validator(validator, spec):
+    """
+    Returns compiled validation function of embedded model or None
+    if definition can not be compiled
+    """
+    if not is_compilable(spec):
+        return None
+
+    writer = FunctionWriter()
+    writer.add(0, 'def validate(data):')
+    writer.fail_if(1, 'not isinstance(data, dict)')
+    # same key order as 'schema' engine: dicts are validated (and added) last
+    writer.add(1, 'new = {}')
+    writer.add(1, 'for k, value in data.items():')
+    writer.add(2, 'if not isinstance(value, dict):')
+    writer.add(3, 'new[k] = value')
+    writer.add(1, 'for k, value in data.items():')
+    writer.add(2, 'if isinstance(value, dict):')
+    writer.add(3, 'new[k] = value')
+    writer.add(1, 'matched = 0')
+
+    defaults = []
+    for i, field in enumerate(spec.fields):
+        key = repr(field.name)
+        has_default = field.has_default and field.default != None
+        writer.add(1, 'if %s in data:' % key)
+        writer.add(2, 'matched += 1')
+        writer.add(2, 'v = data[%s]' % key)
+        if field.is_embedded:
+            write_embedded_checks(writer, validator.nested_validators[field.name], field, i, 2)
+        else:
+            write_field_checks(writer, validator, field, i, 2)
+        writer.add(2, 'pass')
+        if field.is_required and not has_default:
+            writer.add(1, 'else:')
+            writer.add(2, 'raise Fallback')
+        if has_default:
+            defaults.append((key, writer.bind('DEFAULT_%s' % i, field.default)))
+
+    writer.fail_if(1, 'matched != len(data)')
+    for key, default in defaults:
+        writer.add(1, 'if %s not in new:' % key)
+        if callable(writer.namespace[default]):
+            default += '()'
+        writer.add(2, 'new[%s] = %s' % (key, default))
+    writer.add(1, 'return new')
+    return writer.compile('<drfs embedded validator %s>' % validator.model_name)
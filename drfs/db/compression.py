@@ -0,0 +1,92 @@
+"""
+Compression of JSON text stored by drfs JSON fields.
+
+    "storage": {
+        "compress": "zlib",     # compression format
+        "level": 6,             # compression level (optional, 0-9)
+        "threshold": 1024       # min length of JSON text to compress (optional)
+    }
+
+Compressed value is stored as text: format marker followed by base64 of
+compressed utf-8 JSON text (ex.: 'zlib:eJyrVkrLz1e...'). JSON text never
+starts with a marker, so rows written before compression was enabled (or
+values below threshold) are read as is. Value is stored compressed only if
+it gets shorter.
+
+See 'drfs_compress_json' management command.
+"""
+import base64, zlib
+
+
+COMPRESSORS = {}
+DEFAULT_THRESHOLD = 1024
+
+
+
+def register_compressor(compressor_class):
+    COMPRESSORS[compressor_class.name] = compressor_class
+    return compressor_class
+
+
+
+@register_compressor
+class ZlibCompressor(object):
+    name = 'zlib'
+    prefix = 'zlib:'
+    default_level = 6
+
+    def __init__(self, level=None, threshold=None):
+        self.level = self.default_level if level is None else int(level)
+        self.threshold = DEFAULT_THRESHOLD if threshold is None else int(threshold)
+        if not 0 <= self.level <= 9:
+            raise ValueError("DRFS: Invalid compression level %s for '%s'. Expected value from 0 to 9" % (
+                level, self.name
+            ))
+
+    def compress(self, text):
+        if len(text) < self.threshold or is_compressed(text):
+            return text
+        data = zlib.compress(text.encode('utf-8'), self.level)
+        compressed = self.prefix + base64.b64encode(data).decode('ascii')
+        if len(compressed) >= len(text):
+            return text
+        return compressed
+
+    def decompress(self, text):
+        data = base64.b64decode(text[len(self.prefix):])
+        return zlib.decompress(data).decode('utf-8')
+
+
+
+def get_compressor(name, level=None, threshold=None):
+    if name not in COMPRESSORS:
+        raise ValueError("DRFS: Unknown compression '%s'. Expected one of: %s" % (
+            name, ', '.join(COMPRESSORS.keys())
+        ))
+    return COMPRESSORS[name](level=level, threshold=threshold)
+
+
+
+def get_compressor_of_text(text):
+    for compressor_class in COMPRESSORS.values():
+        if text.startswith(compressor_class.prefix):
+            return compressor_class
+    return None
+
+
+
+def is_compressed(text):
+    return isinstance(text, str) and get_compressor_of_text(text) is not None
+
+
+
+def decompress_text(value):
+    """
+    JSON text of stored value. Not compressed values are returned as is
+    """
+    if not isinstance(value, str):
+        return value
+    compressor_class = get_compressor_of_text(value)
+    if compressor_class is None:
+        return value
+    return compressor_class().decompress(value)
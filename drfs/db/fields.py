@@ -1,9 +1,124 @@
 # -*- coding: utf-8 -*-
 import django, json, copy
+from django.apps import apps as global_apps
 from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
 from django.db import models
+from django.db.models.query_utils import DeferredAttribute
 from rest_framework.serializers import CharField
-from .validators import EmbeddedValidator
+from .validators import get_embedded_validator, consume_validated, autoclean_batch
+from .compression import get_compressor, decompress_text
+from . import operations, search
+from ..jsoncodec import get_codec
+
+
+
+class LazyJSON(object):
+    """
+    Raw text of lazy field, as it was loaded from database
+    """
+    __slots__ = ('raw',)
+
+    def __init__(self, raw):
+        self.raw = raw
+
+    @property
+    def text(self):
+        """JSON text (raw text may be compressed)"""
+        return decompress_text(self.raw)
+
+    def __reduce__(self):
+        return (LazyJSON, (self.raw,))
+
+    def __repr__(self):
+        return '<LazyJSON: %s>' % self.raw[:50]
+
+
+
+class LazyJSONAttribute(DeferredAttribute):
+    """
+    Decodes LazyJSON of instance on first access
+    """
+    def __get__(self, instance, cls=None):
+        value = super(LazyJSONAttribute, self).__get__(instance, cls)
+        if type(value) is LazyJSON:
+            value = self.field.decode_lazy(value)
+            instance.__dict__[self.field.attname] = value
+        return value
+
+    def __set__(self, instance, value):
+        # data descriptor, so __get__ is called even if value is in instance.__dict__
+        instance.__dict__[self.field.attname] = value
+
+
+
+class JSONStorageMixin(object):
+    """
+    Storage options of JSON fields ("storage" of field or model definition).
+
+    lazy=True: field keeps raw text loaded from database and parses it on
+    first access of attribute. Value that was never accessed is saved back
+    as the same text (without decoding, validation and encoding).
+    Note: values()/values_list() of lazy fields return LazyJSON
+
+    compress='zlib': JSON text longer than compress_threshold is stored
+    compressed (see drfs.db.compression). Compressed values are
+    decompressed on load whether compression is enabled or not. Compressed
+    columns can't be filtered by content
+    """
+    def __init__(self, *args, lazy=False, compress=None, compress_level=None, compress_threshold=None, **kwargs):
+        self.lazy = lazy
+        if lazy:
+            self.descriptor_class = LazyJSONAttribute
+        self.compress = compress
+        self.compress_level = compress_level
+        self.compress_threshold = compress_threshold
+        self.compressor = None
+        if compress:
+            self.compressor = get_compressor(compress, level=compress_level, threshold=compress_threshold)
+        super(JSONStorageMixin, self).__init__(*args, **kwargs)
+        if compress and isinstance(self, getattr(models, 'JSONField', ())):
+            raise ImproperlyConfigured("DRFS: Compression of JSON fields is not supported with DRF_GENERATOR_USE_NATIVE_JSON_FIELD")
+
+    def deconstruct(self):
+        name, path, args, kwargs = super(JSONStorageMixin, self).deconstruct()
+        if self.lazy:
+            kwargs['lazy'] = True
+        if self.compress:
+            kwargs['compress'] = self.compress
+            if self.compress_level is not None:
+                kwargs['compress_level'] = self.compress_level
+            if self.compress_threshold is not None:
+                kwargs['compress_threshold'] = self.compress_threshold
+        return name, path, args, kwargs
+
+    def from_db_value(self, value, expression, connection):
+        if self.lazy and type(value) is str:
+            return LazyJSON(value)
+        return self.load_db_value(decompress_text(value), expression, connection)
+
+    def load_db_value(self, value, expression, connection):
+        return super(JSONStorageMixin, self).from_db_value(value, expression, connection)
+
+    def decode_lazy(self, value):
+        return self.load_db_value(value.text, None, None)
+
+    def pre_save(self, model_instance, add):
+        value = model_instance.__dict__.get(self.attname, None)
+        if type(value) is LazyJSON:
+            return value
+        return super(JSONStorageMixin, self).pre_save(model_instance, add)
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        if type(value) is LazyJSON:
+            return value.raw
+        if hasattr(value, 'as_sql'):
+            # expression (see drfs.db.operations)
+            return value
+        value = super(JSONStorageMixin, self).get_db_prep_value(value, connection, prepared=prepared)
+        if self.compressor is not None and isinstance(value, str):
+            value = self.compressor.compress(value)
+        return value
 
 
 if django.VERSION >= (3,1,0) and getattr(settings, 'DRF_GENERATOR_USE_NATIVE_JSON_FIELD', False):
@@ -18,7 +133,7 @@ if django.VERSION >= (3,1,0) and getattr(settings, 'DRF_GENERATOR_USE_NATIVE_JSO
         Providing a mutable default object like default={} or default=[] shares the one object between all model instances.
     '''
 
-    class JSONField(JSONFieldBase):
+    class JSONField(JSONStorageMixin, JSONFieldBase):
         def __init__(self, *args, **kwargs):
             if 'encoder' not in kwargs:
                 kwargs['encoder'] = DjangoJSONEncoder
@@ -42,7 +157,17 @@ if django.VERSION >= (3,1,0) and getattr(settings, 'DRF_GENERATOR_USE_NATIVE_JSO
         def get_prep_value(self, value):
             if value is None:
                 return value
-            return json.dumps(value, cls=self.encoder, ensure_ascii=False)
+            if type(value) is LazyJSON:
+                return value.raw
+            return get_codec().dumps(value, cls=self.encoder, ensure_ascii=False)
+
+        def load_db_value(self, value, expression, connection):
+            if isinstance(value, str) and self.decoder is None:
+                try:
+                    return get_codec().loads(value)
+                except ValueError:
+                    pass
+            return super(JSONField, self).load_db_value(value, expression, connection)
 
 
     class BaseEmbedded(JSONField):
@@ -51,38 +176,67 @@ if django.VERSION >= (3,1,0) and getattr(settings, 'DRF_GENERATOR_USE_NATIVE_JSO
             if 'embedded_model_name' in kwargs:
                 self.embedded_model_name = kwargs['embedded_model_name']
                 del kwargs['embedded_model_name']
-                self.embedded_validator = EmbeddedValidator(self.embedded_model_name)
+                self.embedded_validator = get_embedded_validator(self.embedded_model_name)
                 kwargs['validators'] = kwargs.get('validators', None) or []
-                kwargs['validators'].append(EmbeddedValidator(self.embedded_model_name))
+                kwargs['validators'].append(self.embedded_validator)
             super(BaseEmbedded, self).__init__(*args, **kwargs)
 
         def _validate_value(self, value):
             raise NotImplementedError
 
+        def _consume_validated(self, value):
+            return consume_validated(value, getattr(self, 'embedded_model_name', None))
+
         def get_prep_value(self, value):
             if value is None:
                 return value
-            return json.dumps(
+            if type(value) is LazyJSON:
+                return value.raw
+            return get_codec().dumps(
                 self._validate_value(value),
-                cls=self.encoder
+                cls=self.encoder,
+                ensure_ascii=False
             )
 
 else:
     try:
         from jsonfield.fields import JSONFieldBase
 
-        class JSONField(JSONFieldBase, models.TextField):
+        class JSONField(JSONStorageMixin, JSONFieldBase, models.TextField):
             def __init__(self, *args, encoder=None, decoder=None, **kwargs):
                 super(JSONField, self).__init__(*args, **kwargs)
 
+            def get_prep_value(self, value):
+                if type(value) is LazyJSON:
+                    return value.raw
+                return super(JSONField, self).get_prep_value(value)
+
     except ImportError:
         from jsonfield.fields import JSONFieldMixin as JSONFieldBase
+        from jsonfield.json import JSONString
         #from .forms import JSONFormField
 
-        class JSONField(JSONFieldBase, models.TextField):
+        class JSONField(JSONStorageMixin, JSONFieldBase, models.TextField):
             def __init__(self, *args, encoder=None, decoder=None, **kwargs):
                 super(JSONField, self).__init__(*args, **kwargs)
 
+            def get_prep_value(self, value):
+                if self.null and value is None:
+                    return None
+                if type(value) is LazyJSON:
+                    return value.raw
+                return get_codec().dumps(value, **self.dump_kwargs)
+
+            def load_db_value(self, value, expression, connection):
+                if isinstance(value, str) and not isinstance(value, JSONString) and not self.load_kwargs:
+                    try:
+                        value = get_codec().loads(value)
+                    except ValueError:
+                        pass
+                    else:
+                        return JSONString(value) if isinstance(value, str) else value
+                return super(JSONField, self).load_db_value(value, expression, connection)
+
 
             def formfield(self, **kwargs):
                 #kwargs['form_class'] = JSONFormField
@@ -97,9 +251,9 @@ else:
             if 'embedded_model_name' in kwargs:
                 self.embedded_model_name = kwargs['embedded_model_name']
                 del kwargs['embedded_model_name']
-                self.embedded_validator = EmbeddedValidator(self.embedded_model_name)
+                self.embedded_validator = get_embedded_validator(self.embedded_model_name)
                 kwargs['validators'] = kwargs.get('validators', None) or []
-                kwargs['validators'].append(EmbeddedValidator(self.embedded_model_name))
+                kwargs['validators'].append(self.embedded_validator)
             super(BaseEmbedded, self).__init__(*args, **kwargs)
             if hasattr(self, 'encoder_kwargs'):
                 self.encoder_kwargs['ensure_ascii'] = False
@@ -109,10 +263,15 @@ else:
         def _validate_value(self, value):
             raise NotImplementedError
 
+        def _consume_validated(self, value):
+            return consume_validated(value, getattr(self, 'embedded_model_name', None))
+
         def get_db_prep_value(self, value, connection, prepared=False):
             """Convert JSON object to a string"""
             if self.null and value is None:
                 return None
+            if type(value) is LazyJSON:
+                return value.raw
             return super(BaseEmbedded, self).get_db_prep_value(
                 self._validate_value(value),
                 connection,
@@ -143,38 +302,213 @@ class TimeZoneSerializer(CharField):
 
 class EmbeddedOneModel(BaseEmbedded):
     def _validate_value(self, value):
-        if not self.embedded_validator:
+        if not self.embedded_validator or self._consume_validated(value):
             return value
         return self.embedded_validator.validate_data(value)
 
 
 class EmbeddedManyModel(BaseEmbedded):
+    search_index_model = None
+
+    def __init__(self, *args, **kwargs):
+        self.searchable = list(kwargs.pop('searchable', None) or [])
+        super(EmbeddedManyModel, self).__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super(EmbeddedManyModel, self).deconstruct()
+        if self.searchable:
+            kwargs['searchable'] = list(self.searchable)
+        return name, path, args, kwargs
+
+    def contribute_to_class(self, cls, name, *args, **kwargs):
+        super(EmbeddedManyModel, self).contribute_to_class(cls, name, *args, **kwargs)
+        if not self.searchable or cls._meta.abstract or cls._meta.apps is not global_apps:
+            # historical models of migrations get index model from migration state
+            return
+        # side table of searchable properties of items (see drfs.db.search)
+        self.search_index_model = search.create_search_index_model(self, cls)
+        models.signals.post_save.connect(
+            self.update_search_index,
+            sender=cls,
+            weak=False,
+            dispatch_uid='drfs_search_index_%s_%s_%s' % (cls._meta.label_lower, name, id(cls))
+        )
+
+    def update_search_index(self, sender, instance, created=False, update_fields=None, using=None, **kwargs):
+        if update_fields is not None and self.name not in update_fields:
+            return
+        value = instance.__dict__.get(self.attname, None)
+        if type(value) is LazyJSON or self.attname not in instance.__dict__:
+            # value is not loaded or not changed
+            return
+        search.rebuild_search_index(self, instance, value, using=using, created=created)
+
     def _validate_value(self, value):
-        if not self.embedded_validator:
+        if not self.embedded_validator or self._consume_validated(value):
             return value
-        i = 0
-        for item in value or []:
-            value[i] = self.embedded_validator.validate_data(item)
-            i += 1
+        with autoclean_batch() as batch:
+            self.embedded_validator.collect_autoclean_ids(value, batch, many=True)
+            if value:
+                value[:] = self.embedded_validator.validate_many(value)
         return value
 
+    def append(self, instance, item):
+        """
+        Appends item to value of instance in database (see drfs.db.operations)
+        """
+        return operations.append(self, instance, item)
+
+    def patch_item(self, instance, index, changes):
+        return operations.patch_item(self, instance, index, changes)
+
 
 class EmbeddedManyAsObjectModel(BaseEmbedded):
     def __init__(self, *args, **kwargs):
         self.embedded_keys = kwargs.pop('keys', None) or {'autoclean': False}
         super(EmbeddedManyAsObjectModel, self).__init__(*args, **kwargs)
 
+    def has_autoclean_keys(self):
+        return bool(
+            self.embedded_keys.get('autoclean', False) and
+            self.embedded_keys.get('model', None) and
+            self.embedded_keys.get('type', None) == 'model'
+        )
+
     def _validate_value(self, value):
         if not self.embedded_validator or not value:
             return value
 
-        for key in value:
-            value[key] = self.embedded_validator.validate_data(value[key])
+        # all model ids of value are checked in one query per model
+        with autoclean_batch() as batch:
+            if self.has_autoclean_keys():
+                batch.add(self.embedded_keys['model'], value)
+            if not self._consume_validated(value):
+                self.embedded_validator.collect_autoclean_ids(value, batch, many=True)
+                for key in value:
+                    value[key] = self.embedded_validator.validate_data(value[key])
 
-        if self.embedded_keys.get('autoclean', False) and self.embedded_keys.get('model', None) and self.embedded_keys.get('type', None) == 'model':
-            value = self.embedded_validator.clean_id_model_keys_in_data(
-                value,
-                model_name=self.embedded_keys['model']
-            )
+            if self.has_autoclean_keys():
+                value = batch.clean(value, self.embedded_keys['model'])
+
+        return value
 
+    def set_key(self, instance, key, item):
+        """
+        Sets one key of value of instance in database (see drfs.db.operations)
+        """
+        return operations.set_key(self, instance, key, item)
+
+    def remove_key(self, instance, key):
+        return operations.remove_key(self, instance, key)
+
+    def patch_item(self, instance, key, changes):
+        return operations.patch_item(self, instance, key, changes)
+
+
+
+
+def get_embedded_index_field_name(source, key):
+    return '%s_%s_idx' % (source, key)
+
+
+
+class EmbeddedIndexMixin(object):
+    """
+    Denormalized and indexed copy of one property of embedsOne field
+    ("index": true on property of embedded model definition). Value is
+    taken from source field on every save (insert, update, bulk_create);
+    save(update_fields=[source]) also saves columns of source (see
+    EmbeddedIndexModelMixin). QuerySet.update() and bulk_update() of source
+    field don't update it: run 'drfs_rebuild_embedded_indexes' command
+    (or pass columns to bulk_update too)
+    """
+    def __init__(self, *args, embedded_source=None, embedded_key=None, embedded_default=None, **kwargs):
+        self.embedded_source = embedded_source
+        self.embedded_key = embedded_key
+        self.embedded_default = embedded_default
+        kwargs['null'] = True
+        kwargs['blank'] = True
+        kwargs['editable'] = False
+        kwargs['db_index'] = True
+        super(EmbeddedIndexMixin, self).__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super(EmbeddedIndexMixin, self).deconstruct()
+        for k in ['null', 'blank', 'editable', 'db_index']:
+            kwargs.pop(k, None)
+        kwargs['embedded_source'] = self.embedded_source
+        kwargs['embedded_key'] = self.embedded_key
+        if self.embedded_default is not None:
+            kwargs['embedded_default'] = self.embedded_default
+        return name, path, args, kwargs
+
+    def convert_index_value(self, value):
+        raise NotImplementedError
+
+    def get_index_value(self, source_value):
+        if not isinstance(source_value, dict):
+            return None
+        return self.convert_index_value(source_value.get(self.embedded_key, self.embedded_default))
+
+    def pre_save(self, model_instance, add):
+        source_value = model_instance.__dict__.get(self.embedded_source, None)
+        if type(source_value) is LazyJSON or self.embedded_source not in model_instance.__dict__:
+            # source value is not loaded or not changed
+            return model_instance.__dict__.get(self.attname, None)
+        value = self.get_index_value(source_value)
+        setattr(model_instance, self.attname, value)
         return value
+
+
+
+class EmbeddedIndexCharField(EmbeddedIndexMixin, models.CharField):
+    def convert_index_value(self, value):
+        # longer strings are not indexed
+        if isinstance(value, str) and len(value) <= self.max_length:
+            return value
+        return None
+
+
+class EmbeddedIndexIntegerField(EmbeddedIndexMixin, models.BigIntegerField):
+    def convert_index_value(self, value):
+        if isinstance(value, int) and not isinstance(value, bool) and -2**63 <= value < 2**63:
+            return value
+        return None
+
+
+class EmbeddedIndexFloatField(EmbeddedIndexMixin, models.FloatField):
+    def convert_index_value(self, value):
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return float(value)
+        return None
+
+
+class EmbeddedIndexBooleanField(EmbeddedIndexMixin, models.BooleanField):
+    def convert_index_value(self, value):
+        if isinstance(value, bool):
+            return value
+        return None
+
+
+
+class EmbeddedIndexModelMixin(object):
+    """
+    Base of generated models with embedded index fields: save() with
+    update_fields that has source field also saves its index columns
+    """
+    def save(self, *args, **kwargs):
+        if len(args) > 3:
+            args = list(args)
+            args[3] = self.get_embedded_index_update_fields(args[3])
+        elif kwargs.get('update_fields', None) is not None:
+            kwargs['update_fields'] = self.get_embedded_index_update_fields(kwargs['update_fields'])
+        return super(EmbeddedIndexModelMixin, self).save(*args, **kwargs)
+
+    def get_embedded_index_update_fields(self, update_fields):
+        if update_fields is None:
+            return update_fields
+        update_fields = list(update_fields)
+        for field in self._meta.concrete_fields:
+            if isinstance(field, EmbeddedIndexMixin) and field.embedded_source in update_fields and field.name not in update_fields:
+                update_fields.append(field.name)
+        return update_fields
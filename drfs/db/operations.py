@@ -0,0 +1,292 @@
+"""
+Partial updates of embedsMany/embedsManyAsObject columns.
+
+    field = Model._meta.get_field('many_embedded')          # embedsMany
+    field.append(instance, {'estring': 'new'})
+    field.patch_item(instance, 2, {'estring': 'changed'})
+
+    field = Model._meta.get_field('many_as_object')         # embedsManyAsObject
+    field.set_key(instance, 'key', {'estring': 'new'})
+    field.patch_item(instance, 'key', {'estring': 'changed'})
+    field.remove_key(instance, 'key')
+
+Only the touched item is validated. On SQLite (JSON1) and PostgreSQL the
+change is one UPDATE with database JSON functions, so the rest of the
+document is not read nor rewritten and concurrent operations on other
+items are not lost. Other backends, compressed columns and keys that can't
+be used in JSON path are updated by read-modify-write of the whole value in
+a transaction (select_for_update).
+
+Like QuerySet.update(), operations don't call save() and don't send
+signals. Loaded value of instance is updated too (lazy value that was not
+parsed yet is reloaded on next access). Search index of embedsMany field
+("searchable" option, see drfs.db.search) is rebuilt from the new value.
+"""
+import copy
+
+from django.core.exceptions import ValidationError
+from django.db import models, transaction, connections
+from django.db.models import F
+from django.db.models.expressions import Expression
+
+from .validators import autoclean_batch, mark_validated
+from . import search
+
+
+# JSON functions of database: (sql template, params) builders of operations.
+# '{column}' is column of field, '{default}' - '[]' or '{}'
+
+SQLITE_TEMPLATES = {
+    'append': "json_insert(COALESCE({column}, '[]'), '$[' || json_array_length(COALESCE({column}, '[]')) || ']', json(%s))",
+    'set': "json_set(COALESCE({column}, '{default}'), %s, json(%s))",
+    'remove': "json_remove({column}, %s)",
+    'extract': "json_quote(json_extract({column}, %s))"
+}
+
+POSTGRESQL_TEMPLATES = {
+    'append': "(COALESCE({column}::jsonb, '[]'::jsonb) || jsonb_build_array(%s::jsonb)){cast}",
+    'set': "jsonb_set(COALESCE({column}::jsonb, '{default}'::jsonb), ARRAY[%s]::text[], %s::jsonb){cast}",
+    'remove': "({column}::jsonb - %s){cast}",
+    'extract': "({column}::jsonb -> %s)::text"
+}
+
+
+
+def sqlite_path(key):
+    if isinstance(key, int):
+        return '$[%s]' % key
+    return '$."%s"' % key
+
+
+
+def get_operation_sql(connection, field, operation, column, key, text):
+    default = '[]' if isinstance(key, int) else '{}'
+    if connection.vendor == 'sqlite':
+        sql = SQLITE_TEMPLATES[operation].format(column=column, default=default)
+        path = [sqlite_path(key)] if operation != 'append' else []
+    else:
+        cast = '' if field.get_internal_type() == 'JSONField' else '::text'
+        sql = POSTGRESQL_TEMPLATES[operation].format(column=column, default=default, cast=cast)
+        path = [key if operation == 'extract' else str(key)] if operation != 'append' else []
+    return sql, path + ([text] if text is not None else [])
+
+
+
+class JSONOperation(Expression):
+    """
+    Value of JSON column changed (or read, for 'extract') by database JSON functions
+    """
+    def __init__(self, field, operation, key=None, text=None):
+        super(JSONOperation, self).__init__(output_field=models.TextField())
+        self.json_field = field
+        self.operation = operation
+        self.key = key
+        self.text = text
+        self.column = F(field.attname)
+
+    def get_source_expressions(self):
+        return [self.column]
+
+    def set_source_expressions(self, exprs):
+        self.column, = exprs
+
+    def resolve_expression(self, *args, **kwargs):
+        c = self.copy()
+        c.column = self.column.resolve_expression(*args, **kwargs)
+        return c
+
+    def as_sql(self, compiler, connection):
+        column, column_params = compiler.compile(self.column)
+        sql, params = get_operation_sql(connection, self.json_field, self.operation, column, self.key, self.text)
+        return sql, list(column_params) + params
+
+
+
+def is_many(field):
+    from .fields import EmbeddedManyModel
+    return isinstance(field, EmbeddedManyModel)
+
+
+
+def supports_json_operations(field, connection, key=None):
+    if getattr(field, 'compressor', None) is not None:
+        return False
+    if isinstance(key, int) and key < 0:
+        return False
+    if connection.vendor == 'sqlite':
+        if isinstance(key, str) and ('"' in key or '\\' in key):
+            return False
+        return bool(getattr(connection.features, 'supports_json_field', False))
+    return connection.vendor == 'postgresql'
+
+
+
+def dumps_item(field, item):
+    from .fields import JSONField
+    return JSONField.get_prep_value(field, item)
+
+
+
+def validate_item(field, item):
+    validator = field.embedded_validator
+    if not validator:
+        return item
+    with autoclean_batch() as batch:
+        validator.collect_autoclean_ids(item, batch)
+        return validator.validate_data(item)
+
+
+
+def validate_key(field, key):
+    key = str(key)
+    if field.has_autoclean_keys():
+        with autoclean_batch() as batch:
+            if not batch.clean({key: True}, field.embedded_keys['model']):
+                raise ValidationError({key: ["Object with id '%s' does not exist" % key]})
+    return key
+
+
+
+def get_queryset(instance):
+    model_class = type(instance)
+    return model_class._base_manager.using(instance._state.db or 'default').filter(pk=instance.pk)
+
+
+
+def update_instance(field, instance, modify):
+    """
+    Applies operation to loaded value of instance
+    """
+    value = instance.__dict__.get(field.attname, None)
+    if value is None or not isinstance(value, (list, dict)):
+        # not loaded, not parsed (LazyJSON) or null: reload on access
+        instance.__dict__.pop(field.attname, None)
+        return
+    modify(value)
+
+
+
+def run_operation(field, instance, operation, key, item, modify):
+    """
+    Changes one item of field value in database and in instance
+    """
+    queryset = get_queryset(instance)
+    connection = connections[queryset.db]
+    if supports_json_operations(field, connection, key):
+        text = dumps_item(field, item) if operation != 'remove' else None
+        if getattr(field, 'search_index_model', None) is not None:
+            with transaction.atomic(using=queryset.db):
+                run_json_operation(field, instance, queryset, operation, key, text)
+                update_search_index(field, instance, queryset)
+        else:
+            run_json_operation(field, instance, queryset, operation, key, text)
+        update_instance(field, instance, modify)
+        return
+
+    with transaction.atomic(using=queryset.db):
+        value = read_value(field, queryset)
+        modify(value)
+        queryset.update(**{
+            field.attname: mark_validated(value, field.embedded_model_name)
+        })
+        update_search_index(field, instance, queryset, value)
+    instance.__dict__[field.attname] = copy.deepcopy(value)
+
+
+
+def run_json_operation(field, instance, queryset, operation, key, text):
+    updated = queryset.update(**{
+        field.attname: JSONOperation(field, operation, key, text)
+    })
+    if not updated:
+        raise type(instance).DoesNotExist("%s matching query does not exist." % type(instance)._meta.object_name)
+
+
+
+def update_search_index(field, instance, queryset, value=None):
+    """
+    Rewrites rows of instance in search index of embedsMany field ("searchable" option)
+    """
+    if getattr(field, 'search_index_model', None) is None:
+        return
+    if value is None:
+        value = read_value(field, queryset)
+    search.rebuild_search_index(field, instance, value, using=queryset.db)
+
+
+
+def read_value(field, queryset):
+    obj = queryset.select_for_update().only(field.attname).first()
+    if obj is None:
+        raise queryset.model.DoesNotExist("%s matching query does not exist." % queryset.model._meta.object_name)
+    value = getattr(obj, field.attname)
+    if value is None:
+        value = [] if is_many(field) else {}
+    return value
+
+
+
+def read_item(field, instance, key):
+    """
+    One item of value in database (None if there is no such item)
+    """
+    queryset = get_queryset(instance)
+    connection = connections[queryset.db]
+    if supports_json_operations(field, connection, key):
+        text = queryset.select_for_update().annotate(
+            _drfs_item=JSONOperation(field, 'extract', key)
+        ).values_list('_drfs_item', flat=True).first()
+        return field.load_db_value(text, None, connection) if text is not None else None
+
+    value = read_value(field, queryset)
+    try:
+        return value[key]
+    except (IndexError, KeyError):
+        return None
+
+
+
+def append(field, instance, item):
+    item = validate_item(field, item)
+    run_operation(field, instance, 'append', None, item, lambda value: value.append(copy.deepcopy(item)))
+    return item
+
+
+
+def set_key(field, instance, key, item):
+    key = validate_key(field, key)
+    item = validate_item(field, item)
+    def modify(value):
+        value[key] = copy.deepcopy(item)
+    run_operation(field, instance, 'set', key, item, modify)
+    return item
+
+
+
+def remove_key(field, instance, key):
+    key = str(key)
+    def modify(value):
+        value.pop(key, None)
+    run_operation(field, instance, 'remove', key, None, modify)
+
+
+
+def patch_item(field, instance, key, changes):
+    """
+    Updates keys of one item (index of embedsMany or key of embedsManyAsObject value)
+    """
+    many = is_many(field)
+    if not many:
+        key = str(key)
+    with transaction.atomic(using=get_queryset(instance).db):
+        item = read_item(field, instance, key)
+        if not isinstance(item, dict):
+            if many:
+                raise IndexError("Item %s of '%s' does not exist" % (key, field.name))
+            raise KeyError(key)
+        item.update(changes)
+        item = validate_item(field, item)
+        def modify(value):
+            value[key] = copy.deepcopy(item)
+        run_operation(field, instance, 'set', key, item, modify)
+    return item
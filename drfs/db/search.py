@@ -0,0 +1,120 @@
+"""
+Search index of embedsMany items ("searchable" option of embedsMany relation).
+
+    "tags": {
+        "type": "embedsMany",
+        "model": "Tag",
+        "searchable": ["code", "kind"]
+    }
+
+Model gets auto created '<Model>_tags_search' model with table of
+(parent, item_index, key, value) rows and composite index on
+(key, value, parent). Rows of instance are rewritten on every save() that
+changes value of field (not with update_fields without field, not if lazy
+value was not parsed), removed with parent by cascade delete and rewritten
+by drfs.db.operations. QuerySet.update(), bulk_create() and bulk_update()
+don't update index: run 'drfs_rebuild_embedded_indexes' command.
+
+Values are stored as text: strings as is, numbers and booleans as JSON
+('1', 'true'), one row per element for lists of scalars. Strings longer than
+255 chars, objects and nulls are not indexed. See drfs.filters.filter_embedded.
+"""
+import hashlib, json
+
+from django.db import models, transaction
+
+
+MAX_KEY_LENGTH = 100
+MAX_VALUE_LENGTH = 255
+
+
+
+def get_search_value(value):
+    """
+    Text of scalar value as stored in index (None if value can't be indexed)
+    """
+    if isinstance(value, str):
+        return value if len(value) <= MAX_VALUE_LENGTH else None
+    if isinstance(value, (bool, int, float)):
+        return json.dumps(value)
+    return None
+
+
+
+def get_search_rows(field, value):
+    """
+    (item_index, key, value) of items of embedsMany value
+    """
+    rows = []
+    for index, item in enumerate(value or []):
+        if not isinstance(item, dict):
+            continue
+        for key in field.searchable:
+            item_value = item.get(key, None)
+            for v in (item_value if isinstance(item_value, list) else [item_value]):
+                v = get_search_value(v)
+                if v is not None:
+                    rows.append((index, key, v))
+    return rows
+
+
+
+def get_search_index_model_name(model_class, field_name):
+    return '%s_%s_search' % (model_class._meta.object_name, field_name)
+
+
+
+def create_search_index_model(field, model_class):
+    name = get_search_index_model_name(model_class, field.name)
+    digest = hashlib.md5(('%s.%s' % (model_class._meta.app_label, name)).encode('utf-8')).hexdigest()
+    meta = type('Meta', (object,), {
+        'app_label': model_class._meta.app_label,
+        'verbose_name': 'search index of %s.%s' % (model_class._meta.object_name, field.name),
+        'indexes': [
+            models.Index(fields=['key', 'value', 'parent'], name='drfs_%s' % digest[:20])
+        ]
+    })
+    return type(name, (models.Model,), {
+        '__module__': model_class.__module__,
+        'Meta': meta,
+        'parent': models.ForeignKey(model_class, on_delete=models.CASCADE, related_name='+'),
+        'item_index': models.PositiveIntegerField(),
+        'key': models.CharField(max_length=MAX_KEY_LENGTH),
+        'value': models.CharField(max_length=MAX_VALUE_LENGTH, null=True),
+    })
+
+
+
+def rebuild_search_index(field, instance, value, using=None, created=False):
+    """
+    Replaces index rows of instance with rows of value
+    """
+    index_model = field.search_index_model
+    using = using or instance._state.db or 'default'
+    objs = [
+        index_model(parent_id=instance.pk, item_index=index, key=key, value=v)
+        for index, key, v in get_search_rows(field, value)
+    ]
+    with transaction.atomic(using=using):
+        if not created:
+            index_model._base_manager.using(using).filter(parent_id=instance.pk).delete()
+        if objs:
+            index_model._base_manager.using(using).bulk_create(objs)
+
+
+
+def search_parent_ids(field, key, value, lookup='exact'):
+    """
+    Subquery of ids of parents with item that has given value of key.
+    Lookup is one of 'exact', 'in', 'startswith'
+    """
+    if lookup == 'in':
+        value = [get_search_value(v) for v in value]
+    elif lookup in ['exact', 'startswith']:
+        value = get_search_value(value) if not isinstance(value, str) else value
+    else:
+        raise ValueError("DRFS: Unsupported lookup '%s' of searchable embedded property" % lookup)
+    return field.search_index_model._base_manager.filter(**{
+        'key': key,
+        'value__%s' % lookup: value
+    }).values('parent_id')
@@ -1,10 +1,207 @@
-import schema, os, json, six
+import schema, os, json, six, threading, hashlib, marshal
+from collections import OrderedDict
+from contextlib import contextmanager
 from django.core.exceptions import ValidationError
+from django.core.signals import setting_changed
+from django.dispatch import receiver
 
-from ..helpers import fix_field_choices, load_embedded_model
+from ..helpers import load_embedded_model, get_drf_generator_setting
+from .. import profiling
+from .compiler import compile_validator, Fallback
+from ..spec import get_model_spec, get_field_spec
 
 
 FLOAT_TYPES = tuple([float] + list(six.integer_types))
+ENGINES = ['compiled', 'schema']
+
+
+
+def get_engine():
+    engine = get_drf_generator_setting('embedded_validator', 'engine', default='compiled')
+    if engine not in ENGINES:
+        raise ValueError("DRFS: Unknown embedded validator engine '%s'. Expected one of: %s" % (
+            engine, ', '.join(ENGINES)
+        ))
+    return engine
+
+
+
+class AutocleanBatch(object):
+    """
+    Existence of model ids used as keys of embedsManyAsObject values
+    ('keys': {'type': 'model', 'autoclean': true}).
+    Keys are collected from data first (add) and resolved in one query per
+    model on first clean. Results are kept while batch lives (see autoclean_batch)
+    """
+    def __init__(self):
+        self.known = {}
+        self.pending = {}
+        self.queries = 0
+
+    def add(self, model_name, data):
+        if not model_name or not isinstance(data, dict):
+            return
+        known = self.known.get(model_name, {})
+        pending = self.pending.setdefault(model_name, set())
+        for key in data.keys():
+            if key not in known:
+                pending.add(key)
+
+    def collect(self, instances):
+        """
+        Adds keys of all autoclean values of model instances (before bulk save)
+        """
+        from .fields import EmbeddedManyAsObjectModel, BaseEmbedded
+        for instance in instances:
+            for field in instance._meta.concrete_fields:
+                if not isinstance(field, BaseEmbedded) or not field.embedded_validator:
+                    continue
+                value = getattr(instance, field.attname, None)
+                if isinstance(field, EmbeddedManyAsObjectModel):
+                    if field.has_autoclean_keys():
+                        self.add(field.embedded_keys['model'], value)
+                    field.embedded_validator.collect_autoclean_ids(value, self, many=True)
+                else:
+                    field.embedded_validator.collect_autoclean_ids(value, self, many=isinstance(value, list))
+
+    def resolve(self, model_name):
+        from drfs import get_model
+        known = self.known.setdefault(model_name, {})
+        pending = self.pending.pop(model_name, None)
+        if not pending:
+            return known
+        ids = []
+        for key in pending:
+            known[key] = False
+            try:
+                ids.append(int(key))
+            except ValueError:
+                pass
+        if ids:
+            modelClass = get_model(model_name)
+            for id in modelClass.objects.filter(id__in=ids).values_list('id', flat=True):
+                known[str(id)] = True
+            self.queries += 1
+        return known
+
+    def clean(self, data, model_name):
+        if not model_name or not isinstance(data, dict):
+            return data
+        self.add(model_name, data)
+        known = self.resolve(model_name)
+        for key in list(data.keys()):
+            if not known.get(key, False):
+                del data[key]
+        return data
+
+
+
+__autoclean = threading.local()
+@contextmanager
+def autoclean_batch():
+    """
+    Resolves model id keys of all embedded data validated inside the block
+    in one query per model:
+
+        with autoclean_batch() as batch:
+            batch.collect(objs)
+            Model.objects.bulk_create(objs)
+
+    Nested blocks share outer batch
+    """
+    batch = getattr(__autoclean, 'batch', None)
+    if batch is not None:
+        yield batch
+        return
+    batch = AutocleanBatch()
+    __autoclean.batch = batch
+    try:
+        yield batch
+    finally:
+        __autoclean.batch = None
+
+
+
+def get_autoclean_batch():
+    return getattr(__autoclean, 'batch', None) or AutocleanBatch()
+
+
+
+JSON_SCALAR_TYPES = (str, int, float, bool, type(None))
+def is_json_data(data):
+    """
+    Is data made of dicts with string keys, lists and scalars only
+    """
+    if isinstance(data, JSON_SCALAR_TYPES):
+        return True
+    if isinstance(data, list):
+        return all([is_json_data(v) for v in data])
+    if isinstance(data, dict):
+        return all([isinstance(k, str) and is_json_data(v) for k, v in data.items()])
+    return False
+
+
+
+class ValidationCache(object):
+    """
+    Bounded LRU of validation results of one validator:
+    blake2b of canonical JSON of data -> marshalled result.
+    Only valid data is cached, results are returned as fresh copies
+    """
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_key(self, data):
+        """
+        Key of data or None if data is not cached: JSON of data with tuples
+        or not string keys of dicts is the same as JSON of other data
+        """
+        if not is_json_data(data):
+            return None
+        try:
+            raw = json.dumps(data, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+        except ValueError:
+            return None
+        return hashlib.blake2b(raw.encode('utf-8'), digest_size=16).digest()
+
+    def get(self, key):
+        with self.lock:
+            payload = self.entries.get(key, None)
+            if payload is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+        return marshal.loads(payload)
+
+    def set(self, key, value):
+        try:
+            payload = marshal.dumps(value)
+        except ValueError:
+            return
+        with self.lock:
+            self.entries[key] = payload
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def info(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'maxsize': self.maxsize,
+            'currsize': len(self.entries)
+        }
 
 
 
@@ -26,6 +223,10 @@ class EmbeddedValidator:
     }
 
     def __init__(self, model_name, params={}):
+        with profiling.phase('embedded_validator', model_name):
+            self.build(model_name, params)
+
+    def build(self, model_name, params):
         self.model_name = model_name
         self.model_data = load_embedded_model(model_name)
         if not self.model_data:
@@ -34,65 +235,93 @@ class EmbeddedValidator:
             ))
 
         self.schema = {}
+        self.nested_validators = {}
         self.options = {
             'deleteKeyIfValueIn': {},
             'autocleanIdModelKeys': {}
         }
 
-        for name, data in (self.model_data.get('properties', None) or {}).items():
+        spec = get_model_spec(self.model_data)
+        for name, data in spec.properties.items():
             if data.get('deleteKeyIfValueIn', None):
                 self.options['deleteKeyIfValueIn'][name] = data['deleteKeyIfValueIn']
             name, validators = self.build_schema(name, data)
             self.schema[name] = schema.And(*validators)
 
-        for name, data in (self.model_data.get('relations', None) or {}).items():
+        for name, data in spec.relations.items():
             if data.get('deleteKeyIfValueIn', None):
                 self.options['deleteKeyIfValueIn'][name] = data['deleteKeyIfValueIn']
-            if data.get('type', None) == 'embedsManyAsObject' and data.get('key', {}).get('autoclean', False) and data['key'].get('type', None) == 'model':
+            if data.type == 'embedsManyAsObject' and data.get('key', {}).get('autoclean', False) and data['key'].get('type', None) == 'model':
                 self.options['autocleanIdModelKeys'][name] = data['key'].get('model', None)
 
-            self.model_data['relations'][name]['model_data'] = load_embedded_model(data['model'])
-            name, validators = self.build_schema(name, data)
-            self.schema[name] = validators
+            key, validators = self.build_schema(name, data)
+            self.schema[key] = validators
+            if name in self.nested_validators:
+                self.model_data['relations'][name]['model_data'] = self.nested_validators[name].model_data
+            else:
+                self.model_data['relations'][name]['model_data'] = load_embedded_model(data.model)
 
         self.schema = schema.Schema(self.schema)
         self.params = params
+        self.spec = spec
+        self.has_autoclean = bool(self.options['autocleanIdModelKeys']) or any([
+            v.has_autoclean
+            for v in self.nested_validators.values()
+        ])
+        self.compiled = None
+        if get_engine() == 'compiled':
+            self.compiled = compile_validator(self, spec)
+        self.cache = None
+        cache_size = get_drf_generator_setting('embedded_validator', 'cache_size', default=0)
+        if cache_size and self.is_cacheable():
+            self.cache = ValidationCache(cache_size)
 
 
 
+    def is_cacheable(self):
+        """
+        Result of validation depends only on data (no autoclean of model ids)
+        """
+        return not self.has_autoclean
+
+    def cache_info(self):
+        if self.cache is None:
+            return None
+        return self.cache.info()
+
+
     def build_schema(self, field_name, params):
-        is_required = True
+        params = get_field_spec(field_name, params)
+        is_required = params.is_required
         validators = []
+        expected_types = self.types.get(params.type, None)
 
-        if not params.get('required', False):
-            is_required = False
-
-        if params['type'] != 'any' and params['type'] in self.types:
+        if params.type != 'any' and expected_types is not None:
             def validate_by_type(value):
                 if not is_required and value == None:
                     return True
-                return isinstance(value, self.types[params['type']])
+                return isinstance(value, expected_types)
             validators.append(validate_by_type)
 
         field = field_name
-        if 'default' in params and params['default'] != None:
-            field = schema.Optional(field, default=params['default'])
+        if params.has_default and params.default != None:
+            field = schema.Optional(field, default=params.default)
         elif not is_required:
             field = schema.Optional(field)
             if validators:
                 validators = [
-                    lambda x: isinstance(x, self.types[params['type']]) or x == None
+                    lambda x: isinstance(x, expected_types) or x == None
                 ]
 
-        if params['type'] in ['int', 'float', 'number']:
+        if params.type in ['int', 'float', 'number']:
             def validate_by_size(validationType):
                 def validate(value):
                     if not is_required and value == None:
                         return True
                     if validationType == 'min':
-                        return value >= params[validationType]
+                        return value >= params.min
                     if validationType == 'max':
-                        return value <= params[validationType]
+                        return value <= params.max
                     return True
                 validate.__name__ = 'validate_by_size_' + validationType
                 return validate
@@ -101,48 +330,46 @@ class EmbeddedValidator:
             if 'max' in params:
                 validators.append(validate_by_size('max'))
 
-        if params['type'] in ['string']:
+        if params.type in ['string']:
             if 'min' in params:
                 validators.append(schema.And(
-                    lambda x: len(x or '') >= params['min'],
+                    lambda x: len(x or '') >= params.min,
                     error="Field '{field_name}' value is too small. Required {min} chars".format(
                         field_name=field_name,
-                        min=params['min']
+                        min=params.min
                     )
                 ))
             if 'max' in params:
                 validators.append(schema.And(
-                    lambda x: len(x or '') <= params['max'],
+                    lambda x: len(x or '') <= params.max,
                     error="Field '{field_name}' value is too long. Allowed max {max} chars".format(
                         field_name=field_name,
-                        max=params['max']
+                        max=params.max
                     )
                 ))
 
-        if params['type'] == 'object':
+        if params.type == 'object':
             if is_required:
                 validators.append(lambda x: isinstance(x, dict))
             else:
                 validators.append(lambda x: isinstance(x, dict) or x == None)
-        if params['type'] == 'array':
+        if params.type == 'array':
             if is_required:
                 validators.append(lambda x: isinstance(x, list))
             else:
                 validators.append(lambda x: isinstance(x, list) or x == None)
 
-        if 'choices' in params:
-            choices = [
-                c[0]
-                for c in fix_field_choices(params['choices'])
-            ]
+        if params.choices:
+            choices = list(params.choices_values)
+            has_choice = params.has_choice
             def validate_choices_for_array(value):
                 value = value or []
                 for v in value:
-                    if v not in choices:
+                    if not has_choice(v):
                         return False
                 return True
 
-            if params['type'] == 'array':
+            if params.type == 'array':
                 validators.append(schema.And(
                     validate_choices_for_array,
                     error="Key '{field_name}' value not in choices: {choices}".format(
@@ -153,7 +380,7 @@ class EmbeddedValidator:
             else:
                 if is_required:
                     validators.append(schema.And(
-                        lambda x: x in choices,
+                        has_choice,
                         error="Key '{field_name}' value not in choices: {choices}".format(
                             field_name=field_name,
                             choices=choices
@@ -161,19 +388,21 @@ class EmbeddedValidator:
                     ))
                 else:
                     validators.append(schema.And(
-                        lambda x: (x in choices) or x == None,
+                        lambda x: has_choice(x) or x == None,
                         error="Key '{field_name}' value not in choices: {choices}".format(
                             field_name=field_name,
                             choices=choices
                         )
                     ))
 
-        if params['type'] == 'embedsOne':
-            validator = EmbeddedValidator(params['model'], params=params)
+        if params.type == 'embedsOne':
+            validator = get_embedded_validator(params.model, params=params)
+            self.nested_validators[field_name] = validator
             validators = validator.schema
 
-        if params['type'] == 'embedsMany':
-            validator = EmbeddedValidator(params['model'], params=params)
+        if params.type == 'embedsMany':
+            validator = get_embedded_validator(params.model, params=params)
+            self.nested_validators[field_name] = validator
             def embeds_many_validate(value):
                 if not is_required and value == None:
                     return None
@@ -181,10 +410,10 @@ class EmbeddedValidator:
                     return False
                 if isinstance(value, list):
                     for v in value:
-                        validator.validate_data(v)
+                        validator._validate_data(v)
                 elif isinstance(value, dict):
                     try:
-                        validator.validate_data(value)
+                        validator._validate_data(value)
                     except Exception as e:
                         # print 'invalid', params['type'], field_name, params['model'], str(e)
                         raise schema.SchemaError("Invalid field '%s': %s" % (field_name, str(e)))
@@ -192,8 +421,9 @@ class EmbeddedValidator:
             # не изменять нижнее поведение!
             validators = [schema.And(embeds_many_validate)]
 
-        if params['type'] == 'embedsManyAsObject':
-            validator = EmbeddedValidator(params['model'], params=params)
+        if params.type == 'embedsManyAsObject':
+            validator = get_embedded_validator(params.model, params=params)
+            self.nested_validators[field_name] = validator
             def embeds_many_as_object_validate(value):
                 if not is_required and value == None:
                     return None
@@ -201,7 +431,7 @@ class EmbeddedValidator:
                     return False
                 for key in value:
                     try:
-                        validator.validate_data(value[key])
+                        validator._validate_data(value[key])
                     except Exception as e:
                         # print 'invalid', params['type'], field_name, params['model'], str(e)
                         raise schema.SchemaError("Invalid property '%s' in embedsManyAsObject '%s': %s" % (key, field_name, str(e)))
@@ -219,50 +449,231 @@ class EmbeddedValidator:
             for k in list(data.keys()):
                 if data[k] in self.options['deleteKeyIfValueIn'].get(k, []):
                     del data[k]
-        for name in self.options['autocleanIdModelKeys']:
-            for k in data:
-                data[k] = self.clean_id_model_keys_in_data(data[k], model_name=self.options['autocleanIdModelKeys'][name])
+        if self.options['autocleanIdModelKeys']:
+            batch = get_autoclean_batch()
+            self.collect_autoclean_ids(data, batch)
+            for name in self.options['autocleanIdModelKeys']:
+                for k in data:
+                    data[k] = batch.clean(data[k], self.options['autocleanIdModelKeys'][name])
         return data
 
 
     def clean_id_model_keys_in_data(self, data, model_name=None):
-        if not model_name or not isinstance(data, dict):
-            return data
-        from drfs import get_model
-
-        modelClass = get_model(model_name)
-        ids = []
-        for key in data.keys():
+        return get_autoclean_batch().clean(data, model_name)
+
+
+    def collect_autoclean_ids(self, data, batch, many=False):
+        """
+        Adds model id keys, which will be autocleaned, of data (or of every
+        item of data if 'many') and of its embedded data to batch
+        """
+        if not self.has_autoclean or not data:
+            return
+        if many:
+            items = data.values() if isinstance(data, dict) else data
+            for item in items:
+                if isinstance(item, list):
+                    for i in item:
+                        self.collect_autoclean_ids(i, batch)
+                else:
+                    self.collect_autoclean_ids(item, batch)
+            return
+        if not isinstance(data, dict):
+            return
+        for model_name in self.options['autocleanIdModelKeys'].values():
+            for k in data:
+                batch.add(model_name, data[k])
+        for name, validator in self.nested_validators.items():
+            if name in data:
+                validator.collect_autoclean_ids(
+                    data[name],
+                    batch,
+                    many=self.spec.relations[name].type != 'embedsOne'
+                )
+
+
+    def validate_schema(self, data):
+        """
+        Same as self.schema.validate(data). Compiled function validates data
+        if it can, invalid data is validated again by 'schema' to get its error.
+        Other errors of compiled function are not hidden
+        """
+        if self.compiled is not None:
             try:
-                ids.append(int(key))
-            except ValueError:
+                return self.compiled(data)
+            except (Fallback, schema.SchemaError, ValidationError):
+                # invalid data or invalid nested data
                 pass
-        known_ids = [
-            str(id)
-            for id in modelClass.objects.filter(id__in=ids).values_list('id', flat=True)
-        ]
-        for key in list(data.keys()):
-            if key not in known_ids:
-                del data[key]
-        return data
-
+        return self.schema.validate(data)
 
     def validate_data(self, data):
+        if self.cache is None or data == None:
+            return self._validate_data(data)
+        key = self.cache.get_key(data)
+        if key is None:
+            return self._validate_data(data)
+        hit = self.cache.get(key)
+        if hit is not None:
+            # (is data unchanged by validation, validated data)
+            return data if hit[0] else hit[1]
+        validated = self._validate_data(data)
+        if validated == data:
+            self.cache.set(key, (True, None))
+        else:
+            self.cache.set(key, (False, validated))
+        return validated
+
+    def validate_many(self, items, max_errors=None):
+        """
+        Validates every item of list. Returns list of validated items or raises
+        ValidationError with messages of invalid items by their index:
+        {2: ["Key 'eint' error: ..."], 5: [...]}.
+        Validation stops after 'max_errors' invalid items
+        """
+        if max_errors is None:
+            max_errors = get_drf_generator_setting('embedded_validator', 'max_errors', default=None)
+        validated = []
+        errors = {}
+        for i, item in enumerate(items or []):
+            try:
+                validated.append(self.validate_data(item))
+            except ValidationError as e:
+                errors[i] = e.messages
+                if max_errors and len(errors) >= max_errors:
+                    break
+        if errors:
+            raise ValidationError(errors)
+        return validated
+
+    def _validate_data(self, data):
+        """
+        validate_data without cache. Nested validators are called this way:
+        cached result of outer data already covers them
+        """
         if data == None and not self.params.get('required', False):
             return self.params.get('default', None) or None
         try:
-            return self.clean_data(self.schema.validate(data))
+            return self.clean_data(self.validate_schema(data))
         except Exception as e:
             raise ValidationError(str(e))
 
     def __call__(self, data):
         if data == None and not self.params.get('required', False):
             return True
+        if is_validated(data, self.model_name):
+            return True
         try:
-            self.schema.validate(data)
+            self.validate_schema(data)
         except Exception as e:
             raise ValidationError(str(e))
         return True
 
     def deconstruct(self):
         return 'drfs.db.validators.EmbeddedValidator', [self.model_name], {}
+
+
+
+
+class ValidatedDict(dict):
+    """
+    Embedded value already validated by serializer field. Model field
+    does not validate it again when it is saved (see mark_validated)
+    """
+    __slots__ = ('embedded_model_name',)
+
+    def __reduce_ex__(self, protocol):
+        # copies are not validated
+        return (dict, (dict(self),))
+
+
+class ValidatedList(list):
+    __slots__ = ('embedded_model_name',)
+
+    def __reduce_ex__(self, protocol):
+        return (list, (list(self),))
+
+
+def mark_validated(value, model_name):
+    """
+    Wraps validated dict/list of embedded model 'model_name' into marker type.
+    Marker is valid for one save: model field consumes it (see consume_validated),
+    so next save of same value (or any direct ORM save) is validated as usual
+    """
+    if isinstance(value, dict):
+        value = ValidatedDict(value)
+    elif isinstance(value, list):
+        value = ValidatedList(value)
+    else:
+        return value
+    value.embedded_model_name = model_name
+    return value
+
+
+def is_validated(value, model_name):
+    return isinstance(value, (ValidatedDict, ValidatedList)) and \
+        model_name is not None and value.embedded_model_name == model_name
+
+
+def consume_validated(value, model_name):
+    if not is_validated(value, model_name):
+        return False
+    value.embedded_model_name = None
+    return True
+
+
+
+__validators = {}
+__validators_lock = threading.Lock()
+def get_validator_key(model_name, params):
+    """
+    Validator depends on params only through 'required' and 'default'
+    """
+    params = params or {}
+    default = params.get('default', None)
+    try:
+        hash(default)
+    except TypeError:
+        default = ('json', json.dumps(default, sort_keys=True, default=repr))
+    return (model_name, bool(params.get('required', False)), default)
+
+
+
+def get_embedded_validator(model_name, params=None):
+    """
+    Shared EmbeddedValidator of embedded model. Validators are built once per
+    process (and per model name/params) and are reused by model fields,
+    serializer fields (and their copies) and by validators of other embedded models
+    """
+    key = get_validator_key(model_name, params)
+    validator = __validators.get(key, None)
+    if validator is None:
+        validator = EmbeddedValidator(model_name, params=params or {})
+        with __validators_lock:
+            validator = __validators.setdefault(key, validator)
+    return validator
+
+
+
+def reset_embedded_validators():
+    with __validators_lock:
+        __validators.clear()
+
+
+
+@receiver(setting_changed)
+def reset_embedded_validators_on_setting_changed(setting, **kwargs):
+    if setting in ['BASE_DIR', 'INSTALLED_APPS', 'DRF_GENERATOR']:
+        reset_embedded_validators()
+
+
+
+def embedded_validators_cache_info():
+    """
+    Hit/miss statistics of validation caches of shared validators
+    (DRF_GENERATOR = {'embedded_validator': {'cache_size': N}})
+    """
+    return dict([
+        (key, validator.cache_info())
+        for key, validator in list(__validators.items())
+        if validator.cache is not None
+    ])
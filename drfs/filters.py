@@ -0,0 +1,188 @@
+"""
+Filtering by indexed properties of embedsOne fields ("index": true on
+property of embedded model definition).
+
+    {
+        "name": "Address",
+        "properties": {
+            "city": {"type": "string", "max": 100, "index": true},
+            ...
+
+Model with '"address": {"type": "embedsOne", "model": "Address"}' gets
+indexed 'address_city_idx' column (see drfs.db.fields.EmbeddedIndexMixin),
+filters on the property use it instead of scanning JSON text:
+
+    filter_embedded(Model.objects.all(), address__city='Paris', address__zip__gte=75000)
+
+    # ?address.city=Paris&address.zip__gte=75000
+    class ModelViewset(...):
+        filter_backends = [EmbeddedIndexFilterBackend]
+
+Strings longer than 'max' of property (255 by default) are not indexed.
+
+Items of embedsMany fields with "searchable" option are filtered by side
+table of (parent, item_index, key, value) rows (see drfs.db.search):
+
+    "tags": {"type": "embedsMany", "model": "Tag", "searchable": ["code", "kind"]}
+
+    filter_embedded(Model.objects.all(), tags__code='X', tags__kind__in=['a', 'b'])
+
+    # ?tags.code=X&tags.kind__in=a,b
+
+Supported lookups are 'exact', 'in' and 'startswith'. Every condition is
+matched by any item (conditions on tags__code and tags__kind may be matched
+by different items of value).
+"""
+from django.core.exceptions import FieldError, ValidationError as DjangoValidationError
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+from .db.fields import EmbeddedIndexMixin, EmbeddedManyModel
+from .db.search import search_parent_ids
+
+
+LOOKUPS = (
+    'exact', 'iexact', 'in', 'gt', 'gte', 'lt', 'lte',
+    'contains', 'icontains', 'startswith', 'istartswith', 'isnull'
+)
+SEARCH_LOOKUPS = ('exact', 'in', 'startswith')
+
+
+
+def get_embedded_index_fields(model_class):
+    """
+    (embedded field name, property name) -> index field
+    """
+    return dict([
+        ((field.embedded_source, field.embedded_key), field)
+        for field in model_class._meta.concrete_fields
+        if isinstance(field, EmbeddedIndexMixin)
+    ])
+
+
+
+def get_embedded_index_lookup(model_class, lookup):
+    """
+    Returns (index field, lookup of index field) for lookup of embedded
+    property ('address__city__gte' -> 'address_city_idx__gte') or
+    (None, None) if property is not indexed
+    """
+    parts = lookup.split('__')
+    if len(parts) < 2 or len(parts) > 3 or (len(parts) == 3 and parts[2] not in LOOKUPS):
+        return None, None
+    field = get_embedded_index_fields(model_class).get((parts[0], parts[1]), None)
+    if field is None:
+        return None, None
+    return field, '__'.join([field.name] + parts[2:])
+
+
+
+def get_embedded_search_fields(model_class):
+    """
+    embedsMany field name -> field with search index ("searchable" option)
+    """
+    return dict([
+        (field.name, field)
+        for field in model_class._meta.concrete_fields
+        if isinstance(field, EmbeddedManyModel) and field.search_index_model is not None
+    ])
+
+
+
+def get_embedded_search_lookup(model_class, lookup):
+    """
+    Returns (embedsMany field, property, lookup of search index) for lookup
+    of searchable property of items ('tags__code__in' -> (tags, 'code', 'in'))
+    or (None, None, None)
+    """
+    parts = lookup.split('__')
+    if len(parts) < 2 or len(parts) > 3 or (len(parts) == 3 and parts[2] not in SEARCH_LOOKUPS):
+        return None, None, None
+    field = get_embedded_search_fields(model_class).get(parts[0], None)
+    if field is None or parts[1] not in field.searchable:
+        return None, None, None
+    return field, parts[1], (parts[2] if len(parts) == 3 else 'exact')
+
+
+
+def get_embedded_search_condition(model_class, lookup, value):
+    """
+    Q of rows with item matching lookup (None if lookup is not searchable)
+    """
+    field, key, search_lookup = get_embedded_search_lookup(model_class, lookup)
+    if field is None:
+        return None
+    return Q(pk__in=search_parent_ids(field, key, value, search_lookup))
+
+
+
+def filter_embedded(queryset, **lookups):
+    kwargs = {}
+    conditions = []
+    for lookup, value in lookups.items():
+        field, index_lookup = get_embedded_index_lookup(queryset.model, lookup)
+        if field is not None:
+            kwargs[index_lookup] = value
+            continue
+        condition = get_embedded_search_condition(queryset.model, lookup, value)
+        if condition is None:
+            raise FieldError("DRFS: '%s' is not a lookup of indexed embedded property of '%s' model" % (
+                lookup, queryset.model.__name__
+            ))
+        conditions.append(condition)
+    return queryset.filter(*conditions, **kwargs)
+
+
+
+class EmbeddedIndexFilterBackend(BaseFilterBackend):
+    """
+    Filters by query params '<embedded field>.<property>[__<lookup>]'
+    of indexed embedded properties and searchable properties of embedsMany
+    items. Other params are ignored
+    """
+    def to_value(self, field, lookup, value):
+        if lookup.endswith('__isnull'):
+            return value.lower() in ['true', '1']
+        if lookup.endswith('__in'):
+            return [field.to_python(v) for v in value.split(',')]
+        if lookup.endswith('contains') or lookup.endswith('startswith') or lookup.endswith('iexact'):
+            return value
+        return field.to_python(value)
+
+    def get_lookups(self, request, model_class):
+        lookups = {}
+        errors = {}
+        for param, value in request.query_params.items():
+            if '.' not in param:
+                continue
+            field, lookup = get_embedded_index_lookup(model_class, param.replace('.', '__', 1))
+            if field is None:
+                continue
+            try:
+                lookups[lookup] = self.to_value(field, lookup, value)
+            except DjangoValidationError as e:
+                errors[param] = e.messages
+        if errors:
+            raise ValidationError(errors)
+        return lookups
+
+    def get_search_conditions(self, request, model_class):
+        conditions = []
+        for param, value in request.query_params.items():
+            if '.' not in param:
+                continue
+            lookup = param.replace('.', '__', 1)
+            if lookup.endswith('__in'):
+                value = value.split(',')
+            condition = get_embedded_search_condition(model_class, lookup, value)
+            if condition is not None:
+                conditions.append(condition)
+        return conditions
+
+    def filter_queryset(self, request, queryset, view):
+        lookups = self.get_lookups(request, queryset.model)
+        conditions = self.get_search_conditions(request, queryset.model)
+        if not lookups and not conditions:
+            return queryset
+        return queryset.filter(*conditions, **lookups)
@@ -8,6 +8,7 @@ except ImportError:
     from django.utils.translation import gettext_lazy as _
 
 from ... import helpers
+from ...spec import get_model_spec, get_field_spec
 
 IS_LOADDATA_MODE = sys.argv[1:2] == ['loaddata']
 
@@ -29,9 +30,12 @@ class BaseModelGenerator(object):
         if not model_name:
             raise "DRFS - generators: Please provide model name field 'name' in  model definition"
         self.model_definition = model_definition
-        self.model_name = str(model_name)
+        self.spec = get_model_spec(model_definition)
+        self.model_name = self.spec.name
         self.module_name = str(module_name)
         self.mixin_path = None
+        # name -> model class for models generated by drfs.generate_models
+        self.known_models = kwargs.get('known_models', None)
         if isinstance(model_definition.get('base', None), list):
             return
         # DEPRECATED
@@ -58,49 +62,88 @@ class BaseModelGenerator(object):
 
 
     def get_model_class(self, model_path):
+        if self.known_models is not None:
+            from ...registry import registry
+            name = registry.resolve_model_name(model_path)
+            if name:
+                # lazy reference, so relations may point to models that are not generated yet
+                return '%s.%s' % (registry.get_app_label(registry.find_model(name)), name)
         if '.' not in model_path:
             return model_path
         return helpers.import_class(model_path)
 
 
+    def get_base_class(self, name):
+        if self.known_models:
+            from ...registry import registry
+            model_name = registry.resolve_model_name(name)
+            if model_name in self.known_models:
+                return self.known_models[model_name]
+        return helpers.import_class(name)
+
+
+    def build_model_field(self, name, params):
+        """
+        (field class, args, kwargs) of field from build_field__<type> or build_field.
+        params may be FieldSpec or raw dict of field params
+        """
+        params = get_field_spec(name, params)
+        convert_func = getattr(self, 'build_field__'+ params.type, None)
+        convert_func = convert_func or self.build_field
+        return convert_func(name, params)
+
+
     def build_field(self, name, params):
-        if params['type'] in self.model_fields_mapping:
-            field_class = self.model_fields_mapping[params['type']]
+        if params.type in self.model_fields_mapping:
+            field_class = self.model_fields_mapping[params.type]
         else:
             try:
-                field_class = helpers.import_class(params['type'])
+                field_class = helpers.import_class(params.type)
             except ImportError:
-                raise ValueError("DRFS - generators: No such field type '"+params['type']+"'. Field declared in '"+self.model_name+"' model")
+                raise ValueError("DRFS - generators: No such field type '"+params.type+"'. Field declared in '"+self.model_name+"' model")
 
         return field_class, [], {}
 
 
+    def build_extra_fields(self, name, params):
+        """
+        Additional model fields of field (name -> field instance)
+        """
+        return {}
+
+
+    def get_meta_options(self):
+        """
+        Additional options of model Meta (name -> value)
+        """
+        return {}
+
+
+    def get_model_mixins(self, fields):
+        """
+        Classes prepended to bases of model with given fields (name -> value)
+        """
+        return []
+
+
     def to_django_model(self):
         fields = {
             '__module__': self.module_name
         }
-        fields_definition = list(self.model_definition.get('properties', {}).items()) + \
-            list(self.model_definition.get('relations', {}).items())
-
-        for field_name, field_params in fields_definition:
-            if type(field_params) != type({}):
-                raise Exception("DRFS - generators: Expect 'field_params' to be dict. Got '" + str(type(field_params)) + "'")
-            if not field_params.get('type', None):
-                raise Exception("DRFS - generators: No 'field' property in field_params definition for field generation")
-
-            convert_func = getattr(self, 'build_field__'+ field_params['type'], None)
-            convert_func = convert_func or self.build_field
-            field_class, field_args, field_kwargs = convert_func(field_name, field_params)
+        for field in self.spec.fields:
+            field_class, field_args, field_kwargs = self.build_model_field(field.name, field)
 
-            fields[field_name] = field_class(
+            fields[field.name] = field_class(
                 *field_args,
                 **field_kwargs
             )
+            fields.update(self.build_extra_fields(field.name, field))
 
 
-        base_class_names = self.model_definition.get('base', self.default_model_class)
-        if not isinstance(base_class_names, list):
-            base_class_names = [base_class_names]
+        if self.spec.base is not None:
+            base_class_names = list(self.spec.base)
+        else:
+            base_class_names = [self.default_model_class]
         if self.mixin_path:
             # DEPRECATED
             base_class_names = [self.mixin_path] + base_class_names
@@ -112,22 +155,36 @@ class BaseModelGenerator(object):
         classes = []
         for name in base_class_names:
             try:
-                classes.append(helpers.import_class(name))
+                classes.append(self.get_base_class(name))
             except ImportError:
                 warnings.warn("Failed to import '%s' module for '%s' model" % (name, self.model_name))
                 continue
 
 
-        if self.model_definition.get('options', {}).get('abstract', False):
+        classes = [
+            mixin for mixin in self.get_model_mixins(fields)
+            if not any([issubclass(cl, mixin) for cl in classes])
+        ] + classes
+
+        meta_options = self.get_meta_options()
+        if self.spec.is_abstract:
+            if meta_options:
+                warnings.warn("DRFS: Meta options (%s) of abstract '%s' model are ignored" % (
+                    ', '.join(sorted(meta_options.keys())), self.model_name
+                ))
             fields['Meta'] = MetaAbstract
             model_cls = type(self.model_name, tuple(classes), fields)
             model_cls._meta.abstract = True
             return model_cls
 
 
-        fields['Meta'] = MetaNoAbstract
+        if meta_options:
+            fields['Meta'] = type('Meta', (MetaNoAbstract,), meta_options)
+        else:
+            fields['Meta'] = MetaNoAbstract
         model_cls = type(self.model_name, tuple(classes), fields)
         setattr(model_cls, 'DRFS_MODEL_DEFINITION', self.model_definition)
+        setattr(model_cls, 'DRFS_MODEL_SPEC', self.spec)
 
         has_verbose_name = False
         for cl in classes:
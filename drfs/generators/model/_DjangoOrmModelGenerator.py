@@ -1,43 +1,83 @@
+import hashlib, warnings
 from django.db.models import fields as django_fields
 from django.db import models as django_models
 from django.conf import settings as django_settings
+from django.core.exceptions import FieldDoesNotExist
 from django.dispatch import receiver
 
 from ._BaseModelGenerator import BaseModelGenerator
+from ... import helpers
 from ...db import fields as drfs_fields
+from ...spec import get_model_spec
 
 
 REGISTERED_RECEIVERS = {}
-@receiver(django_models.signals.pre_delete)
-def on_delete(sender, instance, **kwargs):
-    _meta = getattr(sender, '_meta', {})
-    model_name = getattr(_meta, 'object_name', None)
-    if model_name not in REGISTERED_RECEIVERS:
-        return
-    field_names = REGISTERED_RECEIVERS[model_name].get('delete_hasMany', [])
-    for name in field_names:
-        field_set = getattr(instance, name)
-        field_set.all().delete()
 
 
 
+def CASCADE_HAS_MANY(collector, field, sub_objs, using):
+    """
+    on_delete of source key of through model of hasMany relation with
+    "on_delete": "CASCADE". Related objects of deleted objects are collected
+    by deletion Collector with one query per batch of deleted objects
+    (not by query per deleted object)
+    """
+    django_models.CASCADE(collector, field, sub_objs, using)
+    target_field = [
+        f
+        for f in field.model._meta.local_fields
+        if f.many_to_one and f is not field
+    ][0]
+    target_model = target_field.remote_field.model
+    collector.collect(
+        target_model._base_manager.using(using).filter(
+            pk__in=sub_objs.values(target_field.attname)
+        )
+    )
+
+
+
+def setup_has_many_cascade(model_class, field_name):
+    """
+    Sets CASCADE_HAS_MANY as on_delete of source key of auto created
+    through model of hasMany field
+    """
+    try:
+        field = model_class._meta.get_field(field_name)
+    except FieldDoesNotExist:
+        return
+    through = getattr(field.remote_field, 'through', None)
+    if not isinstance(through, type) or not through._meta.auto_created:
+        return
+    # auto created through model declares source key before target key
+    source_field = [f for f in through._meta.local_fields if f.many_to_one][0]
+    source_field.remote_field.on_delete = CASCADE_HAS_MANY
 
 
-def fix_choices(choices):
-    if not isinstance(choices[0], tuple) and not isinstance(choices[0], list):
-        if isinstance(choices[0], tuple) or isinstance(choices[0], list):
-            return tuple([
-                tuple(c)
-                for c in choices
-            ])
-        return tuple([
-            (c,c)
-            for c in choices
-        ])
-    return tuple(choices)
+
+@receiver(django_models.signals.class_prepared)
+def on_class_prepared(sender, **kwargs):
+    if sender._meta.abstract:
+        return
+    for name in REGISTERED_RECEIVERS.get(sender._meta.object_name, {}).get('delete_hasMany', []):
+        setup_has_many_cascade(sender, name)
 
 
 
+def register_has_many_cascade(model_name, field_name, model_class=None):
+    """
+    Registers CASCADE_HAS_MANY for hasMany field of model. It is set up
+    when model class is prepared (see on_class_prepared). model_class that
+    is already created (ex.: by generated models module) is set up at once
+    """
+    REGISTERED_RECEIVERS[model_name] = REGISTERED_RECEIVERS.get(model_name, {})
+    REGISTERED_RECEIVERS[model_name]['delete_hasMany'] = \
+        REGISTERED_RECEIVERS[model_name].get('delete_hasMany', [])
+    if field_name not in REGISTERED_RECEIVERS[model_name]['delete_hasMany']:
+        REGISTERED_RECEIVERS[model_name]['delete_hasMany'].append(field_name)
+    if model_class is not None:
+        setup_has_many_cascade(model_class, field_name)
+
 
 
 
@@ -64,6 +104,14 @@ class DjangoOrmModelGenerator(BaseModelGenerator):
         'embedsManyAsObject': drfs_fields.EmbeddedManyAsObjectModel,
     }
 
+    embedded_index_fields_mapping = {
+        'string': drfs_fields.EmbeddedIndexCharField,
+        'int': drfs_fields.EmbeddedIndexIntegerField,
+        'float': drfs_fields.EmbeddedIndexFloatField,
+        'number': drfs_fields.EmbeddedIndexFloatField,
+        'bool': drfs_fields.EmbeddedIndexBooleanField,
+    }
+
     def get_model_class(self, model_path):
         if model_path in ['django.contrib.auth.models.User', 'AUTH_USER_MODEL']:
             if getattr(django_settings, 'AUTH_USER_MODEL', False):
@@ -74,51 +122,193 @@ class DjangoOrmModelGenerator(BaseModelGenerator):
     def build_field(self, name, params):
         field_class, field_args, field_kwargs = super(DjangoOrmModelGenerator, self).build_field(name, params)
 
-        if 'default' in params:
-            field_kwargs['default'] = params['default']
+        if params.has_default:
+            field_kwargs['default'] = params.default
         if 'choices' in params:
-            field_kwargs['choices'] = fix_choices(params['choices'])
+            field_kwargs['choices'] = params.choices
         if 'description' in params:
-            field_kwargs['help_text'] = params['description']
+            field_kwargs['help_text'] = params.description
         if 'verbose_name' in params:
             field_kwargs['verbose_name'] = params['verbose_name']
-        if 'required' in params and params['required'] == False:
+        if 'required' in params and params.required == False:
             field_kwargs['blank'] = True
             field_kwargs['null'] = True
         if params.get('primary', False):
             field_kwargs['primary_key'] = True
         if params.get('unique', False):
             field_kwargs['unique'] = True
+        if params.get('index', False):
+            if isinstance(field_class, type) and issubclass(field_class, (drfs_fields.JSONField, django_models.ManyToManyField)):
+                warnings.warn("DRFS: 'index' of '%s.%s' field is ignored. Fields of type '%s' can't be indexed" % (
+                    self.model_name, name, params.type
+                ))
+            else:
+                field_kwargs['db_index'] = True
+        if isinstance(field_class, type) and issubclass(field_class, drfs_fields.JSONField):
+            storage = self.get_storage_options(params)
+            if storage.get('lazy', False):
+                field_kwargs['lazy'] = True
+            if storage.get('compress', None) and issubclass(field_class, getattr(django_models, 'JSONField', ())):
+                warnings.warn("DRFS: 'compress' storage option of '%s.%s' field is ignored with native JSON fields" % (
+                    self.model_name, name
+                ))
+            elif storage.get('compress', None):
+                field_kwargs['compress'] = storage['compress']
+                if storage.get('level', None) is not None:
+                    field_kwargs['compress_level'] = storage['level']
+                if storage.get('threshold', None) is not None:
+                    field_kwargs['compress_threshold'] = storage['threshold']
 
         return field_class, field_args, field_kwargs
 
 
+    def build_extra_fields(self, name, params):
+        """
+        Indexed columns of embedsOne properties with "index": true
+        """
+        if params.type != 'embedsOne':
+            return {}
+        definition = helpers.load_embedded_model(params.model)
+        if not definition:
+            return {}
+        fields = {}
+        for prop in get_model_spec(definition).properties.values():
+            if not prop.get('index', False):
+                continue
+            field_class = self.embedded_index_fields_mapping.get(prop.type, None)
+            if field_class is None:
+                warnings.warn("DRFS: 'index' of '%s.%s' embedded property is ignored. Properties of type '%s' can't be indexed" % (
+                    params.model, prop.name, prop.type
+                ))
+                continue
+            field_kwargs = {
+                'embedded_source': name,
+                'embedded_key': prop.name
+            }
+            if prop.has_default and not callable(prop.default):
+                field_kwargs['embedded_default'] = prop.default
+            if prop.type == 'string':
+                field_kwargs['max_length'] = int(prop.max) if prop.max is not None else 255
+            fields[drfs_fields.get_embedded_index_field_name(name, prop.name)] = field_class(**field_kwargs)
+        return fields
+
+
+    def get_model_mixins(self, fields):
+        """
+        EmbeddedIndexModelMixin for models with indexed embedded properties
+        """
+        if any([isinstance(f, drfs_fields.EmbeddedIndexMixin) for f in fields.values()]):
+            return [drfs_fields.EmbeddedIndexModelMixin]
+        return []
+
+
+    def get_meta_options(self):
+        """
+        Meta options from "options" of definition:
+
+            "options": {
+                "ordering": ["-created", "name"],
+                "unique_together": [["owner", "name"]],
+                "indexes": [
+                    ["owner", "-created"],
+                    {"fields": ["name"], "condition": {"is_active": true}},
+                    {"fields": ["email"], "unique": true, "name": "user_email_uniq"}
+                ]
+            }
+
+        Unique indexes are added as UniqueConstraint to Meta.constraints
+        """
+        options = self.model_definition.get('options', None) or {}
+        meta = {}
+        if options.get('ordering', None):
+            ordering = options['ordering']
+            meta['ordering'] = [ordering] if isinstance(ordering, str) else list(ordering)
+        if options.get('unique_together', None):
+            unique_together = options['unique_together']
+            if isinstance(unique_together[0], str):
+                unique_together = [unique_together]
+            meta['unique_together'] = [tuple(names) for names in unique_together]
+        indexes = []
+        constraints = []
+        for params in options.get('indexes', None) or []:
+            index = self.build_index(params)
+            if isinstance(index, django_models.UniqueConstraint):
+                constraints.append(index)
+            else:
+                indexes.append(index)
+        if indexes:
+            meta['indexes'] = indexes
+        if constraints:
+            meta['constraints'] = constraints
+        return meta
+
+
+    def build_index(self, params):
+        if not isinstance(params, dict):
+            params = {'fields': params}
+        fields = params.get('fields', None) or []
+        if isinstance(fields, str):
+            fields = [fields]
+        if not fields:
+            raise ValueError("DRFS - generators: Index without 'fields' declared in '%s' model" % self.model_name)
+        condition = None
+        if params.get('condition', None):
+            condition = django_models.Q(**params['condition'])
+        name = params.get('name', None)
+        if params.get('unique', False):
+            fields = [f.lstrip('-') for f in fields]
+            return django_models.UniqueConstraint(
+                fields=fields,
+                condition=condition,
+                name=name or self.get_index_name(fields, params.get('condition', None), 'uniq')
+            )
+        if condition is not None and not name:
+            # indexes with condition should be named
+            name = self.get_index_name(fields, params['condition'], 'idx')
+        return django_models.Index(fields=fields, condition=condition, name=name or '')
+
+
+    def get_index_name(self, fields, condition, suffix):
+        digest = hashlib.md5(('%s.%s:%s:%r' % (
+            self.module_name, self.model_name, ','.join(fields), sorted((condition or {}).items())
+        )).encode('utf-8')).hexdigest()
+        return 'drfs_%s_%s' % (digest[:20], suffix)
+
+
+    def get_storage_options(self, params):
+        """
+        'storage' options of JSON field: model level ('options' -> 'storage')
+        updated with field level ('storage')
+        """
+        storage = dict((self.model_definition.get('options', None) or {}).get('storage', None) or {})
+        storage.update(params.get('storage', None) or {})
+        return storage
+
+
 
 
     def build_field__string(self, name, params):
         field_class, field_args, field_kwargs = self.build_field(name, params)
 
-        if not params.get('required', False):
+        if not params.is_required:
             field_kwargs['blank'] = True
-        for k,v in params.items():
-            if k=='max':
-                field_kwargs['max_length'] = int(v)
+        if 'max' in params:
+            field_kwargs['max_length'] = int(params.max)
         return field_class, field_args, field_kwargs
 
 
     def build_field__datetime(self, name, params):
         field_class, field_args, field_kwargs = self.build_field(name, params)
 
-        for k,v in params.items():
-            if k=='auto_now_add':
-                field_kwargs['auto_now_add'] = v
+        if 'auto_now_add' in params:
+            field_kwargs['auto_now_add'] = params['auto_now_add']
         return field_class, field_args, field_kwargs
 
 
     def build_field__int(self, name, params):
         field_class, field_args, field_kwargs = self.build_field(name, params)
 
-        if not params.get('required', True):
+        if params.is_optional:
             field_kwargs['blank'] = True
             field_kwargs['null'] = True
         return field_class, field_args, field_kwargs
@@ -133,7 +323,7 @@ class DjangoOrmModelGenerator(BaseModelGenerator):
         if params.get('relationName', None):
             field_kwargs['related_name'] = params['relationName']
 
-        to_model = self.get_model_class(params['model'])
+        to_model = self.get_model_class(params.model)
         field_args = (to_model,)
 
         for k,v in params.items():
@@ -154,7 +344,7 @@ class DjangoOrmModelGenerator(BaseModelGenerator):
         if params.get('relationName', None):
             field_kwargs['related_name'] = params['relationName']
 
-        to_model = self.get_model_class(params['model'])
+        to_model = self.get_model_class(params.model)
         field_args = (to_model,)
 
         for k,v in params.items():
@@ -175,30 +365,31 @@ class DjangoOrmModelGenerator(BaseModelGenerator):
         if params.get('relationName', None):
             field_kwargs['related_name'] = params['relationName']
 
-        to_model = self.get_model_class(params['model'])
+        to_model = self.get_model_class(params.model)
         field_args = (to_model,)
 
         if params.get('on_delete', None) == 'CASCADE' or params.get('onDelete', None) == 'CASCADE':
-            REGISTERED_RECEIVERS[self.model_name] = REGISTERED_RECEIVERS.get(self.model_name, {})
-            REGISTERED_RECEIVERS[self.model_name]['delete_hasMany'] = \
-                REGISTERED_RECEIVERS[self.model_name].get('delete_hasMany', [])
-
-            REGISTERED_RECEIVERS[self.model_name]['delete_hasMany'].append(name)
+            register_has_many_cascade(self.model_name, name)
 
         return field_class, field_args, field_kwargs
 
 
     def build_field__embedsMany(self, name, params):
         field_class, field_args, field_kwargs = self.build_field(name, params)
-        field_kwargs['embedded_model_name'] = params['model']
+        field_kwargs['embedded_model_name'] = params.model
         if 'default' not in field_kwargs:
             field_kwargs['default'] = []
+        if params.get('searchable', None):
+            searchable = params['searchable']
+            if isinstance(searchable, str):
+                searchable = [searchable]
+            field_kwargs['searchable'] = list(searchable)
         return field_class, field_args, field_kwargs
 
 
     def build_field__embedsManyAsObject(self, name, params):
         field_class, field_args, field_kwargs = self.build_field(name, params)
-        field_kwargs['embedded_model_name'] = params['model']
+        field_kwargs['embedded_model_name'] = params.model
         if 'default' not in field_kwargs:
             field_kwargs['default'] = []
         if params.get('keys', None) and params['keys'].get('autoclean', False):
@@ -208,7 +399,7 @@ class DjangoOrmModelGenerator(BaseModelGenerator):
 
     def build_field__embedsOne(self, name, params):
         field_class, field_args, field_kwargs = self.build_field(name, params)
-        field_kwargs['embedded_model_name'] = params['model']
+        field_kwargs['embedded_model_name'] = params.model
         if 'default' not in field_kwargs:
             field_kwargs['default'] = {}
         return field_class, field_args, field_kwargs
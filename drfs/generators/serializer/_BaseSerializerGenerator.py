@@ -1,4 +1,6 @@
-from drfs import helpers
+from drfs import helpers, profiling
+from drfs.spec import get_model_spec
+from drfs.db.fields import EmbeddedIndexMixin
 from drfs.serializers.rest import BaseModelSerializer
 
 
@@ -10,7 +12,8 @@ class BaseSerializerGenerator(object):
     def __init__(self, model_class, **kwargs):
         self.allowed_fields = []
         self.model_definition = getattr(model_class, 'DRFS_MODEL_DEFINITION', {})
-        self.model_name = self.model_definition.get('name', None)
+        self.spec = get_model_spec(model_class)
+        self.model_name = self.spec.name
         self.model_class = model_class
         self.model_fields = model_class._meta.get_fields()
 
@@ -21,6 +24,8 @@ class BaseSerializerGenerator(object):
         all_fields = [
             field.name
             for field in self.model_fields
+            # indexed copies of embedded properties are internal
+            if not isinstance(field, EmbeddedIndexMixin)
         ]
         visible_fields = kwargs.get('visible_fields', None)
 
@@ -44,22 +49,19 @@ class BaseSerializerGenerator(object):
                     self.allowed_fields.append(name)
         else:
             self.allowed_fields = list(all_fields)
-            modeldef_fields = list(self.model_definition.get('properties', {}).items()) + \
-                list(self.model_definition.get('relations', {}).items())
-
-            for field_name, field_params in modeldef_fields:
-                if field_params.get('serializer', {}).get('hidden', False) and field_name in all_fields:
-                    self.allowed_fields.remove(field_name)
+            for field in self.spec.fields:
+                if field.is_hidden and field.name in all_fields:
+                    self.allowed_fields.remove(field.name)
         # DeprecationError
         # удалить после миграции всех проектов на новые либы
         if 'hidden' in self.model_definition:
             raise ValueError("Property 'hidden' should not be set on root of model definition for '%s' model. Place it as 'serializer.hidden' property" % model_class.__name__)
-        for field_name, field_params in list(self.model_definition.get('properties', {}).items()) + list(self.model_definition.get('relations', {}).items()):
-            if '_serializer' in field_params:
+        for field in self.spec.fields:
+            if '_serializer' in field:
                 raise ValueError("Property '_serializer' for model '%s' is not allowed anymore. Rename it to 'serializer'" % model_class.__name__)
-            if 'hidden' in field_params:
+            if 'hidden' in field:
                 raise ValueError("Property 'hidden' should not be set inside django field property '%s' for '%s' model. Place it inside 'serializer' property for django field definition" % (
-                    field_name, model_class.__name__
+                    field.name, model_class.__name__
                 ))
 
 
@@ -106,14 +108,11 @@ class BaseSerializerGenerator(object):
         fields_serializers = {}
         serializer_general_params = self.model_definition.get('serializer', None) or self.model_definition.get('viewset', {}).get('serializer', None) or {}
         read_only_fields = []
-        modeldef_fields = self.model_definition.get('properties', {}).copy()
-        modeldef_fields.update(self.model_definition.get('relations', {}).copy())
 
         for field in self.model_fields:
             if field.name not in self.allowed_fields:
                 continue
-            field_params = self.model_definition.get('properties', {}).get(field.name, None) or \
-                self.model_definition.get('relations', {}).get(field.name, None)
+            field_params = self.spec.get_field(field.name)
 
             serializer_class, serializer_args, serializer_kwargs = self.build_serializer(field, field_params)
             if serializer_class:
@@ -121,7 +120,7 @@ class BaseSerializerGenerator(object):
                     *serializer_args,
                     **serializer_kwargs
                 )
-            if modeldef_fields.get(field.name, {}).get('serializer', {}).get('read_only', False):
+            if field_params is not None and field_params.is_read_only:
                 read_only_fields.append(field.name)
 
         for fieldName, field_params in serializer_general_params.get('fields', {}).items():
@@ -175,5 +174,6 @@ class BaseSerializerGenerator(object):
         base_class.append(DRFS_Serializer)
 
         _cls = type(self.model_name, tuple(base_class), fields_serializers)
+        profiling.add_classes()
         setattr(_cls, 'DRFS_MODEL_DEFINITION', self.model_definition)
         return _cls
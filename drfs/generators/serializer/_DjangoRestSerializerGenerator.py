@@ -30,6 +30,26 @@ class SoftPrimaryKeyRelatedField(rest_relations.PrimaryKeyRelatedField):
 
 
 
+def bind_build_relational_field(_cls, relations):
+    def build_relational_field(_self, field_name, relation_info):
+        field_params = relations.get(field_name, {})
+        field_class, field_kwargs = super(_cls, _self).build_relational_field(
+            field_name,
+            relation_info
+        )
+        if relation_info.reverse:
+            field_kwargs['required'] = field_kwargs.get('required', False)
+        if field_params.get('serializer', {}).get('ignore_object_doesnt_exist', False) and \
+            field_class == rest_relations.PrimaryKeyRelatedField:
+            return SoftPrimaryKeyRelatedField, field_kwargs
+        return field_class, field_kwargs
+
+    setattr(_cls, 'build_relational_field', build_relational_field)
+    return _cls
+
+
+
+
 class DjangoRestSerializerGenerator(BaseSerializerGenerator):
     serializer_field_mapping = {
         drfs_fields.ListField: drfs_field_serializers.ListField,
@@ -154,20 +174,4 @@ class DjangoRestSerializerGenerator(BaseSerializerGenerator):
 
     def to_serializer(self):
         _cls = super(DjangoRestSerializerGenerator, self).to_serializer()
-        relations = self.model_definition.get('relations', {})
-
-        def build_relational_field(_self, field_name, relation_info):
-            field_params = relations.get(field_name, {})
-            field_class, field_kwargs = super(_cls, _self).build_relational_field(
-                field_name,
-                relation_info
-            )
-            if relation_info.reverse:
-                field_kwargs['required'] = field_kwargs.get('required', False)
-            if field_params.get('serializer', {}).get('ignore_object_doesnt_exist', False) and \
-                field_class == rest_relations.PrimaryKeyRelatedField:
-                return SoftPrimaryKeyRelatedField, field_kwargs
-            return field_class, field_kwargs
-
-        setattr(_cls, 'build_relational_field', build_relational_field)
-        return _cls
+        return bind_build_relational_field(_cls, self.model_definition.get('relations', {}))
@@ -1,5 +1,5 @@
 # -*- coding: utf-8 -*-
-import rest_framework, os, json
+import rest_framework
 from django.db.models import IntegerField, BigIntegerField, PositiveIntegerField, PositiveSmallIntegerField, SmallIntegerField
 
 rest_framework_version = tuple([
@@ -22,36 +22,133 @@ except ImportError:
 
 
 
+def get_drf_generator_setting(*keys, default=None):
+    from django.conf import settings
+    value = getattr(settings, 'DRF_GENERATOR', None) or {}
+    for key in keys:
+        if not isinstance(value, dict) or key not in value:
+            return default
+        value = value[key]
+    return value
+
+
+
+
+__import_cache = {}
+__import_stats = {'hits': 0, 'misses': 0}
 def import_class(cl):
+    """
+    Resolves dotted path to object. Resolved objects are cached for the whole
+    process, failed imports are not cached.
+    """
     cl = str(cl)
-    if '.site-packages.' in cl:
-        cl = cl.split('.site-packages.')[-1]
+    if cl in __import_cache:
+        __import_stats['hits'] += 1
+        return __import_cache[cl]
+    __import_stats['misses'] += 1
+    path = cl
+    if '.site-packages.' in path:
+        path = path.split('.site-packages.')[-1]
     # http://stackoverflow.com/questions/547829/how-to-dynamically-load-a-python-class
-    d = cl.rfind(".")
-    classname = cl[d+1:len(cl)]
-    m = __import__(cl[0:d], {}, {}, [classname])
-    return getattr(m, classname)
+    d = path.rfind(".")
+    classname = path[d+1:len(path)]
+    m = __import__(path[0:d], {}, {}, [classname])
+    obj = getattr(m, classname)
+    __import_cache[cl] = obj
+    return obj
 
 
 
+def import_class_stats():
+    return {
+        'hits': __import_stats['hits'],
+        'misses': __import_stats['misses'],
+        'size': len(__import_cache)
+    }
 
-def load_embedded_model(name):
-    from django.apps import apps
-    model_schema = None
-    if os.path.splitext(name)[-1] != '.json':
-        name = name + '.json'
-
-    for app in apps.get_app_configs():
-        fpath = os.path.join(app.path, 'embedded_models.json', name)
-        if not os.path.isfile(fpath):
+
+
+def clear_import_cache():
+    __import_cache.clear()
+    __import_stats['hits'] = 0
+    __import_stats['misses'] = 0
+
+
+
+def get_definition_class_paths(definition):
+    """
+    Dotted paths that generators resolve with import_class for model definition
+    """
+    paths = []
+    base = definition.get('base', None) or []
+    if not isinstance(base, list):
+        base = [base]
+    paths += base
+    for params in list((definition.get('properties', None) or {}).values()) + \
+        list((definition.get('relations', None) or {}).values()):
+        if not isinstance(params, dict):
+            continue
+        for key in ['type', 'model']:
+            if '.' in str(params.get(key, '')) and '.json' not in str(params[key]):
+                paths.append(params[key])
+    serializer = definition.get('serializer', None) or {}
+    paths += serializer.get('base', None) or []
+    viewset = definition.get('viewset', None) or {}
+    for key in ['base', 'mixins', 'filter_backends']:
+        paths += [
+            p
+            for p in viewset.get(key, None) or []
+            if isinstance(p, str)
+        ]
+    return paths
+
+
+
+def preresolve_classes(app=None):
+    """
+    Resolves all dotted paths named in model definitions of 'app' (or of every app),
+    generator classes from DRF_GENERATOR and REST_FRAMEWORK['DEFAULT_FILTER_BACKENDS']
+    so that generators get them from import_class cache.
+    Paths that can not be imported yet (e.g. models that are not generated) are skipped.
+    Returns (resolved, failed) lists of paths
+    """
+    from django.conf import settings
+    from .registry import registry
+
+    paths = [
+        get_drf_generator_setting('model', 'default_generator'),
+        get_drf_generator_setting('serializer', 'default_generator')
+    ]
+    paths += list(getattr(settings, 'REST_FRAMEWORK', {}).get('DEFAULT_FILTER_BACKENDS', []))
+    for entry in registry.model_definitions(app=app):
+        paths += get_definition_class_paths(registry.load(entry.path))
+
+    resolved = []
+    failed = []
+    seen = set()
+    for path in paths:
+        if not path or path in seen:
             continue
-        with open(fpath) as f:
-            try:
-                model_schema = json.load(f)
-            except Exception as e:
-                raise Exception("Unable to parse {file}. {error}".format(file=fpath, error=e))
-        break
-    return model_schema
+        seen.add(path)
+        try:
+            import_class(path)
+            resolved.append(path)
+        except (ImportError, AttributeError, ValueError):
+            failed.append(path)
+    return resolved, failed
+
+
+
+
+def load_embedded_model(name):
+    from .registry import registry
+    entry = registry.find_embedded(name)
+    if not entry:
+        return None
+    try:
+        return registry.load(entry.path)
+    except Exception as e:
+        raise Exception("Unable to parse {file}. {error}".format(file=entry.path, error=e))
 
 
 
@@ -0,0 +1,145 @@
+"""
+JSON codecs of drfs JSON fields.
+
+    DRF_GENERATOR = {
+        'json_codec': 'orjson'    # 'json' (default), 'orjson', 'auto' or path to codec class
+    }
+
+'auto' picks orjson if it is installed. Every codec gives the same python
+values as stdlib json: encoder class of field (DjangoJSONEncoder,
+jsonfield JSONEncoder) still converts datetime, Decimal, UUID, ... and
+output is not ascii-escaped where fields ask for ensure_ascii=False.
+Whatever fast codec can't handle exactly (ensure_ascii=True, extra dumps
+kwargs, integers over 64 bit, NaN and Infinity, unknown types) is passed
+to stdlib json, so errors stay the same too. Fast codecs write compact JSON
+(no spaces after separators).
+
+See 'drfs_json_benchmark' management command.
+"""
+import json, math
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+from . import helpers
+
+
+CODECS = {}
+
+
+
+def register_codec(codec_class):
+    CODECS[codec_class.name] = codec_class
+    return codec_class
+
+
+
+@register_codec
+class JSONCodec(object):
+    name = 'json'
+
+    def dumps(self, value, cls=None, ensure_ascii=True, **kwargs):
+        return json.dumps(value, cls=cls, ensure_ascii=ensure_ascii, **kwargs)
+
+    def loads(self, value):
+        return json.loads(value)
+
+
+
+def has_non_finite_float(value):
+    if isinstance(value, float):
+        return not math.isfinite(value)
+    if isinstance(value, dict):
+        return any([has_non_finite_float(v) for v in value.values()])
+    if isinstance(value, (list, tuple)):
+        return any([has_non_finite_float(v) for v in value])
+    return False
+
+
+
+@register_codec
+class OrjsonCodec(JSONCodec):
+    name = 'orjson'
+
+    def __init__(self):
+        import orjson
+        self.orjson = orjson
+        # datetime/date/time and dataclasses are converted by encoder class of field,
+        # like stdlib json does
+        self.options = orjson.OPT_NON_STR_KEYS | \
+            orjson.OPT_PASSTHROUGH_DATETIME | \
+            orjson.OPT_PASSTHROUGH_DATACLASS
+        self.defaults = {}
+
+    def get_default(self, cls):
+        default = self.defaults.get(cls, None)
+        if default is None:
+            default = (cls or json.JSONEncoder)().default
+            self.defaults[cls] = default
+        return default
+
+    def dumps(self, value, cls=None, ensure_ascii=True, **kwargs):
+        if ensure_ascii or kwargs:
+            return super(OrjsonCodec, self).dumps(value, cls=cls, ensure_ascii=ensure_ascii, **kwargs)
+        try:
+            dumped = self.orjson.dumps(
+                value,
+                default=self.get_default(cls),
+                option=self.options
+            )
+        except self.orjson.JSONEncodeError:
+            return super(OrjsonCodec, self).dumps(value, cls=cls, ensure_ascii=ensure_ascii)
+        if b'null' in dumped and has_non_finite_float(value):
+            # orjson writes NaN and Infinity as null
+            return super(OrjsonCodec, self).dumps(value, cls=cls, ensure_ascii=ensure_ascii)
+        return dumped.decode('utf-8')
+
+    def loads(self, value):
+        try:
+            return self.orjson.loads(value)
+        except self.orjson.JSONDecodeError:
+            return super(OrjsonCodec, self).loads(value)
+
+
+
+def is_codec_available(name):
+    try:
+        CODECS[name]()
+    except ImportError:
+        return False
+    return True
+
+
+
+def get_codec_class(name):
+    if name == 'auto':
+        name = 'orjson' if is_codec_available('orjson') else 'json'
+    if name in CODECS:
+        return CODECS[name]
+    if '.' in name:
+        return helpers.import_class(name)
+    raise ValueError("DRFS: Unknown json codec '%s'. Expected one of: %s, auto or path to codec class" % (
+        name, ', '.join(CODECS.keys())
+    ))
+
+
+
+__codec = {'current': None}
+def get_codec():
+    codec = __codec['current']
+    if codec is None:
+        name = helpers.get_drf_generator_setting('json_codec', default='json')
+        codec = get_codec_class(name)()
+        __codec['current'] = codec
+    return codec
+
+
+
+def reset_codec():
+    __codec['current'] = None
+
+
+
+@receiver(setting_changed)
+def reset_codec_on_setting_changed(setting, **kwargs):
+    if setting == 'DRF_GENERATOR':
+        reset_codec()
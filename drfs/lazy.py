@@ -0,0 +1,149 @@
+"""
+Lazy serializers and viewsets.
+
+    drfs.generate_serializer(model_class, lazy=True)
+    drfs.generate_viewset(model_class, lazy=True)
+
+return objects that build the real class on first use, so endpoints that
+are never requested cost nothing at boot.
+
+LazySerializer is a proxy: calling it or reading its attributes builds
+the serializer class.
+
+Lazy viewset is a light class made of viewset base classes and mixins only.
+It has everything router needs (actions, lookup field, queryset for basename),
+while its as_view() returns LazyView, that builds the real viewset on
+first request (or when schema generator asks for view class).
+"""
+import threading
+
+
+
+class LazySerializer(object):
+    def __init__(self, factory, name):
+        object.__setattr__(self, '_factory', factory)
+        object.__setattr__(self, '_name', name)
+        object.__setattr__(self, '_cls', None)
+        object.__setattr__(self, '_lock', threading.Lock())
+
+    def resolve(self):
+        if self._cls is None:
+            with self._lock:
+                if self._cls is None:
+                    object.__setattr__(self, '_cls', self._factory())
+        return self._cls
+
+    def is_resolved(self):
+        return self._cls is not None
+
+    def __call__(self, *args, **kwargs):
+        return self.resolve()(*args, **kwargs)
+
+    def __getattr__(self, name):
+        if name.startswith('__') and name.endswith('__'):
+            raise AttributeError(name)
+        return getattr(self.resolve(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self.resolve(), name, value)
+
+    def __repr__(self):
+        if self._cls is not None:
+            return '<LazySerializer: %r>' % self._cls
+        return '<LazySerializer: %s (not resolved)>' % self._name
+
+
+
+class LazyView(object):
+    """
+    Replacement of function returned by ViewSet.as_view(actions, **initkwargs)
+    """
+    csrf_exempt = True
+
+    def __init__(self, lazy_viewset, actions, initkwargs):
+        self.lazy_viewset = lazy_viewset
+        self._actions = actions
+        self._initkwargs = initkwargs
+        self._view = None
+        self._lock = threading.Lock()
+
+    def get_view(self):
+        if self._view is None:
+            viewset = self.lazy_viewset.resolve()
+            with self._lock:
+                if self._view is None:
+                    self._view = viewset.as_view(self._actions, **self._initkwargs)
+        return self._view
+
+    def __call__(self, request, *args, **kwargs):
+        return self.get_view()(request, *args, **kwargs)
+
+    @property
+    def cls(self):
+        return self.get_view().cls
+
+    @property
+    def initkwargs(self):
+        return self.get_view().initkwargs
+
+    @property
+    def actions(self):
+        return self.get_view().actions
+
+    def __repr__(self):
+        return '<LazyView: %s>' % self.lazy_viewset.__name__
+
+
+
+class LazyViewSetMixin(object):
+    _lazy_factory = None
+    _lazy_lock = None
+    _lazy_viewset = None
+
+    @classmethod
+    def resolve(cls):
+        if cls._lazy_viewset is None:
+            with cls._lazy_lock:
+                if cls._lazy_viewset is None:
+                    cls._lazy_viewset = cls._lazy_factory()
+        return cls._lazy_viewset
+
+    @classmethod
+    def is_resolved(cls):
+        return cls._lazy_viewset is not None
+
+    @classmethod
+    def as_view(cls, actions=None, **initkwargs):
+        return LazyView(cls, actions, initkwargs)
+
+
+
+def lazy_serializer(model_class, **kwargs):
+    from . import generate_serializer
+    return LazySerializer(
+        lambda: generate_serializer(model_class, **kwargs),
+        getattr(model_class, '__name__', str(model_class))
+    )
+
+
+
+def lazy_viewset(model_class, **kwargs):
+    from . import generate_viewset
+    from .viewsetgen import get_viewset_classes
+
+    name, classes = get_viewset_classes(model_class, kwargs)
+    base_cls = type(name, tuple(classes), {})
+    params = {
+        '__module__': base_cls.__module__,
+        'model_class': model_class,
+        '_lazy_factory': staticmethod(lambda: generate_viewset(model_class, **kwargs)),
+        '_lazy_lock': threading.Lock(),
+        '_lazy_viewset': None
+    }
+    if not getattr(base_cls, 'queryset', None):
+        # routers use queryset for default basename
+        if 'queryset' in kwargs:
+            params['queryset'] = kwargs['queryset']
+        else:
+            params['queryset'] = model_class.objects.all()
+    return type(name, (LazyViewSetMixin, base_cls), params)
@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from drfs import codegen
+from drfs.registry import registry
+
+
+
+class Command(BaseCommand):
+    help = "Render models, serializers and viewsets from model definitions into <app>/models_generated.py, " \
+        "<app>/serializers_generated.py and <app>/viewsets_generated.py"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'apps',
+            nargs='*',
+            help="Apps to generate code for (default: all apps with models.json definitions)"
+        )
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help="Do not write anything. Exit with error if generated modules are missing or outdated"
+        )
+
+    def handle(self, *args, **options):
+        registry.reset()
+        apps = options['apps'] or sorted(set([
+            entry.module_name
+            for entry in registry.model_definitions()
+        ]))
+        for app in apps:
+            if not registry.model_definitions(app=app):
+                raise CommandError("No model definitions found for app '%s'" % app)
+
+        if options['check']:
+            outdated = [
+                '%s.%s' % (app, codegen.MODULE_SUFFIXES[kind])
+                for app in apps
+                for kind in ['models', 'serializers', 'viewsets']
+                if not codegen.is_up_to_date(app, kind)
+            ]
+            if outdated:
+                raise CommandError("Generated modules are outdated: %s. Run drfs_codegen" % ', '.join(outdated))
+            self.stdout.write("Generated modules are up to date")
+            return
+
+        for app in apps:
+            errors = []
+            try:
+                paths = codegen.write_app(app, errors=errors)
+            except codegen.CodegenError as e:
+                raise CommandError(str(e))
+            for name, error in errors:
+                self.stderr.write("Skipped '%s' model of '%s' app: %s" % (name, app, error))
+            for path in paths:
+                self.stdout.write("Written '%s'" % path)
@@ -0,0 +1,97 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import models, transaction
+from django.db.models.functions import Cast
+
+from drfs.db.compression import decompress_text
+from drfs.db.fields import JSONField, LazyJSON
+
+
+
+class Command(BaseCommand):
+    help = "Rewrite stored values of JSON fields with \"storage\": {\"compress\": ...} option " \
+        "(compress existing rows or, with --decompress, store them as plain JSON text)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'models',
+            nargs='*',
+            help="Models to convert as app_label.ModelName (default: all models with compressed fields)"
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=500,
+            help="Number of rows read and written in one transaction (default: 500)"
+        )
+        parser.add_argument(
+            '--decompress',
+            action='store_true',
+            help="Store all values of JSON fields of given models as plain JSON text"
+        )
+
+    def get_fields(self, model_class, decompress):
+        return [
+            field
+            for field in model_class._meta.concrete_fields
+            if isinstance(field, JSONField) and (decompress or field.compressor is not None)
+        ]
+
+    def get_models(self, labels, decompress):
+        if not labels:
+            return [
+                model_class
+                for model_class in apps.get_models()
+                if self.get_fields(model_class, False)
+            ]
+        model_classes = []
+        for label in labels:
+            try:
+                model_classes.append(apps.get_model(label))
+            except (LookupError, ValueError) as e:
+                raise CommandError("Unknown model '%s': %s" % (label, e))
+        return model_classes
+
+    def convert_text(self, field, raw, decompress):
+        text = decompress_text(raw)
+        if decompress or field.compressor is None:
+            return text
+        return field.compressor.compress(text)
+
+    def convert_model(self, model_class, decompress, chunk_size):
+        fields = self.get_fields(model_class, decompress)
+        if not fields:
+            return 0
+        queryset = model_class._base_manager.order_by('pk').annotate(**dict([
+            ('_drfs_raw_%s' % field.attname, Cast(field.attname, output_field=models.TextField()))
+            for field in fields
+        ]))
+        names = ['pk'] + ['_drfs_raw_%s' % field.attname for field in fields]
+        last_pk = None
+        converted = 0
+        while True:
+            chunk = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+            rows = list(chunk.values_list(*names)[:chunk_size])
+            if not rows:
+                break
+            with transaction.atomic(using=queryset.db):
+                for row in rows:
+                    changes = {}
+                    for field, raw in zip(fields, row[1:]):
+                        if raw is None:
+                            continue
+                        text = self.convert_text(field, raw, decompress)
+                        if text != raw:
+                            changes[field.attname] = LazyJSON(text)
+                    if changes:
+                        model_class._base_manager.filter(pk=row[0]).update(**changes)
+                        converted += 1
+            last_pk = rows[-1][0]
+        return converted
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError("--chunk-size should be positive number")
+        for model_class in self.get_models(options['models'], options['decompress']):
+            converted = self.convert_model(model_class, options['decompress'], options['chunk_size'])
+            self.stdout.write('%s: %s rows converted' % (model_class._meta.label, converted))
@@ -0,0 +1,102 @@
+import json, timeit
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+
+from drfs import jsoncodec
+
+
+# number of documents in generated fixtures
+SIZES = [
+    ('small', 1),
+    ('medium', 100),
+    ('large', 2000)
+]
+
+
+
+def make_document(i):
+    return {
+        'id': i,
+        'title': 'Document %s' % i,
+        'description': 'Описание документа %s' % i,
+        'price': i * 1.25,
+        'active': i % 2 == 0,
+        'tags': ['tag%s' % t for t in range(5)],
+        'embedded': dict([
+            (str(k), {'estring': 'value %s' % k, 'eint': k, 'one_embedded2': {'eint2': k}})
+            for k in range(5)
+        ])
+    }
+
+
+
+class Command(BaseCommand):
+    help = "Compare speed of available JSON codecs (dumps and loads) on generated or given fixtures"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'fixtures',
+            nargs='*',
+            help="Paths of JSON files to use instead of generated fixtures"
+        )
+        parser.add_argument(
+            '--number',
+            type=int,
+            default=0,
+            help="Number of runs per measurement (default: chosen by fixture size)"
+        )
+
+    def get_fixtures(self, paths):
+        if not paths:
+            return [
+                (name, [make_document(i) for i in range(count)])
+                for name, count in SIZES
+            ]
+        fixtures = []
+        for path in paths:
+            try:
+                with open(path) as f:
+                    fixtures.append((path, json.load(f)))
+            except (OSError, ValueError) as e:
+                raise CommandError("Unable to load fixture '%s': %s" % (path, e))
+        return fixtures
+
+    def handle(self, *args, **options):
+        codecs = []
+        for name in jsoncodec.CODECS:
+            if jsoncodec.is_codec_available(name):
+                codecs.append(jsoncodec.CODECS[name]())
+            else:
+                self.stdout.write("Codec '%s' is not installed, skipped" % name)
+        current = jsoncodec.get_codec()
+        if current.name not in [c.name for c in codecs]:
+            codecs.append(current)
+
+        header = '%-20s %10s %-10s %12s %12s %9s %9s' % (
+            'fixture', 'size, KB', 'codec', 'dumps, ms', 'loads, ms', 'dumps, x', 'loads, x'
+        )
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for name, value in self.get_fixtures(options['fixtures']):
+            raw = json.dumps(value, cls=DjangoJSONEncoder, ensure_ascii=False)
+            number = options['number'] or max(1, int(2000000 / (len(raw) + 1000)))
+            baseline = None
+            for codec in codecs:
+                dumps = timeit.timeit(
+                    lambda: codec.dumps(value, cls=DjangoJSONEncoder, ensure_ascii=False),
+                    number=number
+                ) / number
+                loads = timeit.timeit(lambda: codec.loads(raw), number=number) / number
+                if baseline is None:
+                    baseline = (dumps, loads)
+                self.stdout.write('%-20s %10s %-10s %12s %12s %9s %9s' % (
+                    name[-20:],
+                    '%.1f' % (len(raw.encode('utf-8')) / 1024.0),
+                    codec.name + ('*' if codec.name == current.name else ''),
+                    '%.3f' % (dumps * 1000),
+                    '%.3f' % (loads * 1000),
+                    '%.1f' % (baseline[0] / dumps),
+                    '%.1f' % (baseline[1] / loads)
+                ))
+        self.stdout.write('')
+        self.stdout.write("* - codec of DRF_GENERATOR['json_codec'] setting")
@@ -0,0 +1,121 @@
+import os, sys, json, subprocess
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from drfs import profiling
+
+
+CHILD_SCRIPT = """
+import sys, django
+django.setup()
+from drfs.profiling import profile_startup
+profile_startup(sys.argv[1], preload=sys.argv[2] == '1')
+"""
+
+
+
+class Command(BaseCommand):
+    help = "Start project in fresh process with profiling enabled and print time, created classes, " \
+        "import_class calls, parsed JSON and memory of every generation phase"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output',
+            default='drfs_startup_profile.json',
+            help="Path of JSON report (default: drfs_startup_profile.json)"
+        )
+        parser.add_argument(
+            '--sort',
+            default='wall',
+            choices=profiling.METRICS,
+            help="Sort phases by this metric (default: wall)"
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=30,
+            help="Number of phases to print (default: 30)"
+        )
+        parser.add_argument(
+            '--preload',
+            action='store_true',
+            help="Also run drfs.preload() (viewsets, serializers and models of ROOT_URLCONF)"
+        )
+        parser.add_argument(
+            '--no-tracemalloc',
+            action='store_true',
+            help="Do not trace memory allocations (faster, but no memory column)"
+        )
+        parser.add_argument(
+            '--compare',
+            help="Path of previous JSON report to compare totals with"
+        )
+
+    def handle(self, *args, **options):
+        env = os.environ.copy()
+        env['DRFS_PROFILE'] = '1'
+        if not options['no_tracemalloc']:
+            env['DRFS_PROFILE_TRACEMALLOC'] = '1'
+        env['DJANGO_SETTINGS_MODULE'] = settings.SETTINGS_MODULE
+        env['PYTHONPATH'] = os.pathsep.join([p for p in sys.path if p])
+
+        output = os.path.abspath(options['output'])
+        returncode = subprocess.call([
+            sys.executable, '-c', CHILD_SCRIPT,
+            output,
+            '1' if options['preload'] else '0'
+        ], env=env)
+        if returncode != 0 or not os.path.isfile(output):
+            raise CommandError("Profiled process failed with exit code %s" % returncode)
+
+        with open(output) as f:
+            report = json.load(f)
+
+        self.print_phases(report, options['sort'], options['limit'])
+        self.print_totals(report, options['compare'])
+        self.stdout.write("Report written to '%s'" % output)
+
+    def format_row(self, kind, name, values):
+        return '%-18s %-40s %10s %8s %8s %10s %10s' % (
+            kind,
+            name[:40],
+            '%.1f' % (values['wall'] * 1000),
+            values['classes'],
+            values['imports'],
+            '%.1f' % (values['json_bytes'] / 1024.0),
+            '%.1f' % (values['memory'] / 1024.0)
+        )
+
+    def print_phases(self, report, sort, limit):
+        header = '%-18s %-40s %10s %8s %8s %10s %10s' % (
+            'phase', 'name', 'wall, ms', 'classes', 'imports', 'json, KB', 'memory, KB'
+        )
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        phases = sorted(report['phases'], key=lambda p: p[sort], reverse=True)
+        for p in phases[:limit]:
+            name = p['name']
+            if p['nested']:
+                name = '  ' + name
+            self.stdout.write(self.format_row(p['kind'], name, p))
+        self.stdout.write('')
+
+    def print_totals(self, report, compare_path):
+        previous = {}
+        if compare_path:
+            with open(compare_path) as f:
+                previous = json.load(f).get('totals', {})
+
+        self.stdout.write("Startup: %.1f ms, python %s, tracemalloc: %s" % (
+            report['wall'] * 1000,
+            report['python'],
+            report['tracemalloc']
+        ))
+        for kind, values in report['totals'].items():
+            self.stdout.write(self.format_row(kind, 'total (%s)' % values['count'], values))
+            if kind in previous:
+                diff = dict([
+                    (m, values[m] - previous[kind].get(m, 0))
+                    for m in profiling.METRICS
+                ])
+                self.stdout.write(self.format_row('', 'change', diff))
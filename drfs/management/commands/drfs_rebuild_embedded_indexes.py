@@ -0,0 +1,102 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from drfs.db.search import rebuild_search_index
+from drfs.filters import get_embedded_index_fields, get_embedded_search_fields
+
+
+
+class Command(BaseCommand):
+    help = "Fill indexed columns of embedded properties (\"index\": true) and search indexes " \
+        "of embedsMany items (\"searchable\") from stored embedded values"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'models',
+            nargs='*',
+            help="Models to rebuild as app_label.ModelName (default: all models with indexed embedded properties)"
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=500,
+            help="Number of rows read and written in one transaction (default: 500)"
+        )
+
+    def get_models(self, labels):
+        if not labels:
+            return [
+                model_class
+                for model_class in apps.get_models()
+                if get_embedded_index_fields(model_class) or get_embedded_search_fields(model_class)
+            ]
+        model_classes = []
+        for label in labels:
+            try:
+                model_classes.append(apps.get_model(label))
+            except (LookupError, ValueError) as e:
+                raise CommandError("Unknown model '%s': %s" % (label, e))
+        return model_classes
+
+    def rebuild_model(self, model_class, chunk_size):
+        fields = list(get_embedded_index_fields(model_class).values())
+        if not fields:
+            return 0
+        sources = sorted(set([field.embedded_source for field in fields]))
+        queryset = model_class._base_manager.order_by('pk').only(
+            *(sources + [field.attname for field in fields])
+        )
+        last_pk = None
+        rebuilt = 0
+        while True:
+            chunk = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+            objs = list(chunk[:chunk_size])
+            if not objs:
+                break
+            changed = []
+            for obj in objs:
+                is_changed = False
+                for field in fields:
+                    value = field.get_index_value(getattr(obj, field.embedded_source))
+                    if value != getattr(obj, field.attname):
+                        setattr(obj, field.attname, value)
+                        is_changed = True
+                if is_changed:
+                    changed.append(obj)
+            if changed:
+                with transaction.atomic(using=queryset.db):
+                    model_class._base_manager.bulk_update(changed, [field.name for field in fields])
+                rebuilt += len(changed)
+            last_pk = objs[-1].pk
+        return rebuilt
+
+    def rebuild_search_indexes(self, model_class, chunk_size):
+        fields = list(get_embedded_search_fields(model_class).values())
+        if not fields:
+            return 0
+        queryset = model_class._base_manager.order_by('pk').only(*[field.attname for field in fields])
+        last_pk = None
+        rebuilt = 0
+        while True:
+            chunk = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+            objs = list(chunk[:chunk_size])
+            if not objs:
+                break
+            with transaction.atomic(using=queryset.db):
+                for obj in objs:
+                    for field in fields:
+                        rebuild_search_index(field, obj, getattr(obj, field.attname), using=queryset.db)
+            rebuilt += len(objs)
+            last_pk = objs[-1].pk
+        return rebuilt
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError("--chunk-size should be positive number")
+        for model_class in self.get_models(options['models']):
+            rebuilt = self.rebuild_model(model_class, options['chunk_size'])
+            self.stdout.write('%s: %s rows updated' % (model_class._meta.label, rebuilt))
+            rebuilt = self.rebuild_search_indexes(model_class, options['chunk_size'])
+            if rebuilt:
+                self.stdout.write('%s: search index of %s rows rebuilt' % (model_class._meta.label, rebuilt))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from drfs.registry import registry
+
+
+
+class Command(BaseCommand):
+    help = "Parse all model and embedded model definitions and store them in DRF_GENERATOR['cache']['path']"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--clear',
+            action='store_true',
+            help="Drop existing cache entries before parsing definitions"
+        )
+
+    def handle(self, *args, **options):
+        cache = registry.cache
+        if not cache.get_path():
+            raise CommandError("Set DRF_GENERATOR['cache']['path'] in your settings to use definitions cache")
+        if options['clear']:
+            cache.clear()
+
+        registry.reset()
+        entries = registry.model_definitions() + registry.embedded_definitions()
+        for entry in entries:
+            registry.load(entry.path)
+        cache.save()
+        self.stdout.write("Cached %s definitions in '%s'" % (len(entries), cache.get_path()))
@@ -0,0 +1,154 @@
+"""
+Build everything in master process before forking workers.
+
+    # wsgi.py (gunicorn --preload)
+    application = get_wsgi_application()
+    from myproject.urls import router
+    drfs.preload(routers=[router], openapi=True)
+
+preload() resolves lazy viewsets and serializers of routers (or of url
+patterns of ROOT_URLCONF when no routers passed), instantiates serializers
+once (so nested serializers, expand serializers and embedded validators are
+built), builds router url patterns and, optionally, OpenAPI document. Only
+models referenced by these viewsets and serializers are touched: models of
+definitions that project never uses are not generated (every generated
+model is registered in django and would be seen by migrations). Then it
+collects garbage and moves all objects into permanent generation with
+gc.freeze(), so workers share them copy-on-write instead of touching (and
+copying) their memory pages.
+"""
+import gc
+from collections import OrderedDict
+from rest_framework import serializers
+
+from .lazy import LazySerializer, LazyView, LazyViewSetMixin
+
+
+
+__openapi_schema = {}
+def get_openapi_schema():
+    """
+    OpenAPI document built by preload(openapi=True) or None
+    """
+    return __openapi_schema.get('schema', None)
+
+
+
+def preload_model(model_class, report, seen):
+    if not isinstance(model_class, type) or model_class in seen:
+        return
+    seen.add(model_class)
+    report['models'] += 1
+
+
+
+def preload_serializer(serializer_class, report, seen):
+    if isinstance(serializer_class, LazySerializer):
+        serializer_class = serializer_class.resolve()
+    if not isinstance(serializer_class, type) or serializer_class in seen:
+        return
+    seen.add(serializer_class)
+    report['serializers'] += 1
+    preload_model(getattr(getattr(serializer_class, 'Meta', None), 'model', None), report, seen)
+
+    serializer = serializer_class(context={})
+    for field in serializer.fields.values():
+        if isinstance(field, serializers.ListSerializer):
+            field = field.child
+        if isinstance(field, serializers.BaseSerializer):
+            report['nested_serializers'] += 1
+            preload_serializer(type(field), report, seen)
+        if getattr(field, 'embedded_validator', None):
+            report['embedded_validators'] += 1
+
+    if hasattr(serializer_class, 'get_expand_serializer_classes'):
+        for expand_class in serializer_class.get_expand_serializer_classes().values():
+            report['expand_serializers'] += 1
+            preload_serializer(expand_class, report, seen)
+
+
+
+def preload_viewset(viewset, report, seen):
+    name = getattr(viewset, '__name__', repr(viewset))
+    try:
+        if isinstance(viewset, type) and issubclass(viewset, LazyViewSetMixin):
+            viewset = viewset.resolve()
+        if viewset in seen:
+            return
+        seen.add(viewset)
+        report['viewsets'] += 1
+        queryset = getattr(viewset, 'queryset', None)
+        preload_model(getattr(queryset, 'model', None), report, seen)
+        serializer_class = getattr(viewset, 'serializer_class', None)
+        if serializer_class is not None:
+            preload_serializer(serializer_class, report, seen)
+    except Exception as e:
+        report['errors'].append((name, str(e)))
+
+
+
+def preload_urls(patterns, report, seen=None):
+    for pattern in patterns:
+        if hasattr(pattern, 'url_patterns'):
+            preload_urls(pattern.url_patterns, report, seen)
+            continue
+        view = pattern.callback
+        if isinstance(view, LazyView):
+            view = view.get_view()
+        if seen is not None and getattr(view, 'cls', None) is not None:
+            # viewsets of ROOT_URLCONF (preload without routers)
+            preload_viewset(view.cls, report, seen)
+        report['urls'] += 1
+
+
+
+def preload(routers=None, openapi=False, freeze=True):
+    """
+    routers - routers with registered viewsets. Their url patterns are built
+        (and cached by router) and viewsets/serializers are generated
+    openapi - build OpenAPI document (from routers or from ROOT_URLCONF
+        when no routers passed). Get it later with drfs.get_openapi_schema()
+    freeze - call gc.freeze() at the end (python >= 3.7)
+
+    Returns dict with numbers of built objects. Viewsets that fail to
+    resolve are listed in 'errors' as (name, error message).
+    """
+    report = OrderedDict([
+        ('models', 0),
+        ('viewsets', 0),
+        ('serializers', 0),
+        ('nested_serializers', 0),
+        ('expand_serializers', 0),
+        ('embedded_validators', 0),
+        ('urls', 0),
+        ('openapi_paths', 0),
+        ('frozen', 0),
+        ('errors', [])
+    ])
+
+    seen = set()
+    patterns = []
+    for router in routers or []:
+        for prefix, viewset, basename in router.registry:
+            preload_viewset(viewset, report, seen)
+        urls = router.urls
+        preload_urls(urls, report)
+        patterns.extend(urls)
+    if routers is None:
+        from django.conf import settings
+        from django.urls import get_resolver
+        if getattr(settings, 'ROOT_URLCONF', None):
+            preload_urls(get_resolver().url_patterns, report, seen)
+
+    if openapi:
+        from rest_framework.schemas.openapi import SchemaGenerator
+        generator = SchemaGenerator(patterns=patterns or None)
+        schema = generator.get_schema(request=None, public=True)
+        __openapi_schema['schema'] = schema
+        report['openapi_paths'] = len((schema or {}).get('paths', {}))
+
+    gc.collect()
+    if freeze and hasattr(gc, 'freeze'):
+        gc.freeze()
+        report['frozen'] = gc.get_freeze_count()
+    return report
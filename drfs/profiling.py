@@ -0,0 +1,206 @@
+"""
+Startup profiling of generation phases.
+
+Generators wrap their work into
+
+    with profiling.phase('model', name):
+        ...
+
+which costs nothing until profiling is started. Profiling starts on import
+when DRFS_PROFILE environment variable is set (DRFS_PROFILE_TRACEMALLOC=1
+also starts tracemalloc) or with profiling.start().
+
+Every phase records wall time, number of created model/serializer/view
+classes (models are counted by class_prepared signal, generators report
+serializer and viewset classes with profiling.add_classes()), number of helpers.import_class calls, bytes of JSON parsed and
+(with tracemalloc) memory delta. Values are inclusive: phase of embedded
+validator is also counted in phase of model it belongs to.
+
+See 'drfs_profile_startup' management command.
+"""
+import os, sys, json, time, tracemalloc
+from collections import OrderedDict
+
+
+REPORT_VERSION = 1
+METRICS = ['wall', 'classes', 'imports', 'json_bytes', 'memory']
+
+
+
+class NoopPhase(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+NOOP_PHASE = NoopPhase()
+
+
+
+def count_model_class(sender, **kwargs):
+    add_classes(1)
+
+
+
+def count_imports():
+    from .helpers import import_class_stats
+    stats = import_class_stats()
+    return stats['hits'] + stats['misses']
+
+
+
+class Phase(object):
+    def __init__(self, profiler, kind, name):
+        self.profiler = profiler
+        self.kind = kind
+        self.name = name
+
+    def snapshot(self):
+        return {
+            'classes': self.profiler.classes,
+            'imports': count_imports(),
+            'json_bytes': self.profiler.json_bytes,
+            'memory': tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else 0
+        }
+
+    def __enter__(self):
+        self.depth = len(self.profiler.stack)
+        # same kind of work is already measured by enclosing phase
+        self.nested = any([p.kind == self.kind for p in self.profiler.stack])
+        self.profiler.stack.append(self)
+        self.start = self.snapshot()
+        # wall time is taken last on enter and first on exit to not measure snapshots
+        self.start['wall'] = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        wall = time.perf_counter()
+        end = self.snapshot()
+        end['wall'] = wall
+        self.profiler.stack.pop()
+        entry = OrderedDict([
+            ('kind', self.kind),
+            ('name', self.name),
+            ('depth', self.depth),
+            ('nested', self.nested)
+        ])
+        for metric in METRICS:
+            entry[metric] = end[metric] - self.start[metric]
+        self.profiler.entries.append(entry)
+        return False
+
+
+
+class Profiler(object):
+    def __init__(self):
+        self.entries = []
+        self.stack = []
+        self.json_bytes = 0
+        self.classes = 0
+        self.started = time.perf_counter()
+
+    def phase(self, kind, name):
+        return Phase(self, kind, str(name))
+
+    def get_report(self):
+        totals = OrderedDict()
+        for entry in self.entries:
+            if entry['nested']:
+                continue
+            total = totals.setdefault(entry['kind'], OrderedDict([('count', 0)] + [(m, 0) for m in METRICS]))
+            total['count'] += 1
+            for metric in METRICS:
+                total[metric] += entry[metric]
+        return OrderedDict([
+            ('version', REPORT_VERSION),
+            ('python', '%s.%s.%s' % sys.version_info[:3]),
+            ('tracemalloc', tracemalloc.is_tracing()),
+            ('wall', time.perf_counter() - self.started),
+            ('totals', totals),
+            ('phases', self.entries)
+        ])
+
+
+
+__profiler = {'current': None, 'tracemalloc': False}
+def get_profiler():
+    return __profiler['current']
+
+
+
+def start(trace_memory=False):
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        __profiler['tracemalloc'] = True
+    if __profiler['current'] is None:
+        from django.db.models.signals import class_prepared
+        class_prepared.connect(count_model_class, dispatch_uid='drfs_profiling')
+        __profiler['current'] = Profiler()
+    return __profiler['current']
+
+
+
+def stop():
+    profiler = __profiler['current']
+    __profiler['current'] = None
+    if profiler is not None:
+        from django.db.models.signals import class_prepared
+        class_prepared.disconnect(count_model_class, dispatch_uid='drfs_profiling')
+    if __profiler['tracemalloc']:
+        tracemalloc.stop()
+        __profiler['tracemalloc'] = False
+    return profiler
+
+
+
+def phase(kind, name):
+    profiler = __profiler['current']
+    if profiler is None:
+        return NOOP_PHASE
+    return profiler.phase(kind, name)
+
+
+
+def add_json_bytes(size):
+    profiler = __profiler['current']
+    if profiler is not None:
+        profiler.json_bytes += size
+
+
+
+def add_classes(count=1):
+    profiler = __profiler['current']
+    if profiler is not None:
+        profiler.classes += count
+
+
+
+def write_report(path, report=None):
+    if report is None:
+        report = get_profiler().get_report()
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+    return report
+
+
+
+def profile_startup(path, preload=False):
+    """
+    Runs in child process of 'drfs_profile_startup' command after django.setup():
+    builds url patterns of ROOT_URLCONF (and runs drfs.preload()) and writes report
+    """
+    from django.conf import settings
+    from django.urls import get_resolver
+    if getattr(settings, 'ROOT_URLCONF', None):
+        get_resolver().url_patterns
+    if preload:
+        import drfs
+        drfs.preload(freeze=False)
+    return write_report(path)
+
+
+
+if os.environ.get('DRFS_PROFILE', None):
+    start(trace_memory=bool(os.environ.get('DRFS_PROFILE_TRACEMALLOC', None)))
@@ -0,0 +1,269 @@
+import os, warnings
+from collections import OrderedDict, namedtuple
+
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+from .cache import DefinitionCache
+
+
+DefinitionEntry = namedtuple('DefinitionEntry', ['name', 'module_name', 'path', 'mtime'])
+
+
+
+def strip_json_ext(name):
+    name = os.path.basename(str(name))
+    if name.endswith('.json'):
+        return name[:-5]
+    return name
+
+
+
+class DefinitionRegistry(object):
+    """
+    Index of model definitions (<app>/models.json/*.json) and embedded
+    model definitions (<app>/embedded_models.json/*.json).
+
+    Definition directories are listed once, on first lookup. After that
+    every lookup is a dict hit: name -> (module_name, path, mtime).
+    """
+    errors = {
+        'duplicate': "DRFS: {kind} definition '{name}' is declared more than once: {paths}. Using '{used}'"
+    }
+
+    def __init__(self):
+        self.cache = DefinitionCache()
+        self._models = None
+        self._embedded = None
+        self.duplicates = {}
+
+
+    def reset(self):
+        self._models = None
+        self._embedded = None
+        self.duplicates = {}
+
+
+    def get_base_dir(self):
+        from django.conf import settings
+        if isinstance(settings.BASE_DIR, str):
+            return settings.BASE_DIR
+        return str(settings.BASE_DIR)
+
+
+    def scan_dir(self, index, kind, path, module_name):
+        if not os.path.isdir(path):
+            return
+        for item in os.scandir(path):
+            if not item.name.endswith('.json') or not item.is_file():
+                continue
+            entry = DefinitionEntry(
+                name=item.name[:-5],
+                module_name=module_name,
+                path=item.path,
+                mtime=item.stat().st_mtime
+            )
+            if entry.name in index:
+                self.duplicates.setdefault((kind, entry.name), [index[entry.name]])
+                self.duplicates[(kind, entry.name)].append(entry)
+                continue
+            index[entry.name] = entry
+
+
+    def report_duplicates(self, kind):
+        for (_kind, name), entries in self.duplicates.items():
+            if _kind != kind:
+                continue
+            warnings.warn(self.errors['duplicate'].format(
+                kind=kind,
+                name=name,
+                paths=', '.join([e.path for e in entries]),
+                used=entries[0].path
+            ))
+
+
+    def scan_models(self):
+        index = OrderedDict()
+        BASE_DIR = self.get_base_dir()
+        for d in os.listdir(BASE_DIR):
+            if d[0] == '.':
+                continue
+            self.scan_dir(index, 'model', os.path.join(BASE_DIR, d, 'models.json'), d)
+        self.scan_dir(index, 'model', os.path.join(BASE_DIR, 'models.json'), os.path.basename(BASE_DIR))
+        self.report_duplicates('model')
+        return index
+
+
+    def scan_embedded(self):
+        from django.apps import apps
+        index = OrderedDict()
+        for app in apps.get_app_configs():
+            self.scan_dir(index, 'embedded', os.path.join(app.path, 'embedded_models.json'), app.name)
+        self.report_duplicates('embedded')
+        return index
+
+
+    @property
+    def models(self):
+        if self._models is None:
+            self._models = self.scan_models()
+        return self._models
+
+
+    @property
+    def embedded(self):
+        if self._embedded is None:
+            self._embedded = self.scan_embedded()
+        return self._embedded
+
+
+    def find_model(self, name):
+        return self.models.get(strip_json_ext(name), None)
+
+
+    def find_embedded(self, name):
+        return self.embedded.get(strip_json_ext(name), None)
+
+
+    def model_definitions(self, app=None):
+        return [
+            entry
+            for entry in self.models.values()
+            if not app or entry.module_name == app
+        ]
+
+
+    def get_app_label(self, entry):
+        from django.apps import apps
+        try:
+            app_config = apps.get_containing_app_config(entry.module_name)
+        except Exception:
+            app_config = None
+        if app_config:
+            return app_config.label
+        return entry.module_name.rsplit('.', 1)[-1]
+
+
+    def resolve_model_name(self, model_path):
+        """
+        Returns definition name for 'model' or 'base' value from model definition
+        ('TestModel', 'TestModel.json', 'myapp.models.TestModel')
+        or None if it doesn't point to any known definition.
+        """
+        model_path = str(model_path)
+        if model_path.endswith('.json'):
+            model_path = model_path[:-5]
+        if '.' not in model_path:
+            if model_path in self.models:
+                return model_path
+            return None
+        module_path, name = model_path.rsplit('.', 1)
+        entry = self.models.get(name, None)
+        if entry and (module_path == entry.module_name or module_path.startswith(entry.module_name + '.')):
+            return name
+        return None
+
+
+    def get_dependencies(self, definition):
+        """
+        Returns (base, relations) - names of definitions this definition
+        inherits from and names of definitions it has relations to.
+        """
+        base = definition.get('base', None) or []
+        if not isinstance(base, list):
+            base = [base]
+        base_names = []
+        for path in base:
+            name = self.resolve_model_name(path)
+            if name and name not in base_names:
+                base_names.append(name)
+
+        relation_names = []
+        for params in (definition.get('relations', None) or {}).values():
+            if not isinstance(params, dict) or not params.get('model', None):
+                continue
+            if params.get('type', None) not in ['belongsTo', 'hasOne', 'hasMany']:
+                continue
+            name = self.resolve_model_name(params['model'])
+            if name and name not in relation_names and name not in base_names:
+                relation_names.append(name)
+        return base_names, relation_names
+
+
+    def sort_definitions(self, names, load):
+        """
+        Orders definition names so that every model comes after its 'base'
+        models and, where possible, after models it has relations to.
+        Relation cycles are allowed (relations are lazy references for django),
+        'base' cycles raise ValueError.
+        """
+        order = []
+        state = {}
+        stack = []
+        dependencies = {}
+
+        def get_dependencies(name):
+            if name not in dependencies:
+                dependencies[name] = self.get_dependencies(load(name))
+            return dependencies[name]
+
+        def base_closure(name, seen):
+            if name in seen:
+                return seen
+            seen.add(name)
+            for dep in get_dependencies(name)[0]:
+                base_closure(dep, seen)
+            return seen
+
+        def visit(name):
+            if state.get(name, None) == 'done':
+                return
+            if state.get(name, None) == 'visiting':
+                raise ValueError("DRFS: Circular 'base' dependency for model definitions: %s" % (
+                    ' -> '.join(stack[stack.index(name):] + [name])
+                ))
+            state[name] = 'visiting'
+            stack.append(name)
+            base_names, relation_names = get_dependencies(name)
+            for dep in base_names:
+                visit(dep)
+            for dep in relation_names:
+                if state.get(dep, None) or base_closure(dep, set()).intersection(stack):
+                    # relation cycle. django will resolve it lazily
+                    continue
+                visit(dep)
+            stack.pop()
+            state[name] = 'done'
+            order.append(name)
+
+        for name in names:
+            visit(name)
+        return order
+
+
+    def embedded_definitions(self):
+        return list(self.embedded.values())
+
+
+    def get_duplicates(self):
+        return dict(self.duplicates)
+
+
+    def load(self, path):
+        return self.cache.load(path)
+
+
+    def digest(self, path):
+        return self.cache.digest(path)
+
+
+
+registry = DefinitionRegistry()
+
+
+@receiver(setting_changed)
+def reset_registry(setting, **kwargs):
+    if setting in ['BASE_DIR', 'INSTALLED_APPS']:
+        registry.reset()
+    if setting == 'DRF_GENERATOR':
+        registry.cache = DefinitionCache()
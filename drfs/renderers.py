@@ -0,0 +1,86 @@
+"""
+JSON renderer that splices stored JSON text of fields into response.
+
+    REST_FRAMEWORK = {
+        'DEFAULT_RENDERER_CLASSES': [
+            'drfs.renderers.JSONRenderer',
+            ...
+        ]
+    }
+
+Columns of lazy JSON fields ("storage": {"lazy": true}) keep raw text
+loaded from database. For read-only requests (GET, HEAD, OPTIONS) rendered
+by this renderer, serializer JSON fields return that text as RawJSON
+fragment and renderer writes it to output as is: the value is never
+parsed nor encoded again. Field value that was already accessed (parsed),
+binary fields, fields with dotted source and fields with own
+to_representation are serialized as usual.
+"""
+import re, uuid
+from functools import partial
+
+from rest_framework import renderers
+from rest_framework.utils import encoders
+
+
+class RawJSON(object):
+    """
+    Pre-serialized JSON text
+    """
+    __slots__ = ('raw',)
+
+    def __init__(self, raw):
+        self.raw = raw
+
+    def __repr__(self):
+        return '<RawJSON: %s>' % self.raw[:50]
+
+
+
+class RawJSONEncoder(encoders.JSONEncoder):
+    """
+    Replaces RawJSON with placeholder string and keeps its text in fragments
+    """
+    def __init__(self, *args, fragments=None, placeholder=None, **kwargs):
+        self.fragments = fragments
+        self.placeholder = placeholder
+        super(RawJSONEncoder, self).__init__(*args, **kwargs)
+
+    def default(self, obj):
+        if type(obj) is RawJSON:
+            self.fragments.append(obj.raw)
+            return self.placeholder % (len(self.fragments) - 1)
+        return super(RawJSONEncoder, self).default(obj)
+
+
+
+class JSONRenderer(renderers.JSONRenderer):
+    encoder_class = RawJSONEncoder
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        fragments = []
+        nonce = uuid.uuid4().hex
+        encoder_class = self.encoder_class
+        self.encoder_class = partial(
+            encoder_class,
+            fragments=fragments,
+            placeholder='@drfs-raw-json-' + nonce + '-%s@'
+        )
+        try:
+            ret = super(JSONRenderer, self).render(data, accepted_media_type, renderer_context)
+        finally:
+            self.encoder_class = encoder_class
+        if not fragments:
+            return ret
+
+        def splice(match):
+            raw = fragments[int(match.group(1))]
+            # same escaping as in rest_framework JSONRenderer
+            raw = raw.replace('\u2028', '\\u2028').replace('\u2029', '\\u2029')
+            return raw.encode('utf-8')
+
+        return re.sub(
+            ('"@drfs-raw-json-' + nonce + r'-(\d+)@"').encode('ascii'),
+            splice,
+            ret
+        )
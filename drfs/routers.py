@@ -3,7 +3,7 @@ from collections import namedtuple
 from django.core.exceptions import ImproperlyConfigured
 from rest_framework.routers import SimpleRouter as BaseSimpleRouter, DefaultRouter as BaseDefaultRouter, Route
 from rest_framework.routers import flatten
-from . import helpers
+from . import helpers, profiling
 
 
 try:
@@ -197,49 +197,57 @@ class SimpleRouter(BaseSimpleRouter):
         ret = UrlPatternList()
 
         for prefix, viewset, basename in self.registry:
-            lookup = self.get_lookup_regex(viewset)
-            routes = self.get_routes(viewset)
-
-            for route in routes:
-
-                # Only actions which actually exist on the viewset will be bound
-                mapping = self.get_method_map(viewset, route.mapping)
-                if not mapping:
-                    continue
-
-                # Build the url pattern
-                if isinstance(route, RouteDrfs):
-                    trailing_slash = route.trailing_slash
-                    if trailing_slash is None:
-                        trailing_slash = self.trailing_slash
-                else:
-                    trailing_slash = self.trailing_slash
-                regex = route.url.format(
-                    prefix=prefix,
-                    lookup=lookup,
-                    trailing_slash=trailing_slash
-                )
-
-                # If there is no prefix, the first part of the url is probably
-                #   controlled by project's urls.py and the router is in an app,
-                #   so a slash in the beginning will (A) cause Django to give
-                #   warnings and (B) generate URLS that will require using '//'.
-                if not prefix and regex[:2] == '^/':
-                    regex = '^' + regex[2:]
-
-                initkwargs = route.initkwargs.copy()
-                if helpers.rest_framework_version >= (3,7,0):
-                    initkwargs.update({'basename': basename})
-                if helpers.rest_framework_version >= (3,8,0):
-                    initkwargs.update({'detail': route.detail})
-
-                view = viewset.as_view(mapping, **initkwargs)
-                name = route.name.format(basename=basename)
-                ret.append(re_path(regex, view, name=name))
+            with profiling.phase('urls', basename):
+                self.add_viewset_urls(ret, prefix, viewset, basename)
 
         return ret
 
 
+    def add_viewset_urls(self, ret, prefix, viewset, basename):
+        """
+        Appends URL patterns of one registered viewset to 'ret'
+        """
+        lookup = self.get_lookup_regex(viewset)
+        routes = self.get_routes(viewset)
+
+        for route in routes:
+
+            # Only actions which actually exist on the viewset will be bound
+            mapping = self.get_method_map(viewset, route.mapping)
+            if not mapping:
+                continue
+
+            # Build the url pattern
+            if isinstance(route, RouteDrfs):
+                trailing_slash = route.trailing_slash
+                if trailing_slash is None:
+                    trailing_slash = self.trailing_slash
+            else:
+                trailing_slash = self.trailing_slash
+            regex = route.url.format(
+                prefix=prefix,
+                lookup=lookup,
+                trailing_slash=trailing_slash
+            )
+
+            # If there is no prefix, the first part of the url is probably
+            #   controlled by project's urls.py and the router is in an app,
+            #   so a slash in the beginning will (A) cause Django to give
+            #   warnings and (B) generate URLS that will require using '//'.
+            if not prefix and regex[:2] == '^/':
+                regex = '^' + regex[2:]
+
+            initkwargs = route.initkwargs.copy()
+            if helpers.rest_framework_version >= (3,7,0):
+                initkwargs.update({'basename': basename})
+            if helpers.rest_framework_version >= (3,8,0):
+                initkwargs.update({'detail': route.detail})
+
+            view = viewset.as_view(mapping, **initkwargs)
+            name = route.name.format(basename=basename)
+            ret.append(re_path(regex, view, name=name))
+
+
 
 class DefaultRouter(BaseDefaultRouter):
     def register(self, prefix, viewset, base_name=None, basename=None):
@@ -255,3 +263,7 @@ class DefaultRouter(BaseDefaultRouter):
         # invalidate the urls cache
         if hasattr(self, '_urls'):
             del self._urls
+
+    def get_urls(self):
+        with profiling.phase('urls', self.__class__.__name__):
+            return super(DefaultRouter, self).get_urls()
@@ -1,7 +1,13 @@
 from rest_framework import serializers, fields
+from rest_framework.permissions import SAFE_METHODS
+from django.core.exceptions import ValidationError as DjangoValidationError
 import json, six
 
 from .openapi import EmbeddedOpenapiSchemaGenerator
+from ..jsoncodec import get_codec
+from ..db.fields import LazyJSON
+from ..db.validators import mark_validated, autoclean_batch
+from ..renderers import RawJSON, JSONRenderer as RawJSONRenderer
 
 
 FLOAT_TYPES = tuple([float] + list(six.integer_types))
@@ -9,10 +15,37 @@ FLOAT_TYPES = tuple([float] + list(six.integer_types))
 
 
 
-class JSONField(fields.JSONField):
+class RawJSONMixin(object):
+    """
+    Passes not parsed text of lazy model field as RawJSON to drfs JSONRenderer
+    (read-only requests only). See drfs.renderers
+    """
+    def allow_raw_json(self):
+        if self.binary or len(self.source_attrs) != 1:
+            return False
+        if type(self).to_representation not in (JSONField.to_representation, ListField.to_representation):
+            return False
+        request = self.context.get('request', None)
+        return request is not None and \
+            request.method in SAFE_METHODS and \
+            isinstance(getattr(request, 'accepted_renderer', None), RawJSONRenderer)
+
+    def get_attribute(self, instance):
+        value = getattr(instance, '__dict__', {}).get(self.source_attrs[0], None) \
+            if self.source_attrs else None
+        if type(value) is LazyJSON and self.allow_raw_json():
+            return RawJSON(value.text)
+        return super(RawJSONMixin, self).get_attribute(instance)
+
+
+
+
+class JSONField(RawJSONMixin, fields.JSONField):
     def to_representation(self, value):
+        if type(value) is RawJSON:
+            return value
         if self.binary:
-            value = json.dumps(value)
+            value = get_codec().dumps(value)
             # On python 2.x the return type for json.dumps() is underspecified.
             # On python 3.x json.dumps() returns unicode strings.
             if isinstance(value, six.text_type):
@@ -23,7 +56,7 @@ class JSONField(fields.JSONField):
             try:
                 value = value.replace("u'", "\"")
                 value = value.replace("'", "\"")
-                return json.loads(value)
+                return get_codec().loads(value)
             except:
                 pass
         return value
@@ -62,10 +95,12 @@ class JSONField(fields.JSONField):
 
 
 
-class ListField(fields.JSONField):
+class ListField(RawJSONMixin, fields.JSONField):
     def to_representation(self, value):
+        if type(value) is RawJSON:
+            return value
         if self.binary:
-            value = json.dumps(value)
+            value = get_codec().dumps(value)
             # On python 2.x the return type for json.dumps() is underspecified.
             # On python 3.x json.dumps() returns unicode strings.
             if isinstance(value, six.text_type):
@@ -76,7 +111,7 @@ class ListField(fields.JSONField):
             try:
                 value = value.replace("u'", "\"")
                 value = value.replace("'", "\"")
-                return json.loads(value)
+                return get_codec().loads(value)
             except:
                 pass
         return value
@@ -175,9 +210,9 @@ class EmbeddedOneModel(JSONField):
     embedded_validator = None
 
     def __init__(self, *args, **kwargs):
-        from drfs.db.validators import EmbeddedValidator
+        from drfs.db.validators import get_embedded_validator
         if 'embedded_model_name' in kwargs:
-            self.embedded_validator = EmbeddedValidator(
+            self.embedded_validator = get_embedded_validator(
                 kwargs['embedded_model_name'],
                 params=kwargs.get('embedded_params', None)
             )
@@ -190,16 +225,22 @@ class EmbeddedOneModel(JSONField):
             if not self.embedded_validator:
                 return True
             validated = self.embedded_validator.validate_data(data)
-            if data:
+            if isinstance(data, dict) and isinstance(validated, dict):
                 for k,v in validated.items():
                     data[k] = v
-                for k,v in data.items():
-                    if k not in data:
+                for k in list(data.keys()):
+                    if k not in validated:
                         del data[k]
             return True
 
         self.validators.append(validator)
 
+    def run_validation(self, data=fields.empty):
+        value = super(EmbeddedOneModel, self).run_validation(data)
+        if not self.embedded_validator:
+            return value
+        return mark_validated(value, self.embedded_validator.model_name)
+
 
     def to_openapi_schema(self):
         gen = EmbeddedOpenapiSchemaGenerator('', {})
@@ -215,9 +256,9 @@ class EmbeddedManyModel(ListField):
     embedded_validator = None
 
     def __init__(self, *args, **kwargs):
-        from drfs.db.validators import EmbeddedValidator
+        from drfs.db.validators import get_embedded_validator
         if 'embedded_model_name' in kwargs:
-            self.embedded_validator = EmbeddedValidator(
+            self.embedded_validator = get_embedded_validator(
                 kwargs['embedded_model_name'],
                 params=kwargs.get('embedded_params', None)
             )
@@ -229,14 +270,23 @@ class EmbeddedManyModel(ListField):
         def validator(data):
             if not self.embedded_validator:
                 return True
-            i = 0
-            for item in data or []:
-                data[i] = self.embedded_validator.validate_data(item)
-                i += 1
+            with autoclean_batch() as batch:
+                self.embedded_validator.collect_autoclean_ids(data, batch, many=True)
+                if data:
+                    try:
+                        data[:] = self.embedded_validator.validate_many(data)
+                    except DjangoValidationError as e:
+                        raise serializers.ValidationError(e.message_dict)
             return True
 
         self.validators.append(validator)
 
+    def run_validation(self, data=fields.empty):
+        value = super(EmbeddedManyModel, self).run_validation(data)
+        if not self.embedded_validator:
+            return value
+        return mark_validated(value, self.embedded_validator.model_name)
+
 
     def to_openapi_schema(self):
         gen = EmbeddedOpenapiSchemaGenerator('', {})
@@ -252,9 +302,9 @@ class EmbeddedManyAsObjectModel(JSONField):
     embedded_validator = None
 
     def __init__(self, *args, **kwargs):
-        from drfs.db.validators import EmbeddedValidator
+        from drfs.db.validators import get_embedded_validator
         if 'embedded_model_name' in kwargs:
-            self.embedded_validator = EmbeddedValidator(
+            self.embedded_validator = get_embedded_validator(
                 kwargs['embedded_model_name'],
                 params=kwargs.get('embedded_params', None)
             )
@@ -266,12 +316,20 @@ class EmbeddedManyAsObjectModel(JSONField):
         def validator(data):
             if not self.embedded_validator or not data:
                 return True
-            for key in data:
-                data[key] = self.embedded_validator.validate_data(data[key])
+            with autoclean_batch() as batch:
+                self.embedded_validator.collect_autoclean_ids(data, batch, many=True)
+                for key in data:
+                    data[key] = self.embedded_validator.validate_data(data[key])
             return True
 
         self.validators.append(validator)
 
+    def run_validation(self, data=fields.empty):
+        value = super(EmbeddedManyAsObjectModel, self).run_validation(data)
+        if not self.embedded_validator:
+            return value
+        return mark_validated(value, self.embedded_validator.model_name)
+
     def to_openapi_schema(self):
         gen = EmbeddedOpenapiSchemaGenerator('', {})
         return gen.build_schema('', {
@@ -1,4 +1,5 @@
-from ..helpers import fix_field_choices, field_choice_description_to_varname
+from ..helpers import field_choice_description_to_varname
+from ..spec import get_model_spec, get_field_spec
 
 
 
@@ -13,7 +14,8 @@ class EmbeddedOpenapiSchemaGenerator:
         }
         required = []
 
-        for name, data in (self.model_data.get('properties', None) or {}).items():
+        spec = get_model_spec(self.model_data)
+        for name, data in spec.properties.items():
             schema = self.build_schema(name, data)
             if not schema:
                 continue
@@ -22,7 +24,7 @@ class EmbeddedOpenapiSchemaGenerator:
                 del schema['required']
             self.schema['properties'][name] = schema
 
-        for name, data in (self.model_data.get('relations', None) or {}).items():
+        for name, data in spec.relations.items():
             schema = self.build_schema(name, data)
             if not schema:
                 continue
@@ -41,6 +43,7 @@ class EmbeddedOpenapiSchemaGenerator:
 
 
     def build_schema(self, field_name, params):
+        params = get_field_spec(field_name, params)
         if params.get('hidden', None):
             return None
 
@@ -48,34 +51,34 @@ class EmbeddedOpenapiSchemaGenerator:
             "type": "object",
             "required": True
         }
-        if not params.get('required', False):
+        if not params.is_required:
             schema['required'] = False
         if not schema['required']:
             del schema['required']
             schema['nullable'] = True
 
-        if params['type'] in ['any', 'object']:
+        if params.type in ['any', 'object']:
             return schema
 
-        if params['type'] in ['int', 'float', 'number']:
-            if params['type'] == 'int':
+        if params.type in ['int', 'float', 'number']:
+            if params.type == 'int':
                 schema['type'] = 'integer'
             else:
                 schema['type'] = 'number'
             if 'min' in params:
-                schema['minimum'] = params['min']
+                schema['minimum'] = params.min
             if 'max' in params:
-                schema['maximum'] = params['max']
+                schema['maximum'] = params.max
 
-        if params['type'] in ['string']:
+        if params.type in ['string']:
             schema['type'] = 'string'
             if 'min' in params:
-                schema['minLength'] = params['min']
+                schema['minLength'] = params.min
             if 'max' in params:
-                schema['maxLength'] = params['max']
+                schema['maxLength'] = params.max
 
-        if 'choices' in params:
-            choices = fix_field_choices(params['choices'])
+        if params.choices:
+            choices = params.choices
             # openapi <= 3.1
             schema['enum'] = [
                 c[0]
@@ -95,24 +98,24 @@ class EmbeddedOpenapiSchemaGenerator:
                 for i in range(len(choices))
             ]
 
-        if params['type'] == 'bool':
+        if params.type == 'bool':
             schema['type'] = 'boolean'
 
-        if params['type'] == 'GeoPoint':
+        if params.type == 'GeoPoint':
             schema['$ref'] = self.model_name_to_openapi_ref('GeoPoint')
 
-        if params['type'] == 'embedsOne':
-            schema['$ref'] = self.model_name_to_openapi_ref(params['model'])
+        if params.type == 'embedsOne':
+            schema['$ref'] = self.model_name_to_openapi_ref(params.model)
 
-        if params['type'] == 'embedsMany':
+        if params.type == 'embedsMany':
             schema['type'] = 'array'
             schema['items'] = {
-                '$ref': self.model_name_to_openapi_ref(params['model'])
+                '$ref': self.model_name_to_openapi_ref(params.model)
             }
 
-        if params['type'] == 'embedsManyAsObject':
+        if params.type == 'embedsManyAsObject':
             schema['additionalProperties'] = {
-                '$ref': self.model_name_to_openapi_ref(params['model'])
+                '$ref': self.model_name_to_openapi_ref(params.model)
             }
         return schema
 
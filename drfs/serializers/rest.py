@@ -1,4 +1,4 @@
-import json
+import json, weakref
 from collections.abc import Mapping
 from collections import OrderedDict
 from rest_framework import serializers
@@ -10,7 +10,7 @@ from rest_framework.fields import SkipField
 
 
 from django.contrib.auth import authenticate
-from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.exceptions import ValidationError as DjangoValidationError, FieldDoesNotExist
 try:
     # DEPRECATED
     from django.utils.translation import ugettext_lazy as _
@@ -179,9 +179,52 @@ class UserLoggedInfoSerializer(serializers.Serializer):
 
 
 class BaseModelSerializer(LoopbackJsSerializerMixin):
+    # serializer class -> {(field name, expandable_fields params): serializer class for '$field'}
+    _expand_serializer_classes = weakref.WeakKeyDictionary()
+
     def __init__(self, *args, **kwargs):
         super(BaseModelSerializer, self).__init__(*args, **kwargs)
 
+    @classmethod
+    def get_expand_serializer_class(cls, field, model_class):
+        """
+        Serializer class for expanded field. Generated once per serializer class,
+        field and its Meta.expandable_fields params, not on every request
+        """
+        params = cls.Meta.expandable_fields[field]
+        key = (field, json.dumps(params, sort_keys=True, default=repr))
+        known = BaseModelSerializer._expand_serializer_classes.setdefault(cls, {})
+        if key in known:
+            return known[key]
+
+        from drfs import generate_serializer
+        serializer_class = generate_serializer(
+            model_class,
+            visible_fields=params.get('visible_fields', []),
+            hidden_fields=[]
+        )
+        if params.get('read_only', False):
+            serializer_class.Meta.read_only_fields = params.get('visible_fields', [])
+        known[key] = serializer_class
+        return serializer_class
+
+    @classmethod
+    def get_expand_serializer_classes(cls):
+        """
+        Generates serializer classes for all expandable fields (see drfs.preload)
+        """
+        ret = OrderedDict()
+        meta = getattr(cls, 'Meta', None)
+        model_class = getattr(meta, 'model', None)
+        for field in getattr(meta, 'expandable_fields', None) or {}:
+            try:
+                related_model = model_class._meta.get_field(field).related_model
+            except (AttributeError, FieldDoesNotExist):
+                continue
+            if related_model:
+                ret[field] = cls.get_expand_serializer_class(field, related_model)
+        return ret
+
     def to_internal_value(self, data):
         """
         копия https://github.com/encode/django-rest-framework/blob/master/rest_framework/serializers.py
@@ -258,8 +301,6 @@ class BaseModelSerializer(LoopbackJsSerializerMixin):
         if not expand_fields:
             return fields
 
-        from drfs import generate_serializer
-
         for field in expand_fields:
             if field not in fields:
                 continue
@@ -274,12 +315,6 @@ class BaseModelSerializer(LoopbackJsSerializerMixin):
                 has_queryset = True
             if not has_queryset:
                 continue
-            serializer_class = generate_serializer(
-                queryset.model,
-                visible_fields=self.Meta.expandable_fields[field].get('visible_fields', []),
-                hidden_fields=[]
-            )
-            if self.Meta.expandable_fields[field].get('read_only', False):
-                serializer_class.Meta.read_only_fields = self.Meta.expandable_fields[field].get('visible_fields', [])
+            serializer_class = self.get_expand_serializer_class(field, queryset.model)
             fields['$'+field] = serializer_class(many=has_many, source=field)
         return fields
@@ -0,0 +1,200 @@
+"""
+Normalized, immutable view of model definitions.
+
+    spec = get_model_spec(model_class)
+    for field in spec.fields:
+        field.name, field.type, field.is_required, field.choices_set, ...
+
+Generators read field params through ModelSpec/FieldSpec instead of
+walking raw dicts with .get() chains. Spec of a model is built once by
+model generator and pinned on model class as DRFS_MODEL_SPEC, serializer
+and viewset generators reuse it. Embedded validators and openapi generator
+normalize embedded definitions the same way. Names, types and model names
+are interned (and definitions loaded by registry have interned strings).
+
+FieldSpec is also a read-only Mapping over the field params, so code
+written for raw dicts (params['type'], params.get('serializer', {}), ...)
+keeps working when it gets FieldSpec. Specs keep references to params
+and definition dicts, not copies: spec adds only its attributes to memory
+of DRFS_MODEL_DEFINITION.
+
+Field level is a snapshot: changing 'properties'/'relations' of
+DRFS_MODEL_DEFINITION after model is generated has no effect on model
+anyway. Model level sections ('serializer', 'viewset', 'acl', ...) are
+still read from DRFS_MODEL_DEFINITION by generators.
+"""
+import sys
+from collections.abc import Mapping
+
+from .helpers import fix_field_choices
+
+
+RELATION_TYPES = ('belongsTo', 'hasOne', 'hasMany')
+EMBEDDED_TYPES = ('embedsOne', 'embedsMany', 'embedsManyAsObject')
+EMPTY = {}
+
+
+
+class FrozenSpec(object):
+    __slots__ = ()
+
+    def __setattr__(self, name, value):
+        raise AttributeError("'%s' object is immutable" % self.__class__.__name__)
+
+    def __delattr__(self, name):
+        raise AttributeError("'%s' object is immutable" % self.__class__.__name__)
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+
+
+class FieldSpec(FrozenSpec, Mapping):
+    __slots__ = (
+        'name', 'type', 'model', 'required', 'is_required', 'is_optional',
+        'is_relation', 'is_embedded', 'has_default', 'default',
+        'choices', 'choices_values', 'choices_set', 'min', 'max',
+        'description', 'serializer', 'is_hidden', 'is_read_only', 'params'
+    )
+
+    def __init__(self, name, params):
+        if type(params) != type({}):
+            raise Exception("DRFS - generators: Expect 'field_params' to be dict. Got '" + str(type(params)) + "'")
+        if not params.get('type', None):
+            raise Exception("DRFS - generators: No 'field' property in field_params definition for field generation")
+        model = params.get('model', None)
+        if isinstance(model, str):
+            model = sys.intern(model)
+        serializer = params.get('serializer', None) or EMPTY
+        choices = fix_field_choices(params['choices']) if params.get('choices', None) else None
+        choices_values = tuple([c[0] for c in choices]) if choices else None
+        try:
+            choices_set = frozenset(choices_values) if choices else None
+        except TypeError:
+            choices_set = None
+
+        values = {
+            'name': sys.intern(str(name)),
+            'type': sys.intern(params['type']),
+            'model': model,
+            'required': params.get('required', None),
+            'is_required': bool(params.get('required', False)),
+            'is_optional': not params.get('required', True),
+            'is_relation': params['type'] in RELATION_TYPES,
+            'is_embedded': params['type'] in EMBEDDED_TYPES,
+            'has_default': 'default' in params,
+            'default': params.get('default', None),
+            'choices': choices,
+            'choices_values': choices_values,
+            'choices_set': choices_set,
+            'min': params.get('min', None),
+            'max': params.get('max', None),
+            'description': params.get('description', None),
+            'serializer': serializer,
+            'is_hidden': bool(serializer.get('hidden', False)),
+            'is_read_only': bool(serializer.get('read_only', False)),
+            'params': params
+        }
+        for k, v in values.items():
+            object.__setattr__(self, k, v)
+
+    def has_choice(self, value):
+        if self.choices_set is not None:
+            try:
+                return value in self.choices_set
+            except TypeError:
+                # unhashable value
+                pass
+        return value in (self.choices_values or ())
+
+    def __getitem__(self, key):
+        return self.params[key]
+
+    def __iter__(self):
+        return iter(self.params)
+
+    def __len__(self):
+        return len(self.params)
+
+    def __reduce__(self):
+        return (FieldSpec, (self.name, self.params))
+
+    def __repr__(self):
+        return '<FieldSpec: %s (%s)>' % (self.name, self.type)
+
+
+
+class ModelSpec(FrozenSpec):
+    __slots__ = ('name', 'base', 'is_abstract', 'properties', 'relations', 'fields', 'definition')
+
+    def __init__(self, definition):
+        definition = definition or EMPTY
+        name = definition.get('name', None)
+        base = definition.get('base', None)
+        if base is not None and not isinstance(base, list):
+            base = [base]
+        properties = {}
+        for field_name, params in (definition.get('properties', None) or EMPTY).items():
+            field = FieldSpec(field_name, params)
+            properties[field.name] = field
+        relations = {}
+        for field_name, params in (definition.get('relations', None) or EMPTY).items():
+            field = FieldSpec(field_name, params)
+            relations[field.name] = field
+        values = {
+            'name': sys.intern(str(name)) if name else None,
+            'base': tuple([sys.intern(b) if isinstance(b, str) else b for b in base]) if base is not None else None,
+            'is_abstract': bool((definition.get('options', None) or EMPTY).get('abstract', False)),
+            'properties': properties,
+            'relations': relations,
+            'fields': tuple(list(properties.values()) + list(relations.values())),
+            'definition': definition
+        }
+        for k, v in values.items():
+            object.__setattr__(self, k, v)
+
+    def get_field(self, name, default=None):
+        """
+        Field from properties or, if there is no such property, from relations
+        """
+        field = self.properties.get(name, None)
+        if field is None:
+            field = self.relations.get(name, default)
+        return field
+
+    def __repr__(self):
+        return '<ModelSpec: %s>' % self.name
+
+
+
+def get_model_spec(model_class_or_definition):
+    """
+    ModelSpec of model class (pinned as DRFS_MODEL_SPEC) or of raw definition
+    """
+    if isinstance(model_class_or_definition, ModelSpec):
+        return model_class_or_definition
+    if not isinstance(model_class_or_definition, type):
+        return ModelSpec(model_class_or_definition)
+
+    model_class = model_class_or_definition
+    definition = getattr(model_class, 'DRFS_MODEL_DEFINITION', None) or EMPTY
+    spec = getattr(model_class, 'DRFS_MODEL_SPEC', None)
+    if spec is not None and spec.definition is definition:
+        return spec
+    spec = ModelSpec(definition)
+    if definition is not EMPTY:
+        setattr(model_class, 'DRFS_MODEL_SPEC', spec)
+    return spec
+
+
+
+def get_field_spec(name, params):
+    """
+    FieldSpec of field params (params may already be FieldSpec)
+    """
+    if isinstance(params, FieldSpec):
+        return params
+    return FieldSpec(name, params)
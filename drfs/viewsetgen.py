@@ -2,8 +2,9 @@ from django.conf import settings
 from rest_framework.settings import api_settings as drf_api_settings
 from rest_framework.viewsets import ModelViewSet
 
-from . import helpers, decorators
+from . import helpers, decorators, profiling
 from .permissions.drf import Everyone as AllowEveryone
+from .spec import get_model_spec
 
 REST_FRAMEWORK = getattr(settings, 'REST_FRAMEWORK', {})
 REST_FRAMEWORK_HAS_DEFAULT_SCHEMA_CLASS = hasattr(drf_api_settings, 'DEFAULT_SCHEMA_CLASS')
@@ -11,6 +12,23 @@ REST_FRAMEWORK_HAS_DEFAULT_SCHEMA_CLASS = hasattr(drf_api_settings, 'DEFAULT_SCH
 
 
 
+def get_filter_fields(model_class, kwargs=None):
+    """
+    Filter fields of generated viewset: given in kwargs, "filter_fields" of
+    "viewset" section of definition or all fields of definition
+    """
+    kwargs = kwargs or {}
+    viewset_pref = getattr(model_class, 'DRFS_MODEL_DEFINITION', {}).get('viewset', {})
+    if 'filter_fields' in kwargs:
+        return kwargs['filter_fields']
+    if 'filter_fields' in viewset_pref:
+        return viewset_pref['filter_fields']
+    return [
+        field.name
+        for field in get_model_spec(model_class).fields
+    ]
+
+
 def get_viewset_params(model_class, kwargs):
     DRFS_MODEL_DEFINITION = getattr(model_class, 'DRFS_MODEL_DEFINITION', {})
     viewset_pref = DRFS_MODEL_DEFINITION.get('viewset', {})
@@ -37,16 +55,7 @@ def get_viewset_params(model_class, kwargs):
             filter_backends.append(
                 helpers.import_class(fb)
             )
-    if 'filter_fields' in kwargs:
-        filter_fields = kwargs['filter_fields']
-    elif 'filter_fields' in viewset_pref:
-        filter_fields = viewset_pref['filter_fields']
-    else:
-        items = list(DRFS_MODEL_DEFINITION.get('properties', {}).items())
-        items += list(DRFS_MODEL_DEFINITION.get('relations',{}).items())
-        filter_fields = [
-            str(k)   for k,v in items
-        ]
+    filter_fields = get_filter_fields(model_class, kwargs)
 
     params = {
         'queryset': queryset,
@@ -58,73 +67,83 @@ def get_viewset_params(model_class, kwargs):
     return params
 
 
+def decorate_viewset_actions(new_cls, model_acl):
+    for prop in dir(new_cls):
+        if prop in ['list', 'retrieve', 'update', 'partial_update', 'create', 'destroy']:
+            setattr(new_cls, prop,
+                decorators.drf_action_decorator(
+                    getattr(new_cls, prop),
+                    model_acl
+                )
+            )
+            continue
+        func = getattr(new_cls, prop)
+        if hasattr(func, 'mapping') or hasattr(func, 'bind_to_methods'):
+            setattr(new_cls, prop,
+                decorators.drf_action_decorator(
+                    func,
+                    model_acl
+                )
+            )
+    return new_cls
+
 
-class ViewsetGenFactory(type):
-    def __new__(self, model_class, **kwargs):
-        DRFS_MODEL_DEFINITION = getattr(model_class, 'DRFS_MODEL_DEFINITION', {})
-        viewset_pref = DRFS_MODEL_DEFINITION.get('viewset', {})
-        if kwargs.get('add_mixin', None):
-            raise ValueError("Do not pass 'add_mixin' to viewset generator via kwargs! Use 'mixins' instead.")
-
-        mixins = []
-        for mixin in kwargs.get('mixins', None) or viewset_pref.get('mixins', None) or []:
-            if callable(mixin):
-                mixins.append(mixin)
-            else:
-                mixins.append(helpers.import_class(mixin))
 
-        if viewset_pref.get('base', None):
-            classes = [
-                helpers.import_class(c)
-                for c in viewset_pref['base']
-            ]
-        else:
-            classes = [
-                ModelViewSet
-            ]
-        classes = mixins + classes
-        has_schema = False
-        for cl in classes:
-            if hasattr(cl, 'schema') and not issubclass(cl, ModelViewSet):
-                has_schema = True
-
-        model_name = DRFS_MODEL_DEFINITION.get(
-            'name',
-            model_class.__name__
-        )
-        name = str(model_name+'_ViewSet')
-        params = get_viewset_params(model_class, kwargs)
-
-        if 'acl' in DRFS_MODEL_DEFINITION:
-            raise ValueError("Property 'acl' should not be set on root of model definition for '%s' model. Place it inside 'viewset' property" % model_name)
-        if kwargs.get('acl', None):
-            model_acl = kwargs.get('acl')
+def get_viewset_classes(model_class, kwargs):
+    """
+    Returns (name, base classes) of viewset for model. Does not build serializer
+    """
+    DRFS_MODEL_DEFINITION = getattr(model_class, 'DRFS_MODEL_DEFINITION', {})
+    viewset_pref = DRFS_MODEL_DEFINITION.get('viewset', {})
+    if kwargs.get('add_mixin', None):
+        raise ValueError("Do not pass 'add_mixin' to viewset generator via kwargs! Use 'mixins' instead.")
+
+    mixins = []
+    for mixin in kwargs.get('mixins', None) or viewset_pref.get('mixins', None) or []:
+        if callable(mixin):
+            mixins.append(mixin)
         else:
-            model_acl = DRFS_MODEL_DEFINITION.get('viewset', {}).get('acl', [])
+            mixins.append(helpers.import_class(mixin))
 
-        new_cls = type(name, tuple(classes), {})
+    if viewset_pref.get('base', None):
+        classes = [
+            helpers.import_class(c)
+            for c in viewset_pref['base']
+        ]
+    else:
+        classes = [
+            ModelViewSet
+        ]
+    classes = mixins + classes
 
-        for class_prop in list(params.keys()):
-            if getattr(new_cls, class_prop, None):
-                del params[class_prop]
+    model_name = DRFS_MODEL_DEFINITION.get(
+        'name',
+        model_class.__name__
+    )
+    if 'acl' in DRFS_MODEL_DEFINITION:
+        raise ValueError("Property 'acl' should not be set on root of model definition for '%s' model. Place it inside 'viewset' property" % model_name)
+    return str(model_name+'_ViewSet'), classes
 
-        new_cls = type(name, (new_cls,), params)
 
-        for prop in dir(new_cls):
-            if prop in ['list', 'retrieve', 'update', 'partial_update', 'create', 'destroy']:
-                setattr(new_cls, prop,
-                    decorators.drf_action_decorator(
-                        getattr(new_cls, prop),
-                        model_acl
-                    )
-                )
-                continue
-            func = getattr(new_cls, prop)
-            if hasattr(func, 'mapping') or hasattr(func, 'bind_to_methods'):
-                setattr(new_cls, prop,
-                    decorators.drf_action_decorator(
-                        func,
-                        model_acl
-                    )
-                )
-        return new_cls
+
+class ViewsetGenFactory(type):
+    def __new__(self, model_class, **kwargs):
+        with profiling.phase('viewset', model_class.__name__):
+            DRFS_MODEL_DEFINITION = getattr(model_class, 'DRFS_MODEL_DEFINITION', {})
+            name, classes = get_viewset_classes(model_class, kwargs)
+            params = get_viewset_params(model_class, kwargs)
+
+            if kwargs.get('acl', None):
+                model_acl = kwargs.get('acl')
+            else:
+                model_acl = DRFS_MODEL_DEFINITION.get('viewset', {}).get('acl', [])
+
+            new_cls = type(name, tuple(classes), {})
+
+            for class_prop in list(params.keys()):
+                if getattr(new_cls, class_prop, None):
+                    del params[class_prop]
+
+            new_cls = type(name, (new_cls,), params)
+            profiling.add_classes(2)
+            return decorate_viewset_actions(new_cls, model_acl)
@@ -13,11 +13,18 @@ TestModelWithRelations_Nested = drfs.generate_model('TestModelWithRelations_Nest
 TestModelRalationBelongsTo = drfs.generate_model('TestModelRalationBelongsTo.json')
 TestModelRalationBelongsTo_withIgnore404Object = drfs.generate_model('TestModelRalationBelongsTo_withIgnore404Object.json')
 TestModelRalationHasOne = drfs.generate_model('TestModelRalationHasOne.json')
+TestModelCascadeItem = drfs.generate_model('TestModelCascadeItem.json')
+TestModelWithHasManyCascade = drfs.generate_model('TestModelWithHasManyCascade.json')
 
 
 TestModelAbstract = drfs.generate_model('TestModelAbstract.json')
 TestModelForJsonData = drfs.generate_model('TestModelForJsonData.json')
+TestModelWithLazyJson = drfs.generate_model('TestModelWithLazyJson.json')
+TestModelWithCompressedJson = drfs.generate_model('TestModelWithCompressedJson.json')
+TestModelWithIndexes = drfs.generate_model('TestModelWithIndexes.json')
 
 
 TestModelWithEmbeddedOne = drfs.generate_model('TestModelWithEmbeddedOne.json')
 TestModelWithEmbeddedManyAsObject = drfs.generate_model('TestModelWithEmbeddedManyAsObject.json')
+TestModelWithEmbeddedIndex = drfs.generate_model('TestModelWithEmbeddedIndex.json')
+TestModelWithSearchableEmbeddedMany = drfs.generate_model('TestModelWithSearchableEmbeddedMany.json')
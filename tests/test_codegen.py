@@ -0,0 +1,120 @@
+import os, json, shutil, tempfile
+from collections import OrderedDict
+from django.test import TestCase, override_settings
+
+import drfs
+from drfs import codegen
+from drfs.registry import registry, DefinitionEntry
+from . import models
+
+
+
+class RenderModules(TestCase):
+
+    def test_models_module(self):
+        source = codegen.render_models_module('tests', OrderedDict([
+            ('TestModelAbstract', models.TestModelAbstract),
+            ('TestModelWithEmbeddedOne', models.TestModelWithEmbeddedOne),
+            ('TestModelWithRelations_Nested', models.TestModelWithRelations_Nested),
+        ]))
+        compile(source, 'models_generated.py', 'exec')
+        self.assertTrue(source.startswith('# -*- coding: utf-8 -*-'))
+        self.assertIn(codegen.DIGEST_HEADER + codegen.get_app_digest('tests'), source)
+        self.assertIn('class TestModelAbstract(models.Model):', source)
+        self.assertIn('        abstract = True', source)
+        self.assertIn(
+            "    one_embedded = drfs.db.fields.EmbeddedOneModel(blank=True, default={}, embedded_model_name='EmbeddedTestModel', null=True)",
+            source
+        )
+        self.assertIn(
+            "    has_many = models.ManyToManyField(blank=True, related_name='TestModelWithRelations_Nested_by_hasMany', to='tests.testmodel')",
+            source
+        )
+        self.assertIn('to=settings.AUTH_USER_MODEL', source)
+        self.assertIn("    'TestModelWithEmbeddedOne': TestModelWithEmbeddedOne,", source)
+        # definition keeps key order of json file
+        self.assertIn("    DRFS_MODEL_DEFINITION = {'name': 'TestModelWithEmbeddedOne',", source)
+
+        source = codegen.render_models_module('tests', OrderedDict([
+            ('TestModelWithIndexes', models.TestModelWithIndexes),
+        ]))
+        compile(source, 'models_generated.py', 'exec')
+        self.assertIn("        ordering = ['-created', 'name']", source)
+        self.assertIn("        unique_together = (('name', 'owner_name'),)", source)
+        self.assertIn("models.Index(fields=['owner_name', '-created'], name='tests_testm_owner_n_81b236_idx')", source)
+        self.assertIn("condition=models.Q(('is_active', True))", source)
+        self.assertIn("        constraints = [models.UniqueConstraint(fields=('code',), name=", source)
+
+    def test_serializers_and_viewsets_modules(self):
+        serializer_class = drfs.generate_serializer(models.TestModelWithRelations_Nested)
+        source = codegen.render_serializers_module('tests', OrderedDict([
+            ('TestModelWithRelations_Nested', serializer_class)
+        ]))
+        compile(source, 'serializers_generated.py', 'exec')
+        self.assertIn('        model = django.contrib.auth.models.User', source)
+        self.assertIn("TestModelWithRelations_Nested__has_many.__name__ = TestModelWithRelations_Nested__has_many.__qualname__ = 'TestModel'", source)
+        self.assertIn("    has_many = TestModelWithRelations_Nested__has_many(help_text='', many=True)", source)
+        self.assertIn('bind_build_relational_field(TestModelWithRelations_Nested, ', source)
+
+        viewset_class = drfs.generate_viewset(models.TestModel, serializer_class=drfs.generate_serializer(models.TestModel))
+        source = codegen.render_viewsets_module('tests', OrderedDict([
+            ('TestModel', viewset_class)
+        ]))
+        compile(source, 'viewsets_generated.py', 'exec')
+        self.assertIn('class TestModel_ViewSet(rest_framework.viewsets.ModelViewSet):', source)
+        self.assertIn("    serializer_class = tests.serializers_generated.SERIALIZERS['TestModel']", source)
+        self.assertIn('decorate_viewset_actions(TestModel_ViewSet, ', source)
+
+
+
+class GeneratedModules(TestCase):
+
+    def setUp(self):
+        self.base_dir = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.base_dir, 'tests', 'models.json'))
+        self.write({'name': 'Item', 'base': 'django.db.models.Model'})
+
+    def tearDown(self):
+        shutil.rmtree(self.base_dir)
+        registry.reset()
+        codegen.reset()
+
+    def write(self, definition):
+        with open(os.path.join(self.base_dir, 'tests', 'models.json', 'Item.json'), 'w') as f:
+            json.dump(definition, f)
+
+    def test_up_to_date(self):
+        with override_settings(BASE_DIR=self.base_dir, DRF_GENERATOR={'codegen': {'enabled': True}}):
+            self.assertFalse(codegen.is_up_to_date('tests', 'models'))
+            self.assertIsNone(codegen.get_generated_model('Item', 'tests'))
+
+            path = codegen.get_module_path('tests', 'models')
+            self.assertEqual(path, os.path.join(self.base_dir, 'tests', 'models_generated.py'))
+            with open(path, 'w') as f:
+                f.write(codegen.DIGEST_HEADER + codegen.get_app_digest('tests') + '\n')
+            self.assertTrue(codegen.is_up_to_date('tests', 'models'))
+
+            self.write({'name': 'Item', 'base': 'django.db.models.Model', 'properties': {}})
+            self.assertFalse(codegen.is_up_to_date('tests', 'models'))
+
+    def test_digest_inputs(self):
+        with override_settings(BASE_DIR=self.base_dir):
+            digest = codegen.get_app_digest('tests')
+            with override_settings(DRF_GENERATOR={'codegen': {'enabled': True}}):
+                self.assertEqual(codegen.get_app_digest('tests'), digest)
+            with override_settings(DRF_GENERATOR={'json_codec': 'orjson'}):
+                self.assertNotEqual(codegen.get_app_digest('tests'), digest)
+
+            path = os.path.join(self.base_dir, 'Tag.json')
+            with open(path, 'w') as f:
+                json.dump({'name': 'Tag', 'properties': {}}, f)
+            registry.embedded['Tag'] = DefinitionEntry(name='Tag', module_name='tests', path=path, mtime=0)
+            self.assertNotEqual(codegen.get_app_digest('tests'), digest)
+
+    def test_generated_model_names(self):
+        names = codegen.get_generated_model_names('tests')
+        # generated by tests/models.py
+        self.assertIn('TestModel', names)
+        self.assertIn('TestModelAbstract', names)
+        self.assertNotIn('TestModelInvalidFieldType', names)
+        self.assertEqual(list(drfs.generate_models(app='tests', names=['TestModel']).keys()), ['TestModel'])
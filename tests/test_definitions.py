@@ -0,0 +1,158 @@
+import os, json, shutil, tempfile, warnings, hashlib
+from django.test import TestCase, override_settings
+
+import drfs
+from drfs import helpers
+from drfs.registry import registry
+
+
+
+class DefinitionRegistry(TestCase):
+
+    def setUp(self):
+        self.base_dir = tempfile.mkdtemp()
+        for app in ['app1', 'app2']:
+            os.makedirs(os.path.join(self.base_dir, app, 'models.json'))
+        self.write('app1', 'Shared.json', {'name': 'Shared'})
+        self.write('app2', 'Shared.json', {'name': 'Shared'})
+        self.write('app2', 'Single.json', {'name': 'Single'})
+
+    def tearDown(self):
+        shutil.rmtree(self.base_dir)
+        registry.reset()
+
+    def write(self, app, name, data):
+        with open(os.path.join(self.base_dir, app, 'models.json', name), 'w') as f:
+            json.dump(data, f)
+
+    def test_find_model_definition(self):
+        with override_settings(BASE_DIR=self.base_dir):
+            with warnings.catch_warnings(record=True):
+                warnings.simplefilter('always')
+                module_name, path = drfs.find_model_definition('Single.json')
+            self.assertEqual(module_name, 'app2')
+            self.assertEqual(path, os.path.join(self.base_dir, 'app2', 'models.json', 'Single.json'))
+
+            self.assertEqual(
+                drfs.find_model_definition('NoSuchModel.json'),
+                (None, None)
+            )
+            self.assertEqual(
+                sorted([e.name for e in registry.model_definitions(app='app2')]),
+                ['Shared', 'Single']
+            )
+
+    def test_duplicates(self):
+        with override_settings(BASE_DIR=self.base_dir):
+            with warnings.catch_warnings(record=True) as w:
+                warnings.simplefilter('always')
+                registry.find_model('Shared')
+            self.assertIn("'Shared' is declared more than once", str(w[0].message))
+            self.assertEqual(
+                len(registry.get_duplicates()[('model', 'Shared')]),
+                2
+            )
+
+    def test_embedded(self):
+        data = helpers.load_embedded_model('EmbeddedTestModel')
+        self.assertEqual(data['name'], 'EmbeddedTestModel')
+        self.assertEqual(
+            helpers.load_embedded_model('EmbeddedTestModel.json'),
+            data
+        )
+        self.assertIsNone(helpers.load_embedded_model('NoSuchEmbeddedModel'))
+
+
+
+class DefinitionCache(TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.definition_path = os.path.join(self.tmp_dir, 'Model.json')
+        self.cache_path = os.path.join(self.tmp_dir, 'definitions.cache')
+        with open(self.definition_path, 'w') as f:
+            json.dump({'name': 'Model'}, f)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_invalidation(self):
+        from drfs.cache import DefinitionCache as Cache
+        cache = Cache(path=self.cache_path)
+        # digest is sha1 of raw file, file is not parsed
+        with open(self.definition_path, 'rb') as f:
+            self.assertEqual(cache.digest(self.definition_path), hashlib.sha1(f.read()).hexdigest())
+        self.assertIsNone(cache.get_entries()[os.path.abspath(self.definition_path)][3])
+        definition = cache.load(self.definition_path)
+        self.assertEqual(definition, {'name': 'Model'})
+        # every load returns a fresh object
+        definition['name'] = 'Changed'
+        self.assertEqual(cache.load(self.definition_path), {'name': 'Model'})
+
+        cache.save()
+        cache = Cache(path=self.cache_path)
+        self.assertIn(os.path.abspath(self.definition_path), cache.get_entries())
+
+        with open(self.definition_path, 'w') as f:
+            json.dump({'name': 'Model', 'properties': {}}, f)
+        self.assertEqual(
+            cache.load(self.definition_path),
+            {'name': 'Model', 'properties': {}}
+        )
+
+    def test_warm_cache_command(self):
+        from django.core.management import call_command
+        from io import StringIO
+        out = StringIO()
+        with override_settings(DRF_GENERATOR={'cache': {'path': self.cache_path}}):
+            call_command('drfs_warm_cache', stdout=out)
+            self.assertTrue(os.path.isfile(self.cache_path))
+            self.assertEqual(
+                len(registry.cache.get_entries()),
+                len(registry.model_definitions()) + len(registry.embedded_definitions())
+            )
+        self.assertIn('Cached', out.getvalue())
+
+
+
+class ModelSpec(TestCase):
+
+    def test_spec(self):
+        import copy
+        from drfs.spec import get_model_spec, FieldSpec
+        from . import models
+
+        spec = get_model_spec(models.TestModelWithEmbeddedOne)
+        self.assertIs(spec, models.TestModelWithEmbeddedOne.DRFS_MODEL_SPEC)
+        self.assertIs(spec, get_model_spec(models.TestModelWithEmbeddedOne))
+        self.assertEqual(spec.name, 'TestModelWithEmbeddedOne')
+
+        field = spec.get_field('one_embedded')
+        self.assertTrue(field.is_embedded)
+        self.assertFalse(field.is_relation)
+        self.assertFalse(field.is_required)
+        self.assertEqual(field.model, 'EmbeddedTestModel')
+        # params are not copied
+        self.assertIs(field.params, models.TestModelWithEmbeddedOne.DRFS_MODEL_DEFINITION['relations']['one_embedded'])
+        # read-only mapping over field params
+        self.assertEqual(field['type'], 'embedsOne')
+        self.assertEqual(field.get('serializer', {}), {})
+        self.assertRaises(AttributeError, setattr, field, 'type', 'string')
+        self.assertIs(copy.deepcopy(field), field)
+
+        field = FieldSpec('choice', {'type': 'string', 'choices': ['a', 'b'], 'required': False})
+        self.assertEqual(field.choices, (('a', 'a'), ('b', 'b')))
+        self.assertEqual(field.choices_set, frozenset(['a', 'b']))
+        self.assertTrue(field.is_optional)
+        self.assertTrue(field.has_choice('a'))
+        self.assertFalse(field.has_choice({'a': 1}))
+
+        # definition replaced on model class - spec is rebuilt
+        definition = dict(models.TestModelWithEmbeddedOne.DRFS_MODEL_DEFINITION)
+        models.TestModelWithEmbeddedOne.DRFS_MODEL_DEFINITION = definition
+        try:
+            self.assertIsNot(get_model_spec(models.TestModelWithEmbeddedOne), spec)
+            self.assertIs(get_model_spec(models.TestModelWithEmbeddedOne).definition, definition)
+        finally:
+            models.TestModelWithEmbeddedOne.DRFS_MODEL_DEFINITION = spec.definition
+            models.TestModelWithEmbeddedOne.DRFS_MODEL_SPEC = spec
@@ -1,4 +1,7 @@
+from unittest import skipIf
+from django.conf import settings
 from django.test import TestCase
+from django.db import connection
 import drfs
 
 
@@ -66,7 +69,7 @@ class Serializer(TestCase):
         self.assertFalse(ser.is_valid())
         self.assertDictEqual(
             ser.errors,
-            {u'many_embedded': [u"Key 'many_embedded2' error:\nNone should be instance of 'list'"]}
+            {u'many_embedded': {2: [u"Key 'many_embedded2' error:\nNone should be instance of 'list'"]}}
         )
         # ok
         ser = serializerClass(data={'many_embedded': [
@@ -87,11 +90,11 @@ class Serializer(TestCase):
         self.assertFalse(ser.is_valid())
         self.assertIn(
             "Key 'many_embedded2' error:",
-            ser.errors['many_embedded'][0]
+            ser.errors['many_embedded'][2][0]
         )
         self.assertIn(
             'estring2',
-            ser.errors['many_embedded'][0]
+            ser.errors['many_embedded'][2][0]
         )
 
         # ok
@@ -116,3 +119,452 @@ class Serializer(TestCase):
                 ]}
             ]
         )
+
+
+
+class CompiledValidator(TestCase):
+
+    def test_engines(self):
+        from django.test import override_settings
+        from drfs.db.validators import EmbeddedValidator
+
+        with override_settings(DRF_GENERATOR={'embedded_validator': {'engine': 'schema'}}):
+            schema_validator = EmbeddedValidator('EmbeddedTestModel')
+        self.assertIsNone(schema_validator.compiled)
+        validator = EmbeddedValidator('EmbeddedTestModel')
+        self.assertIsNotNone(validator.compiled)
+
+        values = [
+            {},
+            {'estring': 'world', 'eint': 5},
+            {'estring': None, 'one_embedded2': {'estring2': 'one'}},
+            {'many_embedded2': [{'eint2': 1}, {'estring2': 'two'}]},
+            {'one_embedded2': {'eint2': 8}, 'eint': 1, 'many_embedded2': []},
+            # invalid
+            {'eint': -1},
+            {'eint': 'string'},
+            {'estring': 10},
+            {'unknown': 1},
+            {'one_embedded2': None},
+            {'one_embedded2': {'eint2': -5}},
+            {'many_embedded2': None},
+            {'many_embedded2': [None]},
+            {'many_embedded2': [{'estring2': 10}]},
+            [],
+        ]
+        for value in values:
+            try:
+                expected = schema_validator.validate_data(value)
+            except Exception as e:
+                with self.assertRaises(e.__class__) as cm:
+                    validator.validate_data(value)
+                if 'embeds_many_validate' not in str(e):
+                    self.assertEqual(str(cm.exception), str(e))
+                continue
+            result = validator.validate_data(value)
+            self.assertEqual(result, expected)
+            self.assertEqual(list(result.keys()), list(expected.keys()))
+
+    def test_compiled_errors(self):
+        from drfs.db.validators import EmbeddedValidator
+
+        validator = EmbeddedValidator('EmbeddedTestModel')
+        def broken(data):
+            raise KeyError('bug')
+        validator.compiled = broken
+        with self.assertRaises(KeyError):
+            validator.validate_schema({'eint': 5})
+
+    def test_unknown_engine(self):
+        from django.test import override_settings
+        from drfs.db.validators import EmbeddedValidator
+
+        with override_settings(DRF_GENERATOR={'embedded_validator': {'engine': 'fast'}}):
+            with self.assertRaises(ValueError):
+                EmbeddedValidator('EmbeddedTestModel')
+
+
+
+class ValidatorRegistry(TestCase):
+
+    def test_shared_validators(self):
+        import copy
+        from drfs.db.validators import get_embedded_validator
+
+        modelClass = drfs.generate_model('TestModelWithEmbeddedOne.json')
+        serializerClass = drfs.generate_serializer(modelClass)
+        model_field = modelClass._meta.get_field('many_embedded')
+        self.assertEqual(
+            len([v for v in model_field.validators if v is model_field.embedded_validator]),
+            1
+        )
+        self.assertIs(
+            get_embedded_validator('EmbeddedTestModel'),
+            get_embedded_validator('EmbeddedTestModel', {'required': False})
+        )
+
+        field = serializerClass().fields['one_embedded']
+        self.assertIs(field.embedded_validator, serializerClass().fields['one_embedded'].embedded_validator)
+        self.assertIs(field.embedded_validator, copy.deepcopy(field).embedded_validator)
+        # validator of nested embedded model is shared too
+        nested = field.embedded_validator.nested_validators['one_embedded2']
+        self.assertIs(nested, get_embedded_validator('EmbeddedTestModel2', {'required': False}))
+
+    def test_validated_once(self):
+        from unittest import mock
+        from drfs.db.validators import EmbeddedValidator
+
+        modelClass = drfs.generate_model('TestModelWithEmbeddedOne.json')
+        serializerClass = drfs.generate_serializer(modelClass)
+        validate_data = EmbeddedValidator.validate_data
+
+        with mock.patch.object(EmbeddedValidator, 'validate_data', autospec=True, side_effect=validate_data) as m:
+            ser = serializerClass(data={'one_embedded': {'estring': 'world'}})
+            self.assertTrue(ser.is_valid())
+            self.assertEqual(m.call_count, 1)
+            instance = ser.save()
+            self.assertEqual(m.call_count, 1)
+            self.assertEqual(instance.one_embedded, {'estring': 'world', 'eint': 90})
+
+            # direct ORM saves are validated
+            instance.one_embedded['eint'] = 10
+            instance.save()
+            self.assertEqual(m.call_count, 2)
+            modelClass.objects.create(one_embedded={'estring': 'orm'})
+            self.assertEqual(m.call_count, 3)
+
+        instance.one_embedded['eint'] = -1
+        with self.assertRaises(Exception):
+            instance.save()
+
+    def test_validation_cache(self):
+        from django.test import override_settings
+        from drfs.db.validators import EmbeddedValidator
+
+        validator = EmbeddedValidator('EmbeddedTestModel')
+        self.assertIsNone(validator.cache_info())
+
+        with override_settings(DRF_GENERATOR={'embedded_validator': {'cache_size': 2}}):
+            validator = EmbeddedValidator('EmbeddedTestModel')
+        value = {'estring': 'world', 'many_embedded2': [{'eint2': 1}]}
+        result = validator.validate_data(value)
+        cached = validator.validate_data({'many_embedded2': [{'eint2': 1}], 'estring': 'world'})
+        self.assertEqual(cached, result)
+        self.assertIsNot(cached, result)
+        cached['eint'] = 1
+        self.assertEqual(validator.validate_data(value)['eint'], 90)
+        self.assertEqual(validator.cache_info()['hits'], 2)
+
+        # invalid data is not cached
+        for i in range(2):
+            with self.assertRaises(Exception):
+                validator.validate_data({'eint': -1})
+        self.assertEqual(validator.cache_info()['currsize'], 1)
+
+        validator.validate_data({'eint': 1})
+        validator.validate_data({'eint': 2})
+        self.assertEqual(validator.cache_info()['currsize'], 2)
+        validator.validate_data(value)
+        self.assertEqual(validator.cache_info()['hits'], 2)
+
+        # data with same JSON as cached data is not cached
+        validator.cache.clear()
+        validator.validate_data({'many_embedded2': [{'eint2': 1}]})
+        with self.assertRaises(Exception):
+            validator.validate_data({'many_embedded2': ({'eint2': 1},)})
+        self.assertIsNone(validator.cache.get_key({1: 'a'}))
+        self.assertIsNotNone(validator.cache.get_key({'1': 'a'}))
+        self.assertEqual(validator.cache_info()['currsize'], 1)
+
+    def test_autoclean_batch(self):
+        from drfs.db.validators import autoclean_batch
+
+        modelClass = drfs.generate_model('TestModelWithEmbeddedManyAsObject.json')
+        TestModel = drfs.generate_model('TestModel.json')
+        known = TestModel.objects.create()
+        value = dict([
+            (str(i), {'estring': 'test'})
+            for i in [known.id, known.id + 100, 'not-id']
+        ])
+
+        # one query for all keys + insert
+        with self.assertNumQueries(2):
+            instance = modelClass.objects.create(many_embedded_as_object_with_model_key=dict(value))
+        self.assertEqual(list(instance.many_embedded_as_object_with_model_key.keys()), [str(known.id)])
+
+        instances = [
+            modelClass(many_embedded_as_object_with_model_key=dict(value))
+            for i in range(5)
+        ]
+        with self.assertNumQueries(2):
+            with autoclean_batch() as batch:
+                batch.collect(instances)
+                modelClass.objects.bulk_create(instances)
+        self.assertEqual(batch.queries, 1)
+        for instance in instances:
+            self.assertEqual(list(instance.many_embedded_as_object_with_model_key.keys()), [str(known.id)])
+
+    def test_validate_many(self):
+        from django.core.exceptions import ValidationError
+        from drfs.db.validators import EmbeddedValidator
+
+        validator = EmbeddedValidator('EmbeddedTestModel')
+        self.assertEqual(
+            validator.validate_many([{'eint': 1}, {}]),
+            [{'eint': 1}, {'eint': 90}]
+        )
+        items = [{'eint': -1}, {'eint': 1}, {'eint': 'a'}, {'eint': -2}]
+        with self.assertRaises(ValidationError) as cm:
+            validator.validate_many(items)
+        self.assertEqual(list(cm.exception.message_dict.keys()), [0, 2, 3])
+        with self.assertRaises(ValidationError) as cm:
+            validator.validate_many(items, max_errors=2)
+        self.assertEqual(list(cm.exception.message_dict.keys()), [0, 2])
+
+
+
+class Operations(TestCase):
+
+    def test_embeds_many_operations(self):
+        from django.core.exceptions import ValidationError
+        from tests.models import TestModelWithEmbeddedOne as modelClass
+
+        field = modelClass._meta.get_field('many_embedded')
+        instance = modelClass.objects.create(many_embedded=[{'estring': 'first'}])
+        connection.features.supports_json_field
+        with self.assertNumQueries(1):
+            item = field.append(instance, {'estring': 'second'})
+        self.assertEqual(item, {'estring': 'second', 'eint': 90})
+        self.assertEqual(instance.many_embedded[1], item)
+        self.assertEqual(modelClass.objects.get(pk=instance.pk).many_embedded, [
+            {'estring': 'first', 'eint': 90},
+            {'estring': 'second', 'eint': 90}
+        ])
+
+        with self.assertRaises(ValidationError):
+            field.append(instance, {'eint': -1})
+        with self.assertRaises(ValidationError):
+            field.patch_item(instance, 0, {'eint': -1})
+        with self.assertRaises(IndexError):
+            field.patch_item(instance, 5, {'eint': 1})
+
+        # other writer changed the document: items are changed in database
+        other = modelClass.objects.get(pk=instance.pk)
+        field.append(other, {'estring': 'third'})
+        self.assertEqual(field.patch_item(instance, 0, {'eint': 1}), {'estring': 'first', 'eint': 1})
+        self.assertEqual(modelClass.objects.get(pk=instance.pk).many_embedded, [
+            {'estring': 'first', 'eint': 1},
+            {'estring': 'second', 'eint': 90},
+            {'estring': 'third', 'eint': 90}
+        ])
+
+    def test_embeds_many_as_object_operations(self):
+        from django.core.exceptions import ValidationError
+        from tests.models import TestModelWithEmbeddedManyAsObject as modelClass, TestModel
+
+        field = modelClass._meta.get_field('many_embedded_as_object')
+        instance = modelClass.objects.create(many_embedded_as_object={'a': {'estring': 'a'}})
+        connection.features.supports_json_field
+        with self.assertNumQueries(1):
+            field.set_key(instance, 'b', {'estring': 'b'})
+        field.set_key(instance, 'key with "quotes"', {'estring': 'c'})
+        self.assertEqual(field.patch_item(instance, 'a', {'eint': 2}), {'estring': 'a', 'eint': 2})
+        with self.assertRaises(KeyError):
+            field.patch_item(instance, 'unknown', {'eint': 2})
+        field.remove_key(instance, 'b')
+        expected = {
+            'a': {'estring': 'a', 'eint': 2},
+            'key with "quotes"': {'estring': 'c', 'eint': 90}
+        }
+        self.assertEqual(instance.many_embedded_as_object, expected)
+        self.assertEqual(modelClass.objects.get(pk=instance.pk).many_embedded_as_object, expected)
+
+        field = modelClass._meta.get_field('many_embedded_as_object_with_model_key')
+        obj = TestModel.objects.create()
+        field.set_key(instance, obj.pk, {'estring': 'model'})
+        with self.assertRaises(ValidationError):
+            field.set_key(instance, obj.pk + 1000, {'estring': 'model'})
+        self.assertEqual(
+            modelClass.objects.get(pk=instance.pk).many_embedded_as_object_with_model_key,
+            {str(obj.pk): {'estring': 'model', 'eint': 90}}
+        )
+
+    @skipIf(getattr(settings, 'DRF_GENERATOR_USE_NATIVE_JSON_FIELD', False), "compression is not supported with native JSON fields")
+    def test_read_modify_write_fallback(self):
+        from tests.models import TestModelWithCompressedJson as modelClass
+
+        field = modelClass._meta.get_field('many_embedded')
+        instance = modelClass.objects.create(many_embedded=[{'estring': 'value %s' % i} for i in range(20)])
+        instance = modelClass.objects.get(pk=instance.pk)
+        field.append(instance, {'estring': 'last'})
+        field.patch_item(instance, -1, {'eint': 3})
+        value = modelClass.objects.get(pk=instance.pk).many_embedded
+        self.assertEqual(len(value), 21)
+        self.assertEqual(value[-1], {'estring': 'last', 'eint': 3})
+        self.assertEqual(instance.many_embedded, value)
+
+
+
+class EmbeddedIndex(TestCase):
+
+    def test_index_fields(self):
+        from django.core.exceptions import FieldError
+        from drfs.filters import filter_embedded
+        from tests.models import TestModelWithEmbeddedIndex as modelClass
+
+        field = modelClass._meta.get_field('address_city_idx')
+        self.assertEqual((field.embedded_source, field.embedded_key, field.max_length), ('address', 'city', 50))
+        self.assertTrue(field.db_index)
+        self.assertEqual(modelClass._meta.get_field('address_verified_idx').embedded_default, False)
+        with self.assertRaises(Exception):
+            modelClass._meta.get_field('address_street_idx')
+        serializerClass = drfs.generate_serializer(modelClass)
+        self.assertNotIn('address_city_idx', serializerClass().fields)
+
+        paris = modelClass.objects.create(name='paris', address={'city': 'Paris', 'zip': 75001})
+        self.assertEqual(paris.address_city_idx, 'Paris')
+        self.assertEqual(paris.address_verified_idx, False)
+        modelClass.objects.create(name='lyon', address={'city': 'Lyon', 'zip': 69001, 'verified': True})
+        modelClass.objects.bulk_create([modelClass(name='none', address=None)])
+        self.assertEqual(modelClass.objects.get(name='none').address_city_idx, None)
+
+        paris.address['zip'] = 75002
+        paris.save()
+        qs = modelClass.objects.all()
+        self.assertEqual([o.name for o in filter_embedded(qs, address__city='Paris')], ['paris'])
+        self.assertEqual([o.name for o in filter_embedded(qs, address__zip__gte=70000)], ['paris'])
+        self.assertEqual([o.name for o in filter_embedded(qs, address__verified=True)], ['lyon'])
+        self.assertEqual([o.name for o in filter_embedded(qs, address__city__isnull=True)], ['none'])
+        with self.assertRaises(FieldError):
+            filter_embedded(qs, address__street='x')
+
+    def test_save_update_fields(self):
+        from drfs.db.fields import EmbeddedIndexModelMixin
+        from tests.models import TestModelWithEmbeddedIndex as modelClass
+
+        self.assertTrue(issubclass(modelClass, EmbeddedIndexModelMixin))
+        obj = modelClass.objects.create(name='paris', address={'city': 'Paris'})
+        obj.address = {'city': 'Berlin', 'zip': 10115}
+        obj.save(update_fields=['address'])
+        obj = modelClass.objects.get(pk=obj.pk)
+        self.assertEqual((obj.address_city_idx, obj.address_zip_idx), ('Berlin', 10115))
+
+        obj.name = 'berlin'
+        obj.address = {'city': 'Munich'}
+        obj.save(update_fields=['name'])
+        obj = modelClass.objects.get(pk=obj.pk)
+        self.assertEqual((obj.name, obj.address_city_idx), ('berlin', 'Berlin'))
+
+    def test_filter_backend(self):
+        from django.test import RequestFactory
+        from drfs.filters import EmbeddedIndexFilterBackend
+        from tests.models import TestModelWithEmbeddedIndex as modelClass
+
+        modelClass.objects.create(name='paris', address={'city': 'Paris', 'zip': 75001})
+        modelClass.objects.create(name='lyon', address={'city': 'Lyon', 'zip': 69001})
+        view = drfs.generate_viewset(modelClass, filter_backends=[EmbeddedIndexFilterBackend]).as_view({'get': 'list'})
+
+        def get(**params):
+            response = view(RequestFactory().get('/', data=params))
+            response.render()
+            return response
+
+        self.assertEqual([o['name'] for o in get(**{'address.city': 'Lyon'}).data], ['lyon'])
+        self.assertEqual([o['name'] for o in get(**{'address.zip__in': '75001,1'}).data], ['paris'])
+        self.assertEqual([o['name'] for o in get(**{'address.city__startswith': 'P', 'address.zip__lt': '80000'}).data], ['paris'])
+        self.assertEqual(len(get(**{'address.street': 'x'}).data), 2)
+        self.assertEqual(get(**{'address.zip': 'abc'}).status_code, 400)
+
+    def test_rebuild_command(self):
+        from io import StringIO
+        from django.core.management import call_command
+        from drfs.db.fields import LazyJSON
+        from tests.models import TestModelWithEmbeddedIndex as modelClass
+
+        obj = modelClass.objects.create(name='paris', address={'city': 'Paris'})
+        modelClass.objects.filter(pk=obj.pk).update(address=LazyJSON('{"city": "Lyon", "zip": 69001}'))
+        self.assertEqual(modelClass.objects.get(pk=obj.pk).address_city_idx, 'Paris')
+
+        out = StringIO()
+        call_command('drfs_rebuild_embedded_indexes', chunk_size=1, stdout=out)
+        self.assertIn('tests.TestModelWithEmbeddedIndex: 1 rows updated', out.getvalue())
+        obj = modelClass.objects.get(pk=obj.pk)
+        self.assertEqual((obj.address_city_idx, obj.address_zip_idx), ('Lyon', 69001))
+
+
+
+class EmbeddedSearch(TestCase):
+
+    def test_search_index(self):
+        from django.core.exceptions import FieldError
+        from drfs.filters import filter_embedded
+        from tests.models import TestModelWithSearchableEmbeddedMany as modelClass
+
+        field = modelClass._meta.get_field('tags')
+        indexModel = field.search_index_model
+        self.assertEqual(field.searchable, ['code', 'kind', 'weight'])
+        self.assertEqual(indexModel._meta.label, 'tests.TestModelWithSearchableEmbeddedMany_tags_search')
+        self.assertEqual(field.deconstruct()[3]['searchable'], ['code', 'kind', 'weight'])
+
+        a = modelClass.objects.create(name='a', tags=[{'code': 'X', 'kind': 'red'}, {'code': 'Y', 'weight': 2}])
+        b = modelClass.objects.create(name='b', tags=[{'code': 'Y', 'kind': 'blue'}])
+        modelClass.objects.create(name='c')
+        self.assertEqual(
+            sorted(indexModel.objects.filter(parent=a).values_list('item_index', 'key', 'value')),
+            [(0, 'code', 'X'), (0, 'kind', 'red'), (1, 'code', 'Y'), (1, 'weight', '2')]
+        )
+
+        qs = modelClass.objects.order_by('name')
+        def names(**lookups):
+            return [o.name for o in filter_embedded(qs, **lookups)]
+        self.assertEqual(names(tags__code='Y'), ['a', 'b'])
+        self.assertEqual(names(tags__code='Y', tags__kind='blue'), ['b'])
+        self.assertEqual(names(tags__kind__in=['red', 'green']), ['a'])
+        self.assertEqual(names(tags__kind__startswith='bl'), ['b'])
+        self.assertEqual(names(tags__weight=2), ['a'])
+        with self.assertRaises(FieldError):
+            filter_embedded(qs, tags__unknown='x')
+
+        # rows are rewritten on save (not when field is not saved)
+        a.tags = [{'code': 'Z'}]
+        a.save(update_fields=['name'])
+        self.assertEqual(names(tags__code='Z'), [])
+        a.save()
+        self.assertEqual(names(tags__code='Z'), ['a'])
+        self.assertEqual(names(tags__code='X'), [])
+
+        # and by operations
+        field.append(b, {'code': 'W', 'kind': 'green'})
+        self.assertEqual(names(tags__kind='green'), ['b'])
+        field.patch_item(b, 1, {'kind': 'black'})
+        self.assertEqual(names(tags__kind='green'), [])
+        self.assertEqual(indexModel.objects.get(parent=b, value='black').item_index, 1)
+
+        b.delete()
+        self.assertEqual(indexModel.objects.filter(parent_id=b.pk).count(), 0)
+
+    def test_filter_backend_and_rebuild(self):
+        from io import StringIO
+        from django.core.management import call_command
+        from django.test import RequestFactory
+        from drfs.filters import EmbeddedIndexFilterBackend
+        from tests.models import TestModelWithSearchableEmbeddedMany as modelClass
+
+        modelClass.objects.create(name='a', tags=[{'code': 'X'}])
+        modelClass.objects.bulk_create([modelClass(name='b', tags=[{'code': 'Y', 'weight': 1}])])
+        view = drfs.generate_viewset(modelClass, filter_backends=[EmbeddedIndexFilterBackend]).as_view({'get': 'list'})
+
+        def get(**params):
+            response = view(RequestFactory().get('/', data=params))
+            response.render()
+            return [o['name'] for o in response.data]
+
+        self.assertEqual(get(**{'tags.code': 'X'}), ['a'])
+        self.assertEqual(get(**{'tags.code__in': 'X,Y'}), ['a'])
+
+        out = StringIO()
+        call_command('drfs_rebuild_embedded_indexes', 'tests.TestModelWithSearchableEmbeddedMany', stdout=out)
+        self.assertIn('search index of 2 rows rebuilt', out.getvalue())
+        self.assertEqual(sorted(get(**{'tags.code__in': 'X,Y'})), ['a', 'b'])
+        self.assertEqual(get(**{'tags.weight': '1'}), ['b'])
+        self.assertEqual(len(get(**{'tags.unknown': 'x'})), 2)
@@ -0,0 +1,37 @@
+from django.test import TestCase
+from rest_framework.viewsets import ModelViewSet
+
+from drfs import helpers
+
+
+
+class ImportClass(TestCase):
+
+    def setUp(self):
+        helpers.clear_import_cache()
+
+    def tearDown(self):
+        helpers.clear_import_cache()
+
+    def test_cache(self):
+        self.assertIs(helpers.import_class('rest_framework.viewsets.ModelViewSet'), ModelViewSet)
+        self.assertIs(helpers.import_class('rest_framework.viewsets.ModelViewSet'), ModelViewSet)
+        self.assertEqual(helpers.import_class_stats(), {'hits': 1, 'misses': 1, 'size': 1})
+
+        with self.assertRaises(AttributeError):
+            helpers.import_class('rest_framework.viewsets.NoSuchViewSet')
+        with self.assertRaises(AttributeError):
+            helpers.import_class('rest_framework.viewsets.NoSuchViewSet')
+        # failed imports are not cached
+        self.assertEqual(helpers.import_class_stats(), {'hits': 1, 'misses': 3, 'size': 1})
+
+    def test_preresolve_classes(self):
+        resolved, failed = helpers.preresolve_classes(app='tests')
+        self.assertIn('django.db.models.Model', resolved)
+        self.assertIn('tests.models.TestModelAbstract', resolved)
+        self.assertIn('django.contrib.auth.models.User', resolved)
+        self.assertEqual(failed, [])
+
+        stats = helpers.import_class_stats()
+        helpers.import_class('django.db.models.Model')
+        self.assertEqual(helpers.import_class_stats()['hits'], stats['hits'] + 1)
@@ -1,7 +1,10 @@
+from unittest import skipIf
+from django.conf import settings
 from django.test import TestCase
 from django.contrib.auth.models import User as UserModel
 from django.db.models.fields.related import ForeignKey
 import drfs, json
+from drfs.db.fields import LazyJSON
 
 
 class Serializer(TestCase):
@@ -44,3 +47,216 @@ class Serializer(TestCase):
             instance.not_required,
             {'default': 'not_required'}
         )
+
+
+
+class Codec(TestCase):
+
+    def test_codecs(self):
+        import datetime, decimal, uuid
+        from django.core.serializers.json import DjangoJSONEncoder
+        from django.test import override_settings
+        from drfs import jsoncodec
+
+        self.assertIsInstance(jsoncodec.get_codec(), jsoncodec.JSONCodec)
+        value = {
+            'text': 'привет',
+            'date': datetime.datetime(2020, 1, 2, 3, 4, 5, 123456, tzinfo=datetime.timezone.utc),
+            'decimal': decimal.Decimal('1.10'),
+            'uuid': uuid.UUID(int=1),
+            'items': [1, 2.5, None, True, {'1': 'a'}],
+            'big': 2 ** 70
+        }
+        expected = json.loads(json.dumps(value, cls=DjangoJSONEncoder, ensure_ascii=False))
+        for name in jsoncodec.CODECS:
+            if not jsoncodec.is_codec_available(name):
+                continue
+            with override_settings(DRF_GENERATOR={'json_codec': name}):
+                codec = jsoncodec.get_codec()
+                self.assertEqual(codec.name, name)
+                dumped = codec.dumps(value, cls=DjangoJSONEncoder, ensure_ascii=False)
+                self.assertIn('привет', dumped)
+                self.assertEqual(codec.loads(dumped), expected)
+                self.assertEqual(codec.loads('NaN') != codec.loads('NaN'), True)
+                special = {'nan': float('nan'), 'items': [float('inf'), -float('inf'), None]}
+                self.assertEqual(
+                    codec.dumps(special, ensure_ascii=False),
+                    json.dumps(special, ensure_ascii=False)
+                )
+                with self.assertRaises(TypeError):
+                    codec.dumps({'set': set()}, ensure_ascii=False)
+                with self.assertRaises(ValueError):
+                    codec.loads('{')
+
+        with override_settings(DRF_GENERATOR={'json_codec': 'unknown'}):
+            with self.assertRaises(ValueError):
+                jsoncodec.get_codec()
+
+    def test_model_field(self):
+        from django.test import override_settings
+        from drfs import jsoncodec
+
+        modelClass = drfs.generate_model('TestModelForJsonData.json')
+        for name in jsoncodec.CODECS:
+            if not jsoncodec.is_codec_available(name):
+                continue
+            with override_settings(DRF_GENERATOR={'json_codec': name}):
+                instance = modelClass.objects.create(required={'text': 'привет', 'list': [1, {'a': None}]})
+                instance = modelClass.objects.get(pk=instance.pk)
+                self.assertEqual(instance.required, {'text': 'привет', 'list': [1, {'a': None}]})
+
+    def test_benchmark_command(self):
+        from io import StringIO
+        from django.core.management import call_command
+
+        out = StringIO()
+        call_command('drfs_json_benchmark', number=1, stdout=out, skip_checks=True)
+        self.assertIn('json*', out.getvalue())
+        self.assertIn('large', out.getvalue())
+
+
+
+class LazyJson(TestCase):
+
+    def test_lazy_fields(self):
+        from tests.models import TestModelWithLazyJson as modelClass
+
+        self.assertTrue(modelClass._meta.get_field('data').lazy)
+        self.assertTrue(modelClass._meta.get_field('one_embedded').lazy)
+        self.assertFalse(modelClass._meta.get_field('eager').lazy)
+        self.assertEqual(modelClass._meta.get_field('data').deconstruct()[3]['lazy'], True)
+
+        instance = modelClass.objects.create(
+            name='lazy',
+            data={'text': 'привет', 'list': [1, {'a': None}]},
+            eager={'a': 1},
+            one_embedded={'eint': 1}
+        )
+        instance = modelClass.objects.get(pk=instance.pk)
+        self.assertIsInstance(instance.__dict__['data'], LazyJSON)
+        self.assertIsInstance(instance.__dict__['one_embedded'], LazyJSON)
+        self.assertEqual(instance.__dict__['eager'], {'a': 1})
+
+        # parsed on first access only
+        self.assertEqual(instance.data, {'text': 'привет', 'list': [1, {'a': None}]})
+        self.assertEqual(instance.__dict__['data'], {'text': 'привет', 'list': [1, {'a': None}]})
+        self.assertIsInstance(instance.__dict__['one_embedded'], LazyJSON)
+
+        # untouched value is written back as the same text
+        modelClass.objects.filter(pk=instance.pk).update(one_embedded=LazyJSON('{"eint": 1,  "estring": "raw"}'))
+        instance = modelClass.objects.get(pk=instance.pk)
+        instance.name = 'changed'
+        instance.save()
+        raw = modelClass.objects.filter(pk=instance.pk).values_list('one_embedded', flat=True)[0]
+        self.assertEqual(raw.raw, '{"eint": 1,  "estring": "raw"}')
+
+        instance = modelClass.objects.get(pk=instance.pk)
+        self.assertEqual(instance.name, 'changed')
+        self.assertEqual(instance.one_embedded['estring'], 'raw')
+        instance.one_embedded['eint'] = 5
+        instance.save()
+        instance = modelClass.objects.get(pk=instance.pk)
+        self.assertEqual(instance.one_embedded, {'eint': 5, 'estring': 'raw'})
+
+    def test_raw_json_response(self):
+        from unittest import mock
+        from django.test import RequestFactory
+        from rest_framework.renderers import JSONRenderer as DefaultJSONRenderer
+        from drfs.renderers import JSONRenderer
+        from drfs.db.fields import JSONField
+        from tests.models import TestModelWithLazyJson as modelClass
+
+        modelClass.objects.create(name='one', data={'text': 'привет\u2028'}, one_embedded={'eint': 1})
+        modelClass.objects.filter(name='one').update(data=LazyJSON('{"text":  "привет\u2028"}'))
+        modelClass.objects.create(name='two', data=[1, 2], one_embedded=None)
+
+        def get(renderer_class, method='get'):
+            viewset = type('Viewset', (drfs.generate_viewset(modelClass),), {
+                'renderer_classes': [renderer_class]
+            })
+            view = viewset.as_view({'get': 'list', 'post': 'create'})
+            if method == 'post':
+                request = RequestFactory().post('/', data={'name': 'new', 'data': {}, 'eager': {}}, content_type='application/json')
+            else:
+                request = RequestFactory().get('/')
+            response = view(request)
+            response.render()
+            return response.content
+
+        with mock.patch.object(JSONField, 'decode_lazy', autospec=True, side_effect=JSONField.decode_lazy) as decode:
+            content = get(JSONRenderer)
+            self.assertEqual(decode.call_count, 0)
+        self.assertIn(b'"data":{"text":  "\xd0\xbf\xd1\x80\xd0\xb8\xd0\xb2\xd0\xb5\xd1\x82\\u2028"}', content)
+        self.assertEqual(json.loads(content), json.loads(get(DefaultJSONRenderer)))
+        self.assertEqual([r['data'] for r in json.loads(content)], [{'text': 'привет\u2028'}, [1, 2]])
+        self.assertEqual([r['one_embedded'] for r in json.loads(content)][1], None)
+
+        # not read-only request
+        self.assertEqual(json.loads(get(JSONRenderer, 'post'))['name'], 'new')
+
+
+
+@skipIf(getattr(settings, 'DRF_GENERATOR_USE_NATIVE_JSON_FIELD', False), "compression is not supported with native JSON fields")
+class CompressedJson(TestCase):
+
+    def get_raw(self, modelClass, pk, name):
+        from django.db.models import TextField
+        from django.db.models.functions import Cast
+        return modelClass.objects.filter(pk=pk).annotate(
+            raw=Cast(name, output_field=TextField())
+        ).values_list('raw', flat=True)[0]
+
+    def test_compressed_fields(self):
+        from drfs.db.compression import get_compressor, decompress_text
+        from tests.models import TestModelWithCompressedJson as modelClass
+
+        field = modelClass._meta.get_field('many_embedded')
+        self.assertEqual(field.compressor.level, 9)
+        self.assertEqual(field.deconstruct()[3]['compress'], 'zlib')
+        with self.assertRaises(ValueError):
+            get_compressor('lzma')
+        with self.assertRaises(ValueError):
+            get_compressor('zlib', level=10)
+
+        many = [{'estring': 'value %s' % i, 'eint': i} for i in range(20)]
+        instance = modelClass.objects.create(data={'text': 'привет'}, many_embedded=many)
+        # below threshold
+        self.assertEqual(json.loads(self.get_raw(modelClass, instance.pk, 'data')), {'text': 'привет'})
+        raw = self.get_raw(modelClass, instance.pk, 'many_embedded')
+        self.assertTrue(raw.startswith('zlib:'))
+        self.assertEqual(json.loads(decompress_text(raw))[3]['estring'], 'value 3')
+
+        instance = modelClass.objects.get(pk=instance.pk)
+        self.assertEqual([e['eint'] for e in instance.many_embedded], list(range(20)))
+
+        # lazy and compressed
+        modelClass.objects.filter(pk=instance.pk).update(data=dict([('key%s' % i, i) for i in range(50)]))
+        self.assertTrue(self.get_raw(modelClass, instance.pk, 'data').startswith('zlib:'))
+        instance = modelClass.objects.get(pk=instance.pk)
+        self.assertEqual(instance.__dict__['data'].raw, self.get_raw(modelClass, instance.pk, 'data'))
+        self.assertEqual(json.loads(instance.__dict__['data'].text)['key7'], 7)
+        self.assertEqual(instance.data['key49'], 49)
+
+    def test_compress_command(self):
+        from io import StringIO
+        from django.core.management import call_command
+        from tests.models import TestModelWithCompressedJson as modelClass
+
+        many = [{'estring': 'value %s' % i, 'eint': i} for i in range(20)]
+        pks = [modelClass.objects.create(many_embedded=many).pk for i in range(5)]
+        call_command('drfs_compress_json', 'tests.TestModelWithCompressedJson', decompress=True, chunk_size=2, stdout=StringIO())
+        for pk in pks:
+            self.assertEqual(json.loads(self.get_raw(modelClass, pk, 'many_embedded')), many)
+            # uncompressed rows are read too
+            self.assertEqual(modelClass.objects.get(pk=pk).many_embedded, many)
+
+        out = StringIO()
+        call_command('drfs_compress_json', chunk_size=2, stdout=out)
+        self.assertIn('tests.TestModelWithCompressedJson: 5 rows converted', out.getvalue())
+        for pk in pks:
+            self.assertTrue(self.get_raw(modelClass, pk, 'many_embedded').startswith('zlib:'))
+            self.assertEqual(modelClass.objects.get(pk=pk).many_embedded, many)
+
+        out = StringIO()
+        call_command('drfs_compress_json', 'tests.TestModelWithCompressedJson', stdout=out)
+        self.assertIn('0 rows converted', out.getvalue())
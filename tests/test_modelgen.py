@@ -1,4 +1,5 @@
 from django.test import TestCase
+from django.test.utils import isolate_apps
 from django.contrib.auth.models import User as UserModel
 from django.db.models.fields.related import ForeignKey, OneToOneField
 import drfs, json
@@ -94,6 +95,41 @@ class Model(TestCase):
         ])
 
 
+    def test_meta_options(self):
+        from django.db import IntegrityError, models as django_models
+        from drfs.checks import check_filter_fields_indexes
+        from tests.models import TestModelWithIndexes as modelClass
+
+        opts = modelClass._meta
+        self.assertTrue(opts.get_field('name').db_index)
+        self.assertFalse(opts.get_field('notes').db_index)
+        self.assertEqual(opts.ordering, ['-created', 'name'])
+        self.assertEqual(opts.unique_together, (('name', 'owner_name'),))
+        self.assertEqual([index.fields for index in opts.indexes], [['owner_name', '-created'], ['created']])
+        self.assertTrue(all(opts.indexes[i].name for i in range(2)))
+        self.assertEqual(opts.indexes[1].condition, django_models.Q(is_active=True))
+        self.assertEqual(len(opts.indexes[1].name), 29)
+        self.assertEqual(opts.constraints[0].fields, ('code',))
+
+        modelClass.objects.create(name='a', code='x')
+        with self.assertRaises(IntegrityError):
+            modelClass.objects.create(name='b', code='x')
+
+        warnings = [
+            w for w in check_filter_fields_indexes()
+            if w.obj is modelClass
+        ]
+        self.assertEqual(len(warnings), 1)
+        self.assertEqual(warnings[0].id, 'drfs.W001')
+        self.assertIn(": is_active, notes", warnings[0].msg)
+
+        # default filter fields are checked only if enabled
+        from django.test import override_settings
+        from tests.models import TestModel
+        self.assertFalse([w for w in check_filter_fields_indexes() if w.obj is TestModel])
+        with override_settings(DRF_GENERATOR={'checks': {'default_filter_fields': True}}):
+            self.assertTrue([w for w in check_filter_fields_indexes() if w.obj is TestModel])
+
     def test_no_such_file(self):
         self.assertRaisesMessage(
             OSError,
@@ -112,6 +148,21 @@ class Model(TestCase):
         )
 
 
+    def test_build_field_dict_params(self):
+        with open('./tests/models.json/TestModel.json') as f:
+            gen = DjangoOrmModelGenerator(json.load(f), 'tests')
+        field_class, field_args, field_kwargs = gen.build_model_field('name', {
+            'type': 'string',
+            'required': False,
+            'max': 20,
+            'description': 'Name'
+        })
+        self.assertIs(field_class, FIELD_MAP['string'])
+        self.assertEqual(field_kwargs['max_length'], 20)
+        self.assertEqual(field_kwargs['help_text'], 'Name')
+        self.assertTrue(field_kwargs['blank'])
+
+
     def test_relations_belongs_to(self):
         modelClass = drfs.generate_model('TestModelRalationBelongsTo.json')
         opts = modelClass._meta
@@ -267,3 +318,156 @@ class Model2(TestCase):
                 }
             }
         )
+
+
+
+class HasManyCascade(TestCase):
+
+    def create_parents(self, count):
+        from tests.models import TestModelCascadeItem as itemClass, TestModelWithHasManyCascade as modelClass
+        parents = []
+        for i in range(count):
+            parent = modelClass.objects.create(name=str(i))
+            parent.items.add(itemClass.objects.create(), itemClass.objects.create())
+            parent.links.add(itemClass.objects.create())
+            parents.append(parent)
+        return parents
+
+    def test_instance_delete(self):
+        from django.db.models import signals
+        from tests.models import TestModelCascadeItem as itemClass
+        from drfs.generators.model._DjangoOrmModelGenerator import REGISTERED_RECEIVERS
+
+        self.assertEqual(REGISTERED_RECEIVERS['TestModelWithHasManyCascade'], {'delete_hasMany': ['items']})
+        self.assertFalse(signals.pre_delete.has_listeners(itemClass))
+        parent, other = self.create_parents(2)
+        parent.delete()
+        self.assertEqual(itemClass.objects.count(), 4)
+        self.assertEqual(list(other.items.all()), list(itemClass.objects.filter(pk__in=other.items.all())))
+        self.assertEqual(other.items.count(), 2)
+
+    def test_queryset_delete(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from tests.models import TestModelCascadeItem as itemClass, TestModelWithHasManyCascade as modelClass
+
+        def count_delete_queries(count):
+            parents = self.create_parents(count)
+            with CaptureQueriesContext(connection) as ctx:
+                modelClass.objects.filter(pk__in=[p.pk for p in parents]).delete()
+            return len(ctx.captured_queries)
+
+        # queries don't depend on number of deleted parents
+        self.assertEqual(count_delete_queries(2), count_delete_queries(20))
+        self.assertEqual(modelClass.objects.count(), 0)
+        # objects of relation without cascade are kept
+        self.assertEqual(itemClass.objects.count(), 22)
+
+
+
+class GenerateModels(TestCase):
+    definitions = {
+        'BulkChild': {
+            'name': 'BulkChild',
+            'base': 'tests.models.BulkBase',
+            'relations': {
+                'other': {'type': 'belongsTo', 'model': 'BulkOther'}
+            }
+        },
+        'BulkOther': {
+            'name': 'BulkOther',
+            'base': 'django.db.models.Model',
+            'relations': {
+                'child': {'type': 'hasOne', 'model': 'tests.models.BulkChild', 'relationName': 'bulk_other_by_child'}
+            }
+        },
+        'BulkBase': {
+            'name': 'BulkBase',
+            'base': 'django.db.models.Model',
+            'properties': {
+                'title': {'type': 'string', 'max': 10}
+            },
+            'options': {
+                'abstract': True
+            }
+        }
+    }
+
+    @isolate_apps('tests')
+    def test_generate_models(self):
+        import os, shutil, tempfile
+        from django.test import override_settings
+        from drfs.registry import registry
+
+        model_cache = drfs.__dict__['__model_cache']
+        for name in self.definitions:
+            self.addCleanup(model_cache.pop, drfs.get_model_key(name), None)
+
+        base_dir = tempfile.mkdtemp()
+        os.makedirs(os.path.join(base_dir, 'tests', 'models.json'))
+        for name, definition in self.definitions.items():
+            with open(os.path.join(base_dir, 'tests', 'models.json', name + '.json'), 'w') as f:
+                json.dump(definition, f)
+
+        try:
+            with override_settings(BASE_DIR=base_dir):
+                names = [e.name for e in registry.model_definitions(app='tests')]
+                order = registry.sort_definitions(names, lambda n: self.definitions[n])
+                self.assertLess(order.index('BulkBase'), order.index('BulkChild'))
+
+                models = drfs.generate_models(app='tests')
+        finally:
+            shutil.rmtree(base_dir)
+
+        self.assertEqual(sorted(models.keys()), ['BulkBase', 'BulkChild', 'BulkOther'])
+        BulkChild = models['BulkChild']
+        BulkOther = models['BulkOther']
+        self.assertTrue(issubclass(BulkChild, models['BulkBase']))
+        self.assertEqual(BulkChild._meta.get_field('title').max_length, 10)
+        self.assertIs(BulkChild._meta.get_field('other').related_model, BulkOther)
+        self.assertIs(BulkOther._meta.get_field('child').related_model, BulkChild)
+
+    def test_base_cycle(self):
+        from drfs.registry import registry
+        definitions = {
+            'TestModel': {'name': 'TestModel', 'base': 'tests.models.TestModel2'},
+            'TestModel2': {'name': 'TestModel2', 'base': 'tests.models.TestModel'},
+        }
+        self.assertRaisesMessage(
+            ValueError,
+            "Circular 'base' dependency",
+            registry.sort_definitions,
+            ['TestModel'],
+            lambda n: definitions[n]
+        )
+
+
+
+class GetModel(TestCase):
+
+    def tearDown(self):
+        drfs.reset_model_index()
+
+    def unregister_model(self, model_class):
+        from django.apps import apps
+        del apps.all_models[model_class._meta.app_label][model_class._meta.model_name]
+        apps.clear_cache()
+
+    def test_get_model(self):
+        from django.db import models as django_models
+        from . import models
+
+        self.assertIs(drfs.get_model('TestModel'), models.TestModel)
+        self.assertIs(drfs.get_model('TestModel.json'), models.TestModel)
+        self.assertIs(drfs.get_model('testmodel'), models.TestModel)
+        self.assertIs(drfs.get_model('TestModel', app='tests'), models.TestModel)
+        self.assertIs(drfs.get_model('TestModel.json', latest=True), models.TestModel)
+        self.assertIsNone(drfs.get_model('NoSuchModel'))
+
+        drfs.reset_model_index()
+        self.assertIs(drfs.get_model('TestModel2'), models.TestModel2)
+
+        # models registered after index is built are indexed too
+        IndexedModel = type('IndexedModel', (django_models.Model,), {'__module__': 'tests.models'})
+        self.addCleanup(self.unregister_model, IndexedModel)
+        self.assertIs(drfs.get_model('IndexedModel.json'), IndexedModel)
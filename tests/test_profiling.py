@@ -0,0 +1,34 @@
+import drfs
+from django.test import TestCase
+
+from drfs import profiling
+from . import models
+
+
+
+class Profiling(TestCase):
+    def tearDown(self):
+        profiling.stop()
+
+    def test_phases(self):
+        self.assertIs(profiling.phase('model', 'TestModel'), profiling.NOOP_PHASE)
+
+        profiler = profiling.start()
+        drfs.generate_serializer(models.TestModelWithEmbeddedOne)
+        drfs.generate_viewset(models.TestModel)
+
+        report = profiler.get_report()
+        self.assertEqual(list(report['totals'].keys()), ['embedded_validator', 'serializer', 'viewset'])
+        serializer_phase = [p for p in report['phases'] if p['kind'] == 'serializer'][0]
+        self.assertEqual(serializer_phase['name'], 'TestModelWithEmbeddedOne')
+        self.assertEqual(serializer_phase['depth'], 0)
+        self.assertGreaterEqual(serializer_phase['classes'], 1)
+        self.assertGreater(serializer_phase['wall'], 0)
+        # validators of serializer fields are measured inside serializer phase
+        validator_phases = [p for p in report['phases'] if p['kind'] == 'embedded_validator']
+        self.assertEqual(min([p['depth'] for p in validator_phases]), 1)
+        self.assertEqual(
+            report['totals']['embedded_validator']['count'],
+            len([p for p in validator_phases if not p['nested']])
+        )
+        self.assertEqual(report['totals']['viewset']['count'], 1)
@@ -88,3 +88,86 @@ class Viewset(TestCase):
             "has_one": None,
             "has_many": []
         }])
+
+
+
+class LazyViewset(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def test_lazy_serializer(self):
+        serializerClass = drfs.generate_serializer(models.TestModel, lazy=True)
+        self.assertFalse(serializerClass.is_resolved())
+
+        instance = models.TestModel.objects.create()
+        self.assertEqual(
+            serializerClass(instance).data['id'],
+            instance.id
+        )
+        self.assertTrue(serializerClass.is_resolved())
+        self.assertEqual(serializerClass.Meta.model, models.TestModel)
+
+    def test_lazy_viewset(self):
+        from drfs.routers import DefaultRouter
+        from rest_framework.viewsets import ModelViewSet
+
+        viewset = drfs.generate_viewset(models.TestModel, lazy=True)
+        router = DefaultRouter()
+        router.register('lazy', viewset)
+        urls = router.urls
+        self.assertEqual(router.registry[0][2], 'testmodel')
+        self.assertIn('testmodel-list', [u.name for u in urls])
+        self.assertFalse(viewset.is_resolved())
+
+        instance = models.TestModel.objects.create()
+        view = viewset.as_view({'get': 'list'})
+        self.assertTrue(view.csrf_exempt)
+        response = view(self.factory.get('/'))
+        self.assertEqual([i['id'] for i in response.data], [instance.id])
+        self.assertTrue(viewset.is_resolved())
+        self.assertTrue(issubclass(view.cls, ModelViewSet))
+        self.assertEqual(view.actions['get'], 'list')
+
+
+
+class Preload(TestCase):
+    def tearDown(self):
+        from drfs import preloader
+        preloader.__dict__['__openapi_schema'].clear()
+
+    def test_preload(self):
+        from django.apps import apps
+        from drfs.routers import DefaultRouter
+
+        serializer_class = drfs.generate_serializer(models.TestModelWithRelations_Flat)
+        serializer_class.Meta.expandable_fields = {
+            'belongs_to_field': {'visible_fields': ['id', 'username'], 'read_only': True}
+        }
+        self.addCleanup(delattr, serializer_class.Meta, 'expandable_fields')
+        viewset = drfs.generate_viewset(models.TestModelWithRelations_Flat, serializer_class=serializer_class, lazy=True)
+        router = DefaultRouter()
+        router.register('preload', viewset)
+
+        registered = dict(apps.all_models['tests'])
+        report = drfs.preload(routers=[router], openapi=True, freeze=False)
+        # definitions that are not used by routers are not generated
+        self.assertEqual(dict(apps.all_models['tests']), registered)
+        self.assertTrue(viewset.is_resolved())
+        self.assertEqual(report['viewsets'], 1)
+        self.assertEqual(report['expand_serializers'], 1)
+        self.assertEqual(report['urls'], len(router.urls))
+        # model of viewset and User of expand serializer
+        self.assertEqual(report['models'], 2)
+        self.assertEqual(report['errors'], [])
+        self.assertIn('/preload/', drfs.get_openapi_schema()['paths'])
+
+        expand_class = serializer_class.get_expand_serializer_class('belongs_to_field', None)
+        self.assertIs(serializer_class.get_expand_serializer_classes()['belongs_to_field'], expand_class)
+        self.assertEqual(expand_class.Meta.fields, ['id', 'username'])
+        self.assertEqual(expand_class.Meta.read_only_fields, ['id', 'username'])
+
+        # changed expandable_fields get new serializer
+        serializer_class.Meta.expandable_fields = {'belongs_to_field': {'visible_fields': ['id']}}
+        changed_class = serializer_class.get_expand_serializer_class('belongs_to_field', expand_class.Meta.model)
+        self.assertIsNot(changed_class, expand_class)
+        self.assertEqual(changed_class.Meta.fields, ['id'])